@@ -0,0 +1,434 @@
+import math
+import logging
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, namedtuple
+from datetime import date
+from itertools import accumulate
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session, object_session
+from app import app, db
+from cache import report_cache
+from models import Expense
+
+logger = logging.getLogger(__name__)
+
+# Amounts are held as integer cents, so sums over any range are exact
+CENTS = 100
+
+# Largest amount held, in cents. Prefix sums over up to 2**24 rows, far more
+# than ANALYTICS_CACHE_MAX_ROWS, stay within the int64 columns.
+MAX_CENTS = (2 ** 63 - 1) >> 24
+
+# Rows per block of the precomputed block minimums and maximums
+BLOCK_SIZE = 256
+
+# Bytes held per expense: the four columns plus the derived prefix sums and
+# per-category day and prefix sum columns
+ROW_BYTES = 8 + 4 + 4 + 8 + 8 + 4 + 8
+
+Summary = namedtuple('Summary', ['total', 'count', 'max', 'min'])
+
+def to_cents(amount):
+    """Return an amount in integer cents, or None if it has a finer fraction or is too large to hold"""
+    if not math.isfinite(amount):
+        return None
+    cents = round(amount * CENTS)
+    if abs(cents) > MAX_CENTS:
+        return None
+    return cents if cents / CENTS == amount else None
+
+def _bounds(days, start, end):
+    """Return the positions of the rows from day ordinal start through end in a sorted day column"""
+    lo = bisect_left(days, start) if start is not None else 0
+    hi = bisect_right(days, end) if end is not None else len(days)
+    return lo, max(lo, hi)
+
+def _ordinal(day):
+    return day.toordinal() if day is not None else None
+
+class UserColumns:
+    """
+    One user's expenses as parallel typed arrays sorted by day: expense id,
+    date ordinal, category id and amount in cents.
+
+    Instances are never modified, so readers need no lock; changed() returns
+    a new instance. Aggregates over a day range bisect the day column and
+    subtract prefix sums, so they cost O(log n) whatever the range covers.
+    Minimums and maximums scan at most two partial blocks plus the extremes
+    of the whole blocks in between. Prefix sums and block extremes are
+    derived on the first aggregate.
+    """
+
+    def __init__(self, ids, days, categories, cents):
+        self.ids = ids
+        self.days = days
+        self.categories = categories
+        self.cents = cents
+        self._index = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Build the columns from (expense id, date, category id, amount) rows
+
+        Args:
+            rows: Rows ordered by date
+
+        Returns:
+            UserColumns: The columns, or None if an amount cannot be held in cents
+        """
+        ids, days, categories, cents = array('q'), array('i'), array('i'), array('q')
+        for expense_id, expense_date, category_id, amount in rows:
+            amount_cents = to_cents(amount)
+            if amount_cents is None:
+                return None
+            ids.append(expense_id)
+            days.append(expense_date.toordinal())
+            categories.append(category_id)
+            cents.append(amount_cents)
+        return cls(ids, days, categories, cents)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        return len(self.ids) * ROW_BYTES
+
+    def changed(self, removed, inserted):
+        """
+        Return a copy with expenses removed and inserted
+
+        Args:
+            removed: Ids of the expenses to remove
+            inserted: {expense id: (date, category id, amount)} of the expenses to insert
+
+        Returns:
+            UserColumns: The new columns, or None if an inserted amount cannot be held in cents
+        """
+        columns = (self.ids[:], self.days[:], self.categories[:], self.cents[:])
+        ids, days = columns[0], columns[1]
+        for expense_id in removed:
+            try:
+                position = ids.index(expense_id)
+            except ValueError:
+                continue
+            for column in columns:
+                del column[position]
+        for expense_id, (expense_date, category_id, amount) in inserted.items():
+            amount_cents = to_cents(amount)
+            if amount_cents is None:
+                return None
+            day = expense_date.toordinal()
+            position = bisect_right(days, day)
+            for column, value in zip(columns, (expense_id, day, category_id, amount_cents)):
+                column.insert(position, value)
+        return UserColumns(*columns)
+
+    def _derived(self):
+        # Concurrent readers may both derive the index; either result is valid
+        if self._index is None:
+            cumulative = array('q', accumulate(self.cents, initial=0))
+            by_category = {}
+            for day, category_id, cents in zip(self.days, self.categories, self.cents):
+                column = by_category.get(category_id)
+                if column is None:
+                    column = by_category[category_id] = (array('i'), array('q', [0]))
+                column[0].append(day)
+                column[1].append(column[1][-1] + cents)
+            blocks = range(0, len(self.cents), BLOCK_SIZE)
+            minimums = array('q', (min(self.cents[start:start + BLOCK_SIZE]) for start in blocks))
+            maximums = array('q', (max(self.cents[start:start + BLOCK_SIZE]) for start in blocks))
+            self._index = (cumulative, by_category, minimums, maximums)
+        return self._index
+
+    def _extreme(self, function, blocks, lo, hi):
+        first = -(-lo // BLOCK_SIZE)
+        last = hi // BLOCK_SIZE
+        if first >= last:
+            return function(self.cents[lo:hi])
+        values = [function(blocks[first:last])]
+        if lo < first * BLOCK_SIZE:
+            values.append(function(self.cents[lo:first * BLOCK_SIZE]))
+        if last * BLOCK_SIZE < hi:
+            values.append(function(self.cents[last * BLOCK_SIZE:hi]))
+        return function(values)
+
+    def summary(self, start=None, end=None):
+        """
+        Aggregate the expenses from day start through end, both optional
+
+        Returns:
+            Summary: total, count, max and min amount; max and min are None without expenses
+        """
+        lo, hi = _bounds(self.days, _ordinal(start), _ordinal(end))
+        if lo == hi:
+            return Summary(0, 0, None, None)
+        cumulative, _, minimums, maximums = self._derived()
+        return Summary(
+            (cumulative[hi] - cumulative[lo]) / CENTS,
+            hi - lo,
+            self._extreme(max, maximums, lo, hi) / CENTS,
+            self._extreme(min, minimums, lo, hi) / CENTS
+        )
+
+    def category_totals(self, start=None, end=None):
+        """
+        Total the expenses from day start through end by category
+
+        Returns:
+            list: (category id, total) of the categories with expenses, by category id
+        """
+        start, end = _ordinal(start), _ordinal(end)
+        totals = []
+        for category_id, (days, cumulative) in sorted(self._derived()[1].items()):
+            lo, hi = _bounds(days, start, end)
+            if hi > lo:
+                totals.append((category_id, (cumulative[hi] - cumulative[lo]) / CENTS))
+        return totals
+
+    def bucket_totals(self, boundaries, category_id=None):
+        """
+        Total the expenses in consecutive day ranges
+
+        Args:
+            boundaries: Ascending dates; bucket i runs from boundaries[i] up to,
+                but excluding, boundaries[i + 1]
+            category_id: Only total this category's expenses
+
+        Returns:
+            list: (total, count) per bucket
+        """
+        cumulative, by_category = self._derived()[:2]
+        days = self.days
+        if category_id is not None:
+            days, cumulative = by_category.get(category_id, (array('i'), array('q', [0])))
+        positions = [bisect_left(days, boundary.toordinal()) for boundary in boundaries]
+        return [
+            ((cumulative[hi] - cumulative[lo]) / CENTS, hi - lo)
+            for lo, hi in zip(positions, positions[1:])
+        ]
+
+    def monthly_totals(self, year):
+        """
+        Total the expenses of one year by calendar month
+
+        Returns:
+            list: (month number, total) of the months with expenses
+        """
+        boundaries = [date(year, month, 1) for month in range(1, 13)] + [date(year + 1, 1, 1)]
+        return [
+            (month, total)
+            for month, (total, count) in enumerate(self.bucket_totals(boundaries), start=1)
+            if count
+        ]
+
+class AnalyticsCache:
+    """
+    Process-local LRU of UserColumns for the report endpoints, bounded to
+    max_bytes in total.
+
+    Columns are built from one query on a user's first report and checked
+    against the user's data version in the report cache on every read, so a
+    write in any worker is seen on the next report. Expense inserts, updates
+    and deletes committed through the ORM in this process are applied to the
+    columns in place, and the version bump that follows is adopted; bulk
+    writes drop every entry. Users with more than max_rows expenses, or with
+    amounts finer than cents or above MAX_CENTS, are left to SQL.
+    """
+
+    def __init__(self, versions, max_bytes=64 * 1024 * 1024, max_rows=250_000, enabled=True, max_sql_users=10000):
+        self.versions = versions
+        self.max_bytes = max_bytes
+        self.max_rows = max_rows
+        self.enabled = enabled
+        self.max_sql_users = max_sql_users
+        self._entries = OrderedDict()
+        self._bytes = 0
+        # Data version at which each user was found to need SQL
+        self._sql_users = OrderedDict()
+        # Builds in flight per user: [builds, changes applied meanwhile]
+        self._builds = {}
+        # Incremented when every entry is dropped, invalidating builds in flight
+        self._generation = 0
+        self._lock = threading.Lock()
+        versions.invalidation_listeners.append(self._version_bumped)
+
+    def columns(self, user_id):
+        """
+        Return a user's columns at the current data version, building them on first use
+
+        Returns:
+            UserColumns: The columns, or None if the user's reports must come from SQL
+        """
+        if not self.enabled:
+            return None
+
+        # Read the version before the rows, so a write between the two is
+        # never hidden behind the version it bumped
+        version = self.versions.user_version(user_id)
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] == version:
+                self._entries.move_to_end(user_id)
+                return entry[0]
+            if self._sql_users.get(user_id) == version:
+                return None
+            build = self._builds.setdefault(user_id, [0, 0])
+            build[0] += 1
+            seen = (build[1], self._generation)
+
+        try:
+            columns = self._load(user_id)
+        finally:
+            with self._lock:
+                build[0] -= 1
+                if not build[0]:
+                    del self._builds[user_id]
+                current = (build[1], self._generation) == seen
+
+        with self._lock:
+            if not current:
+                return columns
+            if columns is None or columns.nbytes > self.max_bytes:
+                self._remove(user_id)
+                self._sql_users[user_id] = version
+                self._sql_users.move_to_end(user_id)
+                while len(self._sql_users) > self.max_sql_users:
+                    self._sql_users.popitem(last=False)
+                return None
+            self._store(user_id, columns, version)
+        return columns
+
+    def _load(self, user_id):
+        rows = db.session.execute(select(
+            Expense.id, Expense.date, Expense.category_id, Expense.amount
+        ).where(
+            Expense.user_id == user_id,
+            Expense.date.is_not(None)
+        ).order_by(
+            Expense.date
+        ).limit(self.max_rows + 1)).all()
+        if len(rows) > self.max_rows:
+            return None
+        return UserColumns.from_rows(rows)
+
+    def _store(self, user_id, columns, version):
+        self._remove(user_id)
+        self._entries[user_id] = [columns, version]
+        self._bytes += columns.nbytes
+        while self._bytes > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self._bytes -= evicted.nbytes
+
+    def _remove(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self._bytes -= entry[0].nbytes
+
+    def apply(self, changes):
+        """
+        Apply committed expense changes to the cached columns
+
+        Args:
+            changes: {user id: (removed expense ids, {expense id: (date, category id, amount)})}
+        """
+        with self._lock:
+            for user_id, (removed, inserted) in changes.items():
+                build = self._builds.get(user_id)
+                if build is not None:
+                    build[1] += 1
+                entry = self._entries.get(user_id)
+                if entry is None:
+                    continue
+                columns = entry[0].changed(removed, inserted)
+                if columns is None or len(columns) > self.max_rows:
+                    self._remove(user_id)
+                else:
+                    self._store(user_id, columns, entry[1])
+
+    def drop(self, *user_ids):
+        """Drop the entries of some users, so their next report rebuilds them"""
+        with self._lock:
+            for user_id in user_ids:
+                self._remove(user_id)
+
+    def clear(self):
+        """Drop every entry of this process, e.g. after a bulk write to the expense table"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self._generation += 1
+
+    def _version_bumped(self, user_id, version):
+        # A bump right after the entry's version is this process's own: any
+        # expense change it follows was applied in place or dropped the entry.
+        # Writes in other workers bump the version again and force a rebuild.
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] == version - 1:
+                entry[1] = version
+
+analytics_cache = AnalyticsCache(
+    report_cache,
+    max_bytes=app.config['ANALYTICS_CACHE_MAX_BYTES'],
+    max_rows=app.config['ANALYTICS_CACHE_MAX_ROWS'],
+    enabled=app.config['ANALYTICS_CACHE_ENABLED']
+)
+
+def _change(changes, user_id):
+    return changes.setdefault(user_id, (set(), {}))
+
+@event.listens_for(Expense, 'after_insert')
+@event.listens_for(Expense, 'after_update')
+def _record_expense_row(mapper, connection, target):
+    changes = object_session(target).info.setdefault('analytics_changes', {})
+    for user_id in inspect(target).attrs.user_id.history.deleted:
+        if user_id is not None:
+            _change(changes, user_id)[0].add(target.id)
+    if target.user_id is None:
+        return
+    removed, inserted = _change(changes, target.user_id)
+    removed.add(target.id)
+    if target.date is None:
+        inserted.pop(target.id, None)
+    else:
+        inserted[target.id] = (target.date, target.category_id, target.amount)
+
+@event.listens_for(Expense, 'after_delete')
+def _record_expense_delete(mapper, connection, target):
+    if target.user_id is None:
+        return
+    removed, inserted = _change(object_session(target).info.setdefault('analytics_changes', {}), target.user_id)
+    removed.add(target.id)
+    inserted.pop(target.id, None)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _record_bulk_expense_write(orm_execute_state):
+    # Multi-row INSERTs of imports and Query.update()/delete() bypass the
+    # mapper events, so the affected users are unknown
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, 'table', None)
+        if getattr(table, 'name', None) == Expense.__table__.name:
+            orm_execute_state.session.info['analytics_bulk_write'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _apply_expense_changes(session):
+    changes = session.info.pop('analytics_changes', None)
+    bulk_write = session.info.pop('analytics_bulk_write', False)
+    # The commit has landed; a failure here must not turn it into an error response
+    try:
+        if bulk_write:
+            analytics_cache.clear()
+        elif changes:
+            analytics_cache.apply(changes)
+    except Exception:
+        logger.exception('Error applying expense changes to the analytics cache')
+        analytics_cache.drop(*(changes or ()))
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_expense_changes(session):
+    session.info.pop('analytics_changes', None)
+    session.info.pop('analytics_bulk_write', None)
@@ -9,6 +9,8 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.utils import secure_filename
 import uuid
 from dotenv import load_dotenv
+from database import engine_config, instrument_engine
+from json_provider import json_provider_class
 
 # Load environment variables from .env file
 load_dotenv()
@@ -24,9 +26,10 @@ db = SQLAlchemy(model_class=Base)
 login_manager = LoginManager()
 
 # Create the app
-app = Flask(__name__, static_folder='static')
+# Static files are served by routes.serve_static, with versioned URLs
+app = Flask(__name__, static_folder=None)
 app.secret_key = os.environ.get("SESSION_SECRET", "forest-expense-tracker-secret-key")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
 # Configure MySQL database
 mysql_user = os.environ.get("MYSQL_USER")
@@ -34,18 +37,131 @@ mysql_password = os.environ.get("MYSQL_PASSWORD")
 mysql_host = os.environ.get("MYSQL_HOST")
 mysql_db = os.environ.get("MYSQL_DATABASE")
 
-app.config["SQLALCHEMY_DATABASE_URI"] = f"mysql+pymysql://{mysql_user}:{mysql_password}@{mysql_host}/{mysql_db}"
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+# Configure the database engine from a profile in database.ENGINE_PROFILES:
+# 'mysql' for sync workers, 'mysql-threaded' for threaded or ASGI workers,
+# 'sqlite' or 'memory' to run without a MySQL server. DATABASE_URL and the
+# DB_POOL_* variables override the profile's URI and pool settings.
+app.config['DB_PROFILE'] = os.environ.get('DB_PROFILE', 'mysql')
+app.config["SQLALCHEMY_DATABASE_URI"], app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_config(
+    app.config['DB_PROFILE'],
+    f"mysql+pymysql://{mysql_user}:{mysql_password}@{mysql_host}/{mysql_db}",
+    os.environ
+)
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
 # Configure file uploads
-app.config['UPLOAD_FOLDER'] = os.path.join(app.root_path, 'uploads')
+app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER') or os.path.join(app.root_path, 'uploads')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16 MB max upload
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
+# Configure the receipt pipeline. Uploads are spooled next to UPLOAD_FOLDER so
+# moving them into place is a rename on the same filesystem.
+app.config['RECEIPT_SPOOL_FOLDER'] = os.path.join(app.config['UPLOAD_FOLDER'], '.spool')
+app.config['RECEIPT_WORKERS'] = 2
+app.config['RECEIPT_MAX_PENDING'] = 32
+os.makedirs(app.config['RECEIPT_SPOOL_FOLDER'], exist_ok=True)
+
+# Configure file transfers: None serves files from Python, 'x-sendfile' or
+# 'x-accel-redirect' hands them to the front proxy. For nginx, each location
+# must be an internal alias of the matching folder.
+app.config['FILE_ACCEL'] = os.environ.get('FILE_ACCEL') or None
+app.config['USE_X_SENDFILE'] = app.config['FILE_ACCEL'] == 'x-sendfile'
+app.config['FILE_ACCEL_LOCATIONS'] = {
+    'static': '/_protected/static/',
+    'uploads': '/_protected/uploads/',
+}
+
+# Configure frontend assets and response compression. Bundles are rebuilt at
+# startup when out of date; ASSETS_BUNDLED=0 serves the individual sources.
+app.config['ASSETS_BUNDLED'] = os.environ.get('ASSETS_BUNDLED', '1') == '1'
+app.config['JSON_COMPRESSION_MIN_SIZE'] = 1024  # bytes
+app.config['JSON_COMPRESSION_LEVEL'] = 5  # gzip 1-9, brotli 0-11
+
+# Configure receipt previews. The first size is rendered eagerly at upload.
+app.config['RECEIPT_THUMBNAIL_FOLDER'] = os.environ.get('RECEIPT_THUMBNAIL_FOLDER') or os.path.join(app.instance_path, 'thumbnails')
+app.config['RECEIPT_THUMBNAIL_SIZES'] = (160, 640)
+app.config['RECEIPT_THUMBNAIL_MAX_BYTES'] = 256 * 1024 * 1024
+
+# Configure JSON responses: the encoder ('orjson' or 'default') and the
+# endpoints that serialize expenses from plain rows instead of ORM objects
+app.config['JSON_PROVIDER'] = os.environ.get('JSON_PROVIDER', 'orjson')
+app.config['COLUMNAR_SERIALIZATION'] = set(filter(None, os.environ.get(
+    'COLUMNAR_SERIALIZATION', 'get_expenses,expense_summary,dashboard'
+).split(',')))
+app.json = json_provider_class(app.config['JSON_PROVIDER'])(app)
+
+# Configure expense listing pagination and streaming
+app.config['EXPENSES_PAGE_MAX_LIMIT'] = 500
+app.config['EXPENSES_STREAM_CHUNK_SIZE'] = 1000
+app.config['EXPORT_CHUNK_SIZE'] = 5000
+app.config['IMPORT_CHUNK_SIZE'] = 1000
+
+# Configure the time-series report: the most buckets one response may hold
+# and the longest rolling average window, in buckets
+app.config['TIMESERIES_MAX_BUCKETS'] = 1000
+app.config['TIMESERIES_MAX_WINDOW'] = 90
+
+# Configure report response caching. The 'sqlite' backend keeps entries in a
+# local file shared by every worker on the host; 'memory' is per process.
+app.config['REPORT_CACHE_ENABLED'] = True
+app.config['REPORT_CACHE_BACKEND'] = os.environ.get('REPORT_CACHE_BACKEND', 'sqlite')
+app.config['REPORT_CACHE_PATH'] = os.path.join(app.instance_path, 'report_cache.sqlite')
+app.config['REPORT_CACHE_TTL'] = 300  # seconds
+app.config['REPORT_CACHE_MAX_ENTRIES'] = 2048
+
+# Configure the in-memory analytics cache behind the report endpoints: a
+# columnar copy of each reporting user's expenses, at most MAX_BYTES per
+# worker with the least recently used users evicted. Users with more than
+# MAX_ROWS expenses are reported from SQL.
+app.config['ANALYTICS_CACHE_ENABLED'] = os.environ.get('ANALYTICS_CACHE_ENABLED', '1') == '1'
+app.config['ANALYTICS_CACHE_MAX_BYTES'] = 64 * 1024 * 1024
+app.config['ANALYTICS_CACHE_MAX_ROWS'] = 250_000
+
+# Configure password hashing. Hashes made with other parameters are upgraded
+# on the user's next login. With AUTH_HASH_WORKERS=0 hashing runs on the
+# request thread, for gunicorn's sync workers serving one request at a time.
+# Threaded (gthread) and ASGI workers should set a pool size, which bounds
+# the cores auth work takes per worker and sheds bursts of logins.
+app.config['PASSWORD_HASH_METHOD'] = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+app.config['AUTH_HASH_WORKERS'] = int(os.environ.get('AUTH_HASH_WORKERS', 0))
+app.config['AUTH_HASH_MAX_PENDING'] = 8
+
+# Configure login and registration throttling, per client IP and per account.
+# Counters live in their own cache, of the same kind as the report cache.
+app.config['AUTH_THROTTLE_WINDOW'] = 300  # seconds
+app.config['AUTH_THROTTLE_MAX_PER_IP'] = 30
+app.config['AUTH_THROTTLE_MAX_PER_ACCOUNT'] = 10
+app.config['AUTH_THROTTLE_BACKEND'] = app.config['REPORT_CACHE_BACKEND']
+app.config['AUTH_THROTTLE_PATH'] = os.path.join(app.instance_path, 'auth_throttle.sqlite')
+app.config['AUTH_THROTTLE_MAX_ENTRIES'] = 100000
+
+# Configure the ASGI entry point (asgi.py): threads running the Flask routes
+# that are not served natively by the async engine. ASYNC_DATABASE_URI
+# defaults to SQLALCHEMY_DATABASE_URI with an async driver.
+app.config['ASGI_WSGI_THREADS'] = 10
+app.config['ASYNC_DATABASE_URI'] = os.environ.get('ASYNC_DATABASE_URI')
+
+# Configure the cache of logged in users used by load_user
+app.config['USER_CACHE_TTL'] = 60  # seconds
+app.config['USER_CACHE_MAX_ENTRIES'] = 10000
+
+# Configure request instrumentation. Each worker writes its metrics to
+# METRICS_FOLDER, and /metrics reports the sum over the host's workers.
+# Requests sent with 'X-Profile: 1' by a metrics client are profiled into
+# PROFILER_FOLDER when PROFILER_ENABLED=1.
+app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+app.config['METRICS_FOLDER'] = os.path.join(app.instance_path, 'metrics')
+app.config['METRICS_FLUSH_INTERVAL'] = 5  # seconds
+app.config['SLOW_REQUEST_SECONDS'] = float(os.environ.get('SLOW_REQUEST_SECONDS', 1.0))
+app.config['SLOW_REQUEST_MAX_STATEMENTS'] = 50
+app.config['PROFILER_ENABLED'] = os.environ.get('PROFILER_ENABLED') == '1'
+app.config['PROFILER_INTERVAL'] = 0.005  # seconds between samples
+app.config['PROFILER_FOLDER'] = os.path.join(app.instance_path, 'profiles')
+
+# Configure access to the /metrics endpoints: with a token, requests must send
+# 'Authorization: Bearer <token>'; without one, only loopback clients are served
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
 # Configure application theme
 app.config['THEME_COLOR'] = '#2e7d32'
 app.config['CURRENCY_CODE'] = 'UGX'
@@ -60,13 +176,19 @@ login_manager.login_message_category = 'info'
 
 @login_manager.user_loader
 def load_user(user_id):
-    from models import User
-    return User.query.get(int(user_id))
+    from models import user_cache
+    return user_cache.get(int(user_id))
 
 with app.app_context():
+    instrument_engine(db.engine, 'default')
     from models import User, Expense, Category, Receipt, Budget
     db.create_all()
+    from migrations import run_migrations
+    run_migrations()
     from models import create_default_categories
     create_default_categories()
 
 import routes
+from assets import ensure_assets
+ensure_assets()
+import commands
@@ -0,0 +1,242 @@
+"""
+ASGI entry point, serving the hot JSON reads on SQLAlchemy's async engine.
+
+    uvicorn asgi:application --host 0.0.0.0 --port 5000 --workers 4
+
+GET /api/expenses (full list and keyset pages) and GET /api/budgets/kpi are
+answered by coroutines, so a worker keeps serving other requests while the
+database works. Every other route, including NDJSON streaming, uploads and
+all writes, runs the unchanged Flask app on a thread pool. Native responses
+have the same JSON, validators and caching as under gunicorn, and anything
+they do not handle themselves (no session cookie, invalid dates) falls
+through to Flask so errors and redirects stay identical.
+"""
+from urllib.parse import parse_qsl
+from itsdangerous import BadSignature
+from a2wsgi import WSGIMiddleware
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from werkzeug.datastructures import Headers, MultiDict
+from werkzeug.http import parse_accept_header, parse_cookie, parse_date, parse_etags, quote_etag, http_date
+from app import app, db
+from models import (
+    User, Expense, Category, Receipt, Budget, CachedCategory, UserCache, user_cache,
+    SERIALIZE_BATCH_SIZE, serialize_loaded_expenses, budget_spend_statement, budget_kpi
+)
+from routes import expense_filter_criteria, expense_page_limit, expense_keyset_criterion, expense_page
+from serving import compress_json_body
+from cache import report_cache
+from database import async_engine_options, instrument_engine
+
+# Async drivers replacing the sync ones of SQLALCHEMY_DATABASE_URI
+ASYNC_DRIVERS = {
+    'mysql+pymysql': 'mysql+aiomysql',
+    'mysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg',
+    'postgresql+psycopg2': 'postgresql+asyncpg',
+}
+
+def async_database_uri(uri):
+    """Return the URI of the same database with an async driver"""
+    url = make_url(uri)
+    return url.set(drivername=ASYNC_DRIVERS.get(url.drivername, url.drivername))
+
+# The URI as Flask-SQLAlchemy resolved it, with SQLite paths under the instance folder
+with app.app_context():
+    database_url = db.engine.url
+engine = create_async_engine(
+    app.config.get('ASYNC_DATABASE_URI') or async_database_uri(database_url),
+    **async_engine_options(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+)
+instrument_engine(engine.sync_engine, 'async')
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+flask_application = WSGIMiddleware(app, workers=app.config['ASGI_WSGI_THREADS'])
+
+async def load_categories(session):
+    """Return every category by id, as the registry would"""
+    categories = await session.scalars(select(Category).order_by(Category.id))
+    return {
+        category.id: CachedCategory(category.id, category.name, category.color, category.icon)
+        for category in categories
+    }
+
+async def serialize_expenses(session, expenses):
+    """Async counterpart of models.serialize_expenses"""
+    if not expenses:
+        return []
+
+    receipts_by_expense = {}
+    expense_ids = [expense.id for expense in expenses]
+    for start in range(0, len(expense_ids), SERIALIZE_BATCH_SIZE):
+        batch = expense_ids[start:start + SERIALIZE_BATCH_SIZE]
+        receipts = await session.scalars(
+            select(Receipt).where(Receipt.expense_id.in_(batch)).order_by(Receipt.id)
+        )
+        for receipt in receipts:
+            receipts_by_expense.setdefault(receipt.expense_id, []).append(receipt)
+
+    return serialize_loaded_expenses(expenses, receipts_by_expense, await load_categories(session))
+
+async def get_expenses(session, user_id, args):
+    """GET /api/expenses, except NDJSON streaming"""
+    if args.get('format') == 'ndjson':
+        return None
+    try:
+        criteria, order_by, sort_column, descending = expense_filter_criteria(args, user_id)
+    except ValueError:
+        return None
+    statement = select(Expense).where(*criteria).order_by(*order_by)
+
+    limit = args.get('limit', type=int)
+    cursor = args.get('cursor')
+
+    # Without pagination parameters keep returning the full list
+    if limit is None and cursor is None:
+        expenses = (await session.scalars(statement)).all()
+        return 200, await serialize_expenses(session, expenses)
+
+    limit = expense_page_limit(limit)
+
+    if cursor:
+        try:
+            statement = statement.where(expense_keyset_criterion(cursor, sort_column, descending))
+        except ValueError:
+            return 400, {'error': 'Invalid cursor'}
+
+    # Fetch one extra row to know whether another page exists
+    rows = (await session.scalars(statement.limit(limit + 1))).all()
+    expenses, next_cursor = expense_page(rows, limit, sort_column)
+
+    return 200, {
+        'expenses': await serialize_expenses(session, expenses),
+        'next_cursor': next_cursor
+    }
+
+async def get_all_budgets_kpi(session, user_id, args):
+    """GET /api/budgets/kpi"""
+    rows = (await session.execute(budget_spend_statement(
+        Budget.user_id == user_id,
+        Budget.is_active == True
+    ).order_by(Budget.id))).all()
+    categories = await load_categories(session)
+    return 200, [budget_kpi(budget, total_spent, categories) for budget, total_spent in rows]
+
+# Natively served GET paths: (Flask endpoint name, handler, uses report_cache.cached)
+ASYNC_ROUTES = {
+    '/api/expenses': ('get_expenses', get_expenses, False),
+    '/api/budgets/kpi': ('get_all_budgets_kpi', get_all_budgets_kpi, True),
+}
+
+async def load_user_id(session, headers):
+    """
+    Return the id of the user logged in by the Flask session cookie, or None
+    to let Flask-Login deal with the request
+    """
+    cookie = parse_cookie(headers.get('Cookie', '')).get(app.config['SESSION_COOKIE_NAME'])
+    if not cookie:
+        return None
+    serializer = app.session_interface.get_signing_serializer(app)
+    try:
+        data = serializer.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds()))
+        user_id = int(data['_user_id'])
+    except (BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+    if user_cache.cached(user_id) is None:
+        row = (await session.execute(select(*UserCache.COLUMNS).where(User.id == user_id))).first()
+        if row is None:
+            return None
+        user_cache.store(row)
+    return user_id
+
+async def send_response(send, status, headers, body=b''):
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+async def serve_native(route, scope, send):
+    """
+    Answer a request with its native handler
+
+    Returns:
+        bool: False if Flask must handle the request instead
+    """
+    endpoint, handler, cached = route
+    headers = Headers([(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']])
+    args = MultiDict(parse_qsl(scope['query_string'].decode('latin-1'), keep_blank_values=True))
+
+    async with Session() as session:
+        user_id = await load_user_id(session, headers)
+        if user_id is None:
+            return False
+
+        # The same validators as report_cache.conditional
+        etag, last_modified = report_cache.validators(user_id, endpoint, args, {})
+        response_headers = Headers({'Cache-Control': 'private, no-cache', 'ETag': quote_etag(etag, weak=True)})
+        if last_modified:
+            response_headers['Last-Modified'] = http_date(last_modified)
+        if report_cache.not_modified(
+            etag, last_modified,
+            parse_etags(headers.get('If-None-Match')), parse_date(headers.get('If-Modified-Since'))
+        ):
+            await send_response(send, 304, response_headers)
+            return True
+
+        key = None
+        entry = None
+        if cached and report_cache.enabled:
+            key = report_cache.entry_key(user_id, endpoint, args, {})
+            entry = report_cache.backend.get(key)
+
+        if entry is not None:
+            status, body = entry['status'], entry['body'].encode('utf-8')
+        else:
+            result = await handler(session, user_id, args)
+            if result is None:
+                return False
+            status, payload = result
+            # Byte for byte what jsonify returns outside debug mode
+            body = f"{app.json.dumps(payload, separators=(',', ':'))}\n".encode('utf-8')
+            if key is not None and status == 200:
+                report_cache.backend.set(key, {
+                    'body': body.decode('utf-8'),
+                    'status': status,
+                    'mimetype': 'application/json'
+                }, report_cache.ttl)
+
+    if status != 200:
+        # Only successful responses carry validators, as under Flask
+        response_headers = Headers()
+    response_headers['Content-Type'] = 'application/json'
+    if status == 200:
+        response_headers['Vary'] = 'Accept-Encoding'
+        body, encoding = compress_json_body(body, parse_accept_header(headers.get('Accept-Encoding')))
+        if encoding:
+            response_headers['Content-Encoding'] = encoding
+    response_headers['Content-Length'] = str(len(body))
+    await send_response(send, status, response_headers, body)
+    return True
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    if scope['type'] == 'http' and scope['method'] == 'GET':
+        route = ASYNC_ROUTES.get(scope['path'])
+        if route and await serve_native(route, scope, send):
+            return
+
+    await flask_application(scope, receive, send)
@@ -0,0 +1,181 @@
+import os
+import re
+import gzip
+import json
+import hashlib
+import logging
+import tempfile
+from app import app
+from serving import STATIC_FOLDER, COMPRESSED_SUFFIXES, file_digest, static_url
+
+try:
+    import brotli
+except ImportError:  # Brotli variants are skipped without the brotli package
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bundles and their sources, relative to the static folder, in load order
+ASSET_BUNDLES = {
+    'app.js': [
+        'js/components/Navigation.js',
+        'js/components/Dashboard.js',
+        'js/components/ExpenseForm.js',
+        'js/components/ExpenseList.js',
+        'js/components/ExpenseReport.js',
+        'js/components/ReceiptUpload.js',
+        'js/components/BudgetForm.js',
+        'js/components/BudgetList.js',
+        'js/services/api.js',
+        'js/app.js',
+    ],
+    'app.css': [
+        'css/style.css',
+    ],
+}
+
+DIST_FOLDER = 'dist'
+MANIFEST_PATH = os.path.join(STATIC_FOLDER, DIST_FOLDER, 'manifest.json')
+
+# Fingerprinted bundles and their compressed variants, e.g. app.1a2b3c4d5e6f.js.gz
+BUNDLE_FILENAME = re.compile(r'^([\w-]+\.[0-9a-f]{12}\.\w+)(\.gz|\.br)?$')
+
+def minify_js(source):
+    """
+    Conservatively minify JavaScript: drop indentation, blank lines and
+    comments that take whole lines. Code is never rewritten within a line,
+    so string, template and regex literals are left intact.
+    """
+    lines = []
+    in_comment = False
+    in_template = False
+    for line in source.splitlines():
+        stripped = line.strip()
+        if in_comment:
+            in_comment = not stripped.endswith('*/')
+            continue
+        if not in_template:
+            if not stripped or stripped.startswith('//'):
+                continue
+            if stripped.startswith('/*'):
+                in_comment = not stripped.endswith('*/')
+                continue
+        lines.append(stripped)
+        # Template literals span lines; track whether this line ends inside one
+        if len(re.findall(r'(?<!\\)`', stripped)) % 2:
+            in_template = not in_template
+    return '\n'.join(lines) + '\n'
+
+def minify_css(source):
+    """Minify CSS by dropping comments and collapsing whitespace"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+MINIFIERS = {'.js': minify_js, '.css': minify_css}
+
+def _write(path, data):
+    # Write then rename, so workers never serve a partial file
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path), delete=False) as f:
+        f.write(data)
+    os.replace(f.name, path)
+
+def load_manifest():
+    """
+    Return the asset manifest written by build_assets
+
+    Returns:
+        dict: Bundle name to {'file': path, 'sources': {source: digest}}
+    """
+    try:
+        stat = os.stat(MANIFEST_PATH)
+    except FileNotFoundError:
+        return {}
+    cached = getattr(load_manifest, '_cached', None)
+    if cached is None or cached[0] != stat.st_mtime_ns:
+        with open(MANIFEST_PATH) as f:
+            cached = (stat.st_mtime_ns, json.load(f))
+        load_manifest._cached = cached
+    return cached[1]
+
+def _source_digests(name):
+    return {source: file_digest(os.path.join(STATIC_FOLDER, source)) for source in ASSET_BUNDLES[name]}
+
+def assets_stale():
+    """Return whether any bundle is missing or older than its sources"""
+    manifest = load_manifest()
+    return any(
+        name not in manifest or manifest[name]['sources'] != _source_digests(name)
+        for name in ASSET_BUNDLES
+    )
+
+def build_assets():
+    """
+    Concatenate and minify each bundle into static/dist under a name
+    fingerprinted with its content hash, with gzip and brotli variants, and
+    record the bundles in the manifest. Files of the previous build are kept
+    for pages still referencing them; older ones are removed.
+
+    Returns:
+        dict: The new manifest
+    """
+    dist = os.path.join(STATIC_FOLDER, DIST_FOLDER)
+    os.makedirs(dist, exist_ok=True)
+    previous = load_manifest()
+
+    manifest = {}
+    for name, sources in ASSET_BUNDLES.items():
+        stem, extension = os.path.splitext(name)
+        parts = []
+        for source in sources:
+            with open(os.path.join(STATIC_FOLDER, source), encoding='utf-8') as f:
+                parts.append(MINIFIERS[extension](f.read()))
+        # Separate scripts so a file without a trailing semicolon cannot merge into the next
+        content = (';\n' if extension == '.js' else '').join(parts).encode('utf-8')
+
+        filename = f"{stem}.{hashlib.sha256(content).hexdigest()[:12]}{extension}"
+        path = os.path.join(dist, filename)
+        _write(path, content)
+        _write(path + COMPRESSED_SUFFIXES['gzip'], gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(path + COMPRESSED_SUFFIXES['br'], brotli.compress(content, quality=11))
+
+        manifest[name] = {'file': f"{DIST_FOLDER}/{filename}", 'sources': _source_digests(name)}
+        logger.info(f"Built {name}: {len(content)} bytes from {len(sources)} files")
+
+    _write(MANIFEST_PATH, json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+    keep = {os.path.basename(entry['file']) for entry in list(manifest.values()) + list(previous.values())}
+    for entry in os.scandir(dist):
+        match = BUNDLE_FILENAME.match(entry.name)
+        if match and match.group(1) not in keep:
+            os.remove(entry.path)
+    return manifest
+
+def ensure_assets():
+    """Build the bundles if they are missing or out of date"""
+    try:
+        if assets_stale():
+            build_assets()
+    except OSError as e:
+        # e.g. a read-only static folder; pages then load the sources
+        logger.warning(f"Could not build assets: {str(e)}")
+
+def asset_urls(name):
+    """
+    Return the URLs to load a bundle with: the fingerprinted bundle when it
+    is up to date, otherwise each of its sources
+
+    Args:
+        name: The bundle name, e.g. 'app.js'
+
+    Returns:
+        list: Versioned static URLs
+    """
+    entry = load_manifest().get(name)
+    if app.config['ASSETS_BUNDLED'] and entry and entry['sources'] == _source_digests(name):
+        return [static_url(entry['file'])]
+    return [static_url(source) for source in ASSET_BUNDLES[name]]
+
+app.jinja_env.globals['asset_urls'] = asset_urls
@@ -0,0 +1,122 @@
+import time
+import secrets
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+from app import app
+from cache import create_cache_backend
+
+class AuthBusyError(Exception):
+    """Raised when the password hashing pool has no free slot"""
+
+class PasswordHasher:
+    """
+    Password hashing, inline or on a small dedicated thread pool.
+
+    The pool is for workers serving many requests per process, i.e. gthread
+    or ASGI workers. hashlib releases the GIL while hashing, so the pool size
+    caps how many CPU cores auth work can take from each worker process. At
+    most max_workers + max_pending hashes are in flight; beyond that callers
+    get AuthBusyError instead of queueing behind a burst of logins. Sync
+    workers serve one request at a time, so with max_workers=0 hashes run on
+    the request thread.
+    """
+
+    def __init__(self, method, max_workers=2, max_pending=8):
+        self.method = method
+        self._executor = None
+        if max_workers:
+            self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='auth')
+            self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._prefix = None
+        self._dummy_hash = None
+
+    def _run(self, func, *args):
+        if self._executor is None:
+            return func(*args)
+        if not self._slots.acquire(blocking=False):
+            raise AuthBusyError()
+        try:
+            future = self._executor.submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result()
+
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Check a password against a hash of any supported method"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def verify_missing(self, password):
+        """
+        Spend the cost of a verification for an unknown account, so response
+        times do not reveal which accounts exist
+
+        Returns:
+            bool: Always False
+        """
+        if self._dummy_hash is None:
+            self._dummy_hash = self.hash(secrets.token_hex(16))
+        self.verify(self._dummy_hash, password)
+        return False
+
+    def needs_rehash(self, password_hash):
+        """Return whether a hash was made with other parameters than the configured ones"""
+        if self._prefix is None:
+            # Hash once to learn how werkzeug spells the method with its defaults filled in
+            self._prefix = self.hash('').split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._prefix
+
+class AuthThrottle:
+    """
+    Fixed-window attempt counters for the login and registration forms,
+    kept in a cache backend of their own so report responses cannot evict
+    them. With the 'sqlite' backend every worker on the host shares them.
+
+    Keys are '<scope>:<value>', e.g. 'ip:203.0.113.7' or 'account:a@b.c',
+    and each scope has its own limit per window.
+    """
+
+    def __init__(self, backend, window, limits):
+        self.backend = backend
+        self.window = window
+        self.limits = limits
+
+    def _entry(self, key):
+        entry = self.backend.get(f"throttle:{key}")
+        if entry is None or entry[1] <= time.time():
+            return [0, time.time() + self.window]
+        return entry
+
+    def blocked(self, *keys):
+        """Return whether any of the keys reached its limit in the current window"""
+        return any(self._entry(key)[0] >= self.limits[key.split(':', 1)[0]] for key in keys)
+
+    def hit(self, *keys):
+        """Count an attempt against each key"""
+        for key in keys:
+            count, window_end = self._entry(key)
+            # Counters race between workers; an occasional lost hit is acceptable
+            self.backend.set(f"throttle:{key}", [count + 1, window_end], max(1, int(window_end - time.time())))
+
+    def clear(self, *keys):
+        for key in keys:
+            self.backend.set(f"throttle:{key}", [0, time.time()], 1)
+
+password_hasher = PasswordHasher(
+    app.config['PASSWORD_HASH_METHOD'],
+    max_workers=app.config['AUTH_HASH_WORKERS'],
+    max_pending=app.config['AUTH_HASH_MAX_PENDING']
+)
+
+auth_throttle = AuthThrottle(create_cache_backend(
+    app.config['AUTH_THROTTLE_BACKEND'], app.config['AUTH_THROTTLE_PATH'], app.config['AUTH_THROTTLE_MAX_ENTRIES']
+), app.config['AUTH_THROTTLE_WINDOW'], {
+    'ip': app.config['AUTH_THROTTLE_MAX_PER_IP'],
+    'account': app.config['AUTH_THROTTLE_MAX_PER_ACCOUNT'],
+})
@@ -0,0 +1,332 @@
+"""
+Benchmark every /api/* endpoint on a synthetic data set and save the
+results as JSON for comparison between runs.
+
+The data set is generated by benchmarks/synthetic.py into a SQLite file,
+which is reused by later runs with the same scale and seed. Requests go
+through the Flask test client as the data set's primary user, one at a
+time, with the report cache disabled so every request is computed. Each
+scenario reports requests/sec, p50/p99 latency, SQL statements per request,
+response size and the peak Python memory allocated by one request.
+
+Write scenarios run as create, update, delete lifecycles on their own rows,
+so the data set is unchanged afterwards. The receipt thumbnail and receipt
+delete endpoints are not covered: synthetic receipts have no files.
+
+Usage:
+    python benchmarks/api_suite.py --scale 100k
+    python benchmarks/api_suite.py --scale 100k --only expenses --compare benchmarks/results/previous.json
+    python benchmarks/api_suite.py --scale 100k --only 'expenses_(full|page)' --serialization orm --json-provider default
+"""
+import os
+import re
+import sys
+import json
+import time
+import resource
+import argparse
+import platform
+import statistics
+import subprocess
+import tracemalloc
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+
+IMPORT_MARKER = 'Benchmark import'
+IMPORT_ROWS = 200
+
+class Scenario:
+    """
+    One benchmarked endpoint. url and data may be callables taking the
+    fixtures and the request index; collect is called with the fixtures and
+    each response.
+    """
+
+    def __init__(self, name, method, url, data=None, json=None, content_type=None, collect=None, warmup=True):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.data = data
+        self.json = json
+        self.content_type = content_type
+        self.collect = collect
+        self.warmup = warmup
+
+    def request(self, client, fixtures, index):
+        resolve = lambda value: value(fixtures, index) if callable(value) else value
+        url = resolve(self.url).format(**fixtures)
+        kwargs = {}
+        if self.data is not None:
+            kwargs['data'] = resolve(self.data)
+        if self.json is not None:
+            kwargs['json'] = resolve(self.json)
+        if self.content_type:
+            kwargs['content_type'] = self.content_type
+        response = client.open(url, method=self.method, **kwargs)
+        body = response.get_data()
+        if response.status_code >= 400:
+            raise RuntimeError(f"{self.method} {url} returned {response.status_code}: {body[:200]!r}")
+        if self.collect:
+            self.collect(fixtures, response)
+        return len(body)
+
+def _collect_id(key):
+    return lambda fixtures, response: fixtures[key].append(response.get_json()['id'])
+
+def _created(key, pop=False):
+    def url(fixtures, index):
+        ids = fixtures[key]
+        return str(ids.pop() if pop else ids[index % len(ids)])
+    return url
+
+def _import_csv(fixtures, index):
+    lines = ['title,amount,date,category_id']
+    lines += [f"{IMPORT_MARKER} {index},{1000 + n},2000-01-01,{fixtures['category_id']}" for n in range(IMPORT_ROWS)]
+    return '\n'.join(lines) + '\n'
+
+SCENARIOS = [
+    Scenario('expenses_full', 'GET', '/api/expenses'),
+    Scenario('expenses_page', 'GET', '/api/expenses?limit=50'),
+    Scenario('expenses_page_next', 'GET', '/api/expenses?limit=50&cursor={cursor}'),
+    Scenario('expenses_filtered', 'GET', '/api/expenses?limit=50&category_id={category_id}&start_date={year}-01-01&sort_by=amount'),
+    Scenario('expenses_ndjson', 'GET', '/api/expenses?format=ndjson'),
+    Scenario('expenses_export_csv', 'GET', '/api/expenses/export?format=csv'),
+    Scenario('expense', 'GET', '/api/expenses/{expense_id}'),
+    Scenario('categories', 'GET', '/api/categories'),
+    Scenario('budgets', 'GET', '/api/budgets'),
+    Scenario('budget', 'GET', '/api/budgets/{budget_id}'),
+    Scenario('budget_kpi', 'GET', '/api/budgets/{budget_id}/kpi'),
+    Scenario('budgets_kpi', 'GET', '/api/budgets/kpi'),
+    Scenario('reports_monthly', 'GET', '/api/reports/monthly?year={year}'),
+    Scenario('reports_category', 'GET', '/api/reports/category'),
+    Scenario('reports_summary', 'GET', '/api/reports/summary'),
+    Scenario('reports_timeseries', 'GET', '/api/reports/timeseries?interval=week&by_category=1&fill=1'),
+    Scenario('dashboard', 'GET', '/api/dashboard?year={year}'),
+    Scenario('expense_create', 'POST', '/api/expenses', warmup=False, collect=_collect_id('created_expenses'),
+             data=lambda fixtures, index: {'title': f"Benchmark {index}", 'amount': '1500', 'date': f"{fixtures['year']}-06-15",
+                                           'category_id': str(fixtures['category_id'])}),
+    Scenario('expense_update', 'PUT', lambda fixtures, index: '/api/expenses/' + _created('created_expenses')(fixtures, index),
+             warmup=False, data=lambda fixtures, index: {'amount': str(2000 + index)}),
+    Scenario('expense_delete', 'DELETE', lambda fixtures, index: '/api/expenses/' + _created('created_expenses', pop=True)(fixtures, index),
+             warmup=False),
+    Scenario('expenses_import', 'POST', '/api/expenses/import?format=csv', data=_import_csv, content_type='text/csv', warmup=False),
+    Scenario('category_create', 'POST', '/api/categories', warmup=False, collect=_collect_id('created_categories'),
+             json=lambda fixtures, index: {'name': f"Benchmark new category {index}"}),
+    Scenario('category_update', 'PUT', lambda fixtures, index: '/api/categories/' + _created('created_categories')(fixtures, index),
+             warmup=False, json=lambda fixtures, index: {'color': f"#{index % 0x1000000:06x}"}),
+    Scenario('category_delete', 'DELETE', lambda fixtures, index: '/api/categories/' + _created('created_categories', pop=True)(fixtures, index),
+             warmup=False),
+    Scenario('budget_create', 'POST', '/api/budgets', warmup=False, collect=_collect_id('created_budgets'),
+             json=lambda fixtures, index: {'name': f"Benchmark budget {index}", 'amount': 500000,
+                                           'start_date': f"{fixtures['year']}-01-01", 'end_date': f"{fixtures['year']}-12-31"}),
+    Scenario('budget_update', 'PUT', lambda fixtures, index: '/api/budgets/' + _created('created_budgets')(fixtures, index),
+             warmup=False, json=lambda fixtures, index: {'amount': 600000 + index}),
+    Scenario('budget_delete', 'DELETE', lambda fixtures, index: '/api/budgets/' + _created('created_budgets', pop=True)(fixtures, index),
+             warmup=False),
+]
+
+def load_fixtures(app, client, user_id, year):
+    """Ids and cursors the scenario URLs are filled in with"""
+    from models import Budget
+    first_page = client.get('/api/expenses?limit=50').get_json()
+    with app.app_context():
+        budget_id = Budget.query.filter_by(user_id=user_id).order_by(Budget.id).first().id
+    return {
+        'user_id': user_id,
+        'year': year,
+        'cursor': first_page['next_cursor'] or '',
+        'expense_id': first_page['expenses'][0]['id'],
+        'category_id': first_page['expenses'][0]['category_id'],
+        'budget_id': budget_id,
+        'created_expenses': [],
+        'created_categories': [],
+        'created_budgets': [],
+    }
+
+def remove_imported(user_id):
+    """Delete the rows added by the import scenario and refresh their rollup buckets"""
+    from app import db
+    from models import Expense, refresh_daily_spend_range
+    imported = Expense.query.filter(Expense.user_id == user_id, Expense.title.startswith(IMPORT_MARKER))
+    days = {expense.date.date() for expense in imported}
+    imported.delete(synchronize_session=False)
+    for day in days:
+        refresh_daily_spend_range(user_id, day, day)
+    db.session.commit()
+
+def run_scenario(engine, client, scenario, fixtures, iterations, warmup):
+    """Time the scenario's requests, then trace the memory of one more"""
+    from sqlalchemy import event
+
+    statements = [0]
+    def count_statement(*args):
+        statements[0] += 1
+
+    index = 0
+    for _ in range(warmup if scenario.warmup else 0):
+        scenario.request(client, fixtures, index)
+        index += 1
+
+    latencies = []
+    sizes = []
+    event.listen(engine, 'after_cursor_execute', count_statement)
+    try:
+        for _ in range(iterations):
+            started = time.perf_counter()
+            sizes.append(scenario.request(client, fixtures, index))
+            latencies.append(time.perf_counter() - started)
+            index += 1
+    finally:
+        event.remove(engine, 'after_cursor_execute', count_statement)
+
+    tracemalloc.start()
+    try:
+        scenario.request(client, fixtures, index)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'method': scenario.method,
+        'iterations': iterations,
+        'requests_per_second': iterations / sum(latencies),
+        'p50_ms': latencies[len(latencies) // 2] * 1000,
+        'p99_ms': latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'queries_per_request': statements[0] / iterations,
+        'response_bytes': statistics.fmean(sizes),
+        'peak_memory_bytes': peak,
+    }
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(previous, results):
+    """Print the change of each scenario against an earlier results file"""
+    print(f"\ncompared with {previous['meta'].get('revision')} at {previous['meta']['started']}")
+    print(f"{'scenario':<22}{'p50 ms':>18}{'change':>9}{'queries':>14}")
+    for name, result in results.items():
+        old = previous['results'].get(name)
+        if not old or 'error' in old or 'error' in result:
+            continue
+        change = (result['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+        print(f"{name:<22}{old['p50_ms']:>8.2f} -> {result['p50_ms']:<7.2f}{change:>+8.1f}%"
+              f"{old['queries_per_request']:>6.1f} -> {result['queries_per_request']:<5.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=synthetic.SCALES, default='1k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', help='SQLite file of the data set (default instance/benchmark-<scale>-<seed>.sqlite)')
+    parser.add_argument('--memory', action='store_true', help='Generate into an in-memory database instead')
+    parser.add_argument('--iterations', type=int, default=50, help='Measured requests per scenario')
+    parser.add_argument('--warmup', type=int, default=3, help='Unmeasured requests before each read scenario')
+    parser.add_argument('--only', help='Run the scenarios whose name matches this regular expression')
+    parser.add_argument('--report-cache', action='store_true', help='Keep the report cache enabled')
+    parser.add_argument('--json-provider', choices=['default', 'orjson'], help='Override JSON_PROVIDER')
+    parser.add_argument('--serialization', choices=['orm', 'columnar'],
+                        help='Serialize expenses from ORM objects or plain rows on every endpoint (default COLUMNAR_SERIALIZATION)')
+    parser.add_argument('--output', help='Results file (default benchmarks/results/<scale>-<time>.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare with')
+    args = parser.parse_args()
+
+    database = None
+    if not args.memory:
+        database = args.database or os.path.join(ROOT, 'instance', f"benchmark-{args.scale}-{args.seed}.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+        metadata = synthetic.load_metadata(database)
+        if os.path.exists(database) and (metadata is None or metadata['scale'] != args.scale or metadata['seed'] != args.seed
+                                         or metadata.get('end_date') != synthetic.END_DATE.isoformat()):
+            raise SystemExit(f"{database} holds another data set; remove it or pass --database")
+    synthetic.use_database(database)
+    if args.json_provider:
+        os.environ['JSON_PROVIDER'] = args.json_provider
+
+    from main import app
+    from app import db
+    from cache import report_cache
+    from models import User
+
+    report_cache.enabled = args.report_cache
+    if args.serialization:
+        app.config['COLUMNAR_SERIALIZATION'] = set(app.view_functions) if args.serialization == 'columnar' else set()
+    started = datetime.now()
+    with app.app_context():
+        metadata = synthetic.load_metadata(database) if database else None
+        if metadata is None:
+            generation_started = time.perf_counter()
+            metadata = synthetic.generate(args.scale, args.seed)
+            print(f"Generated {json.dumps(metadata['counts'])} in {time.perf_counter() - generation_started:.1f}s")
+            if database:
+                with open(synthetic.metadata_path(database), 'w') as f:
+                    json.dump(metadata, f, indent=2)
+        user_id = User.query.filter_by(email=synthetic.BENCHMARK_EMAIL).one().id
+        engine = db.engine
+
+    # Requests run outside the app context above, so each gets its own, as in production
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    fixtures = load_fixtures(app, client, user_id, synthetic.END_DATE.year)
+
+    scenarios = [scenario for scenario in SCENARIOS if not args.only or re.search(args.only, scenario.name)]
+    results = {}
+    print(f"{'scenario':<22}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}{'queries':>9}{'KB':>9}{'peak MB':>9}")
+    try:
+        for scenario in scenarios:
+            try:
+                result = run_scenario(engine, client, scenario, fixtures, args.iterations, args.warmup)
+            except RuntimeError as e:
+                results[scenario.name] = {'method': scenario.method, 'error': str(e)}
+                print(f"{scenario.name:<22}failed: {str(e)}")
+                continue
+            results[scenario.name] = result
+            print(f"{scenario.name:<22}{result['requests_per_second']:>9.1f}{result['p50_ms']:>9.2f}"
+                  f"{result['p99_ms']:>9.2f}{result['queries_per_request']:>9.1f}"
+                  f"{result['response_bytes'] / 1024:>9.1f}{result['peak_memory_bytes'] / 1e6:>9.2f}")
+    finally:
+        with app.app_context():
+            remove_imported(user_id)
+
+    output = {
+        'meta': {
+            'started': started.isoformat(timespec='seconds'),
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'database': app.config['SQLALCHEMY_DATABASE_URI'],
+            'dataset': metadata,
+            'iterations': args.iterations,
+            'warmup': args.warmup,
+            'report_cache': args.report_cache,
+            'json_provider': type(app.json).__name__,
+            'columnar_serialization': sorted(app.config['COLUMNAR_SERIALIZATION']),
+            # ru_maxrss is in KB on Linux
+            'max_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        },
+        'results': results,
+    }
+    path = args.output or os.path.join(ROOT, 'benchmarks', 'results', f"{args.scale}-{started:%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(output, f, indent=2)
+    print(f"\nSaved results to {path}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Compare requests/sec and latency percentiles of running deployments, e.g.
+the gunicorn sync workers against the uvicorn ASGI entry point.
+
+Each target gets the same closed-loop load: --concurrency keep-alive
+connections, each sending its next request as soon as the previous response
+arrived, cycling through the paths for --duration seconds after a warmup.
+One connection logs in with --email/--password through the login form and
+every connection sends the session cookie it got, so the API sees a real
+session without hashing the password once per connection.
+
+Usage:
+    gunicorn --bind 127.0.0.1:5000 --workers 4 main:app
+    uvicorn asgi:application --host 127.0.0.1 --port 5001 --workers 4
+    python benchmarks/asgi_load.py --email a@b.c --password secret \\
+        --target sync=http://127.0.0.1:5000 --target asgi=http://127.0.0.1:5001 \\
+        --path /api/expenses?limit=50 --path /api/budgets/kpi --concurrency 200
+"""
+import re
+import json
+import time
+import asyncio
+import argparse
+import statistics
+from urllib.parse import urlsplit, urlencode
+
+class Connection:
+    """Minimal HTTP/1.1 keep-alive client connection carrying a session cookie"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookies = {}
+        self.reader = self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+    async def request(self, method, path, body=b'', content_type=None):
+        """
+        Send one request and read the whole response
+
+        Returns:
+            tuple: (status, headers dict, body bytes)
+        """
+        if self.writer is None or self.writer.is_closing():
+            await self.open()
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Accept-Encoding: identity"]
+        if self.cookies:
+            lines.append("Cookie: " + '; '.join(f"{name}={value}" for name, value in self.cookies.items()))
+        if body or method == 'POST':
+            lines.append(f"Content-Length: {len(body)}")
+            lines.append(f"Content-Type: {content_type}")
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('Connection closed by server')
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = (await self.reader.readline()).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            name, value = name.strip().lower(), value.strip()
+            if name == 'set-cookie':
+                cookie = value.split(';', 1)[0]
+                cookie_name, _, cookie_value = cookie.partition('=')
+                self.cookies[cookie_name] = cookie_value
+            headers[name] = value
+
+        if headers.get('transfer-encoding') == 'chunked':
+            data = b''
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                chunk = await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+                data += chunk[:-2]
+        elif 'content-length' in headers:
+            data = await self.reader.readexactly(int(headers['content-length']))
+        else:
+            data = await self.reader.read()
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status, headers, data
+
+    async def login(self, email, password):
+        """Log in through the login form, including its CSRF token"""
+        _, _, page = await self.request('GET', '/login')
+        match = re.search(rb'name="csrf_token"[^>]*value="([^"]+)"', page)
+        form = {'email': email, 'password': password}
+        if match:
+            form['csrf_token'] = match.group(1).decode('ascii')
+        status, headers, _ = await self.request(
+            'POST', '/login', urlencode(form).encode('ascii'), 'application/x-www-form-urlencoded'
+        )
+        if status != 302 or urlsplit(headers.get('location', '')).path.startswith('/login'):
+            raise SystemExit(f"Login failed on {self.host}:{self.port} with status {status}")
+
+async def run_client(connection, paths, offset, stop_at, record_from, latencies, errors):
+    index = offset
+    while True:
+        now = time.perf_counter()
+        if now >= stop_at:
+            return
+        path = paths[index % len(paths)]
+        index += 1
+        try:
+            status, _, _ = await connection.request('GET', path)
+        except (ConnectionError, asyncio.IncompleteReadError, OSError):
+            errors.append('connection')
+            connection.close()
+            continue
+        elapsed = time.perf_counter() - now
+        if now >= record_from:
+            if status == 200:
+                latencies.append(elapsed)
+            else:
+                errors.append(status)
+
+async def load_target(url, args):
+    """Run the load against one deployment and return its statistics"""
+    parts = urlsplit(url)
+    connections = [Connection(parts.hostname, parts.port or 80) for _ in range(args.concurrency)]
+    # Log in once, password hashing is deliberately slow and throttled
+    await connections[0].login(args.email, args.password)
+    for connection in connections[1:]:
+        connection.cookies = dict(connections[0].cookies)
+
+    latencies, errors = [], []
+    started = time.perf_counter()
+    record_from = started + args.warmup
+    stop_at = record_from + args.duration
+    await asyncio.gather(*(
+        run_client(connection, args.path, offset, stop_at, record_from, latencies, errors)
+        for offset, connection in enumerate(connections)
+    ))
+    for connection in connections:
+        connection.close()
+
+    latencies.sort()
+    def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000 if latencies else None
+    return {
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_second': len(latencies) / args.duration,
+        'p50_ms': percentile(0.50),
+        'p99_ms': percentile(0.99),
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--target', action='append', required=True, help='name=base URL, repeatable')
+    parser.add_argument('--path', action='append', help='Request path, repeatable (default /api/expenses?limit=50)')
+    parser.add_argument('--email', required=True, help='Login email of an existing user')
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=100, help='Concurrent keep-alive connections')
+    parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds per target')
+    parser.add_argument('--warmup', type=float, default=5.0, help='Unmeasured seconds before each run')
+    parser.add_argument('--json', action='store_true', help='Print results as JSON')
+    args = parser.parse_args()
+    args.path = args.path or ['/api/expenses?limit=50']
+
+    results = {}
+    for target in args.target:
+        name, _, url = target.partition('=')
+        results[name] = asyncio.run(load_target(url, args))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.concurrency} connections, {args.duration:.0f}s, paths: {', '.join(args.path)}")
+    print(f"{'target':<12}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, result in results.items():
+        p50 = f"{result['p50_ms']:.1f}" if result['p50_ms'] is not None else '-'
+        p99 = f"{result['p99_ms']:.1f}" if result['p99_ms'] is not None else '-'
+        print(f"{name:<12}{result['requests_per_second']:>10.1f}{p50:>10}{p99:>10}{result['errors']:>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+"""
+Compare the SPA's time to first paint using the old request waterfall
+against the single /api/dashboard bootstrap request.
+
+Requests go through the Flask test client against the configured database,
+as an existing user, with the report cache disabled so every request is
+computed. Each request is charged a simulated network round trip.
+
+Usage:
+    python benchmarks/dashboard_bootstrap.py --user-id 1 --rtt-ms 80
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from cache import report_cache
+
+WATERFALL_URLS = [
+    '/api/categories',
+    '/api/budgets',
+    '/api/expenses',
+    '/api/reports/summary',
+    '/api/reports/category',
+    '/api/reports/monthly?year={year}',
+    '/api/budgets/kpi'
+]
+
+BOOTSTRAP_URLS = ['/api/dashboard?year={year}']
+
+def time_to_first_paint(client, urls, rtt):
+    """Seconds until every response is in, fetching the URLs one after another"""
+    elapsed = 0.0
+    for url in urls:
+        started = time.perf_counter()
+        response = client.get(url)
+        response.get_data()
+        if response.status_code != 200:
+            raise SystemExit(f"{url} returned {response.status_code}")
+        elapsed += time.perf_counter() - started + rtt
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--user-id', type=int, required=True, help='Existing user to load the dashboard for')
+    parser.add_argument('--rtt-ms', type=float, default=80.0, help='Simulated network round trip per request')
+    parser.add_argument('--runs', type=int, default=20, help='Measured runs per strategy')
+    parser.add_argument('--year', type=int, default=time.localtime().tm_year)
+    args = parser.parse_args()
+
+    report_cache.enabled = False
+    rtt = args.rtt_ms / 1000
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(args.user_id)
+        session['_fresh'] = True
+
+    strategies = {
+        'waterfall': [url.format(year=args.year) for url in WATERFALL_URLS],
+        'bootstrap': [url.format(year=args.year) for url in BOOTSTRAP_URLS]
+    }
+
+    results = {}
+    for name, urls in strategies.items():
+        time_to_first_paint(client, urls, rtt)  # warm up
+        samples = [time_to_first_paint(client, urls, rtt) for _ in range(args.runs)]
+        results[name] = statistics.median(samples)
+        print(f"{name:10s} {len(urls)} requests  median {results[name] * 1000:8.1f} ms  "
+              f"min {min(samples) * 1000:8.1f} ms  max {max(samples) * 1000:8.1f} ms")
+
+    print(f"speedup    {results['waterfall'] / results['bootstrap']:.2f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Measure throughput and memory of the streaming expense export.
+
+Streams /api/expenses/export through the Flask test client as the single
+user of a synthetic data set, and reports rows/sec together with traced
+Python memory at several points of the stream. A flat memory profile from
+the first tenth of the rows to the end shows the export does not buffer
+the result set.
+
+The data set is generated by benchmarks/synthetic.py into its own SQLite
+file, never into the configured database, and reused by later runs with
+the same row count and seed.
+
+Usage:
+    python benchmarks/export_throughput.py --rows 1000000
+    python benchmarks/export_throughput.py --rows 100000 --format columnar
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import synthetic
+
+def export_counts(rows):
+    """Row counts of a synthetic data set with one user owning every expense"""
+    return {'users': 1, 'categories': 13, 'expenses': rows, 'budgets': 0, 'receipts': 0}
+
+def run_export(client, export_format):
+    """Consume one export, returning (rows, bytes, seconds, memory samples)"""
+    tracemalloc.start()
+    started = time.perf_counter()
+    response = client.get(f'/api/expenses/export?format={export_format}', buffered=False)
+    if response.status_code != 200:
+        raise SystemExit(f"Export returned {response.status_code}")
+
+    rows = total_bytes = 0
+    samples = []
+    for chunk in response.response:
+        total_bytes += len(chunk)
+        rows += chunk.count(b'\n') if export_format == 'csv' else chunk.count(b'"id"')
+        samples.append((rows, tracemalloc.get_traced_memory()[0]))
+    response.close()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, total_bytes, elapsed, samples, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, default=100_000, help='Expenses in the data set')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--database', help='SQLite file of the data set (default instance/export-<rows>-<seed>.sqlite)')
+    parser.add_argument('--memory', action='store_true', help='Generate into an in-memory database instead')
+    parser.add_argument('--format', choices=['csv', 'columnar'], default='csv')
+    args = parser.parse_args()
+
+    counts = export_counts(args.rows)
+    database = None
+    if not args.memory:
+        database = args.database or os.path.join(ROOT, 'instance', f"export-{args.rows}-{args.seed}.sqlite")
+        os.makedirs(os.path.dirname(os.path.abspath(database)), exist_ok=True)
+        metadata = synthetic.load_metadata(database)
+        if os.path.exists(database) and (metadata is None or metadata['counts'] != counts or metadata['seed'] != args.seed
+                                         or metadata.get('end_date') != synthetic.END_DATE.isoformat()):
+            raise SystemExit(f"{database} holds another data set; remove it or pass --database")
+    synthetic.use_database(database)
+
+    from main import app
+    from models import User, Expense
+
+    with app.app_context():
+        if (synthetic.load_metadata(database) if database else None) is None:
+            metadata = synthetic.generate(counts, args.seed)
+            if database:
+                with open(synthetic.metadata_path(database), 'w') as f:
+                    json.dump(metadata, f, indent=2)
+        user_id = User.query.filter_by(email=synthetic.BENCHMARK_EMAIL).one().id
+        total = Expense.query.filter_by(user_id=user_id).count()
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    _, total_bytes, elapsed, samples, peak = run_export(client, args.format)
+    print(f"exported   {total} rows, {total_bytes / 1e6:.1f} MB as {args.format} in {elapsed:.2f} s")
+    print(f"throughput {total / elapsed:,.0f} rows/s")
+    for fraction in (0.1, 0.5, 1.0):
+        rows, current = next((sample for sample in samples if sample[0] >= fraction * samples[-1][0]), samples[-1])
+        print(f"memory     {current / 1e6:8.2f} MB traced after {fraction:4.0%} of the stream")
+    print(f"peak       {peak / 1e6:8.2f} MB traced")
+
+if __name__ == '__main__':
+    main()
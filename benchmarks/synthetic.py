@@ -0,0 +1,194 @@
+"""
+Seeded synthetic data for benchmarks: users, categories, expenses, budgets
+and receipts at a named scale, inserted with multi-row INSERTs, followed by
+a rebuild of the daily spend rollup. The same scale and seed always produce
+the same rows.
+
+The first user, bench0@example.com with password 'benchmark', owns
+--primary-share of the expenses; the rest are spread evenly over the other
+users. Receipts are rows only; their files are not created.
+
+Usage:
+    python benchmarks/synthetic.py --scale 100k --database /tmp/bench-100k.sqlite
+"""
+import os
+import sys
+import json
+import random
+import argparse
+import hashlib
+from datetime import date, datetime, time, timedelta
+
+# Row counts per scale, named by the number of expenses
+SCALES = {
+    '1k': {'users': 5, 'categories': 12, 'expenses': 1_000, 'budgets': 20, 'receipts': 100},
+    '100k': {'users': 100, 'categories': 30, 'expenses': 100_000, 'budgets': 1_000, 'receipts': 10_000},
+    '10m': {'users': 2_000, 'categories': 60, 'expenses': 10_000_000, 'budgets': 20_000, 'receipts': 1_000_000},
+}
+
+BENCHMARK_EMAIL = 'bench0@example.com'
+BENCHMARK_PASSWORD = 'benchmark'
+
+TITLES = [
+    'Groceries', 'Fuel', 'Rent', 'Electricity', 'Water bill', 'Airtime', 'Lunch', 'Taxi', 'Boda boda',
+    'School fees', 'Pharmacy', 'Internet', 'Cinema', 'Hardware', 'Market', 'Restaurant', 'Clothes',
+]
+
+# Expenses span HISTORY_DAYS up to END_DATE. The anchor is fixed, so a data
+# set generated in another year holds the same rows.
+HISTORY_DAYS = 5 * 365
+END_DATE = date(2025, 12, 31)
+
+def use_database(path):
+    """
+    Point the app at a SQLite file; call before importing the app
+
+    Args:
+        path: The database file, or None for an in-memory database
+    """
+    if path is None:
+        os.environ['DB_PROFILE'] = 'memory'
+        os.environ.pop('DATABASE_URL', None)
+    else:
+        os.environ['DB_PROFILE'] = 'sqlite'
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.abspath(path)}"
+
+def metadata_path(path):
+    return f"{path}.json"
+
+def load_metadata(path):
+    """Return the metadata of a generated database file, or None"""
+    try:
+        with open(metadata_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _insert(db, table, rows, batch_size):
+    for start in range(0, len(rows), batch_size):
+        db.session.execute(table.insert(), rows[start:start + batch_size])
+
+def generate(scale, seed=42, primary_share=0.1, batch_size=10_000, end_date=END_DATE):
+    """
+    Populate the empty configured database with a synthetic data set
+
+    Args:
+        scale: A SCALES key, or a dict of row counts with the same keys
+        seed: The random seed
+        primary_share: The fraction of expenses owned by the first user
+        batch_size: Rows per multi-row INSERT
+        end_date: The last day of the expense history
+
+    Returns:
+        dict: Metadata of the generated data: scale, seed, end date and row counts
+    """
+    from app import db
+    from auth import password_hasher
+    from models import User, Category, Expense, Budget, Receipt, rebuild_daily_spend, category_registry
+
+    counts = SCALES[scale] if isinstance(scale, str) else scale
+    rng = random.Random(seed)
+
+    if db.session.query(Expense.id).first() is not None:
+        raise SystemExit('The database already holds expenses; generate into an empty one')
+
+    if db.engine.dialect.name == 'sqlite':
+        db.session.connection().exec_driver_sql('PRAGMA synchronous = OFF')
+
+    # Users share one password hash, computing one per user would dominate small scales
+    password_hash = password_hasher.hash(BENCHMARK_PASSWORD)
+    _insert(db, User.__table__, [
+        {'username': f"bench{n}", 'email': f"bench{n}@example.com", 'password_hash': password_hash}
+        for n in range(counts['users'])
+    ], batch_size)
+    user_ids = [user_id for (user_id,) in db.session.query(User.id).order_by(User.id)]
+
+    existing = db.session.query(Category.id).count()
+    _insert(db, Category.__table__, [
+        {'name': f"Benchmark category {n}", 'color': f"#{rng.randrange(0x1000000):06x}", 'icon': 'tag'}
+        for n in range(max(0, counts['categories'] - existing))
+    ], batch_size)
+    category_registry.bump()
+    category_ids = [category_id for (category_id,) in db.session.query(Category.id).order_by(Category.id)]
+
+    end = datetime.combine(end_date, time())
+    start = end - timedelta(days=HISTORY_DAYS)
+    primary_count = int(counts['expenses'] * primary_share) if len(user_ids) > 1 else counts['expenses']
+    table = Expense.__table__
+    for offset in range(0, counts['expenses'], batch_size):
+        rows = []
+        for n in range(offset, min(offset + batch_size, counts['expenses'])):
+            rows.append({
+                'title': rng.choice(TITLES),
+                'amount': round(rng.lognormvariate(9, 1.2), 2),
+                'currency': 'UGX',
+                'date': start + timedelta(days=rng.randrange(HISTORY_DAYS), seconds=rng.randrange(86400)),
+                'description': '' if rng.random() < 0.7 else f"Note {n}",
+                'category_id': rng.choice(category_ids),
+                'user_id': user_ids[0] if n < primary_count else user_ids[1 + n % (len(user_ids) - 1)],
+            })
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+
+    budgets = []
+    for n in range(counts['budgets']):
+        budget_start = start + timedelta(days=rng.randrange(HISTORY_DAYS))
+        budgets.append({
+            'name': f"Budget {n}",
+            'amount': round(rng.uniform(100_000, 5_000_000), -3),
+            'start_date': budget_start,
+            'end_date': budget_start + timedelta(days=rng.choice([7, 30, 90, 365])),
+            'category_id': None if rng.random() < 0.2 else rng.choice(category_ids),
+            'user_id': user_ids[0] if n < max(1, counts['budgets'] // len(user_ids)) else rng.choice(user_ids),
+            'is_active': rng.random() < 0.8,
+        })
+    _insert(db, Budget.__table__, budgets, batch_size)
+
+    # Expense ids are 1..n in the empty database
+    receipts = []
+    for n in range(counts['receipts']):
+        sha = hashlib.sha256(f"{seed}:{n}".encode('ascii')).hexdigest()
+        receipts.append({
+            'filename': f"{sha[:2]}/{sha[2:4]}/{sha}.jpg",
+            'original_filename': f"receipt-{n}.jpg",
+            'upload_date': start + timedelta(days=rng.randrange(HISTORY_DAYS)),
+            'expense_id': rng.randint(1, counts['expenses']),
+            'status': 'ready',
+            'sha256': sha,
+            'size': rng.randrange(50_000, 3_000_000),
+        })
+        if len(receipts) == batch_size:
+            _insert(db, Receipt.__table__, receipts, batch_size)
+            receipts = []
+    _insert(db, Receipt.__table__, receipts, batch_size)
+
+    rebuild_daily_spend()
+    db.session.commit()
+    return {
+        'scale': scale, 'seed': seed, 'primary_share': primary_share,
+        'end_date': end_date.isoformat(), 'counts': counts
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', choices=SCALES, default='1k')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--primary-share', type=float, default=0.1, help='Fraction of expenses owned by the first user')
+    parser.add_argument('--end-date', type=date.fromisoformat, default=END_DATE, help='Last day of the expense history')
+    parser.add_argument('--database', required=True, help='SQLite file to create')
+    args = parser.parse_args()
+
+    if os.path.exists(args.database):
+        raise SystemExit(f"{args.database} already exists")
+    use_database(args.database)
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    from main import app
+
+    with app.app_context():
+        metadata = generate(args.scale, args.seed, args.primary_share, end_date=args.end_date)
+    with open(metadata_path(args.database), 'w') as f:
+        json.dump(metadata, f, indent=2)
+    print(f"Generated {json.dumps(metadata['counts'])} into {args.database}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from flask import request, current_app
+from flask_login import current_user
+from app import app
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry TTL, for a single worker"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._versions = {}
+        self._lock = threading.Lock()
+        # Versions restart from zero with the process, so validators must
+        # never match ones issued by another process or before a restart
+        self.epoch = uuid.uuid4().hex
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires < time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def version(self, name):
+        with self._lock:
+            return self._versions.get(name, (0, None))
+
+    def bump(self, name):
+        with self._lock:
+            value, _ = self._versions.get(name, (0, None))
+            self._versions[name] = (value + 1, time.time())
+            return self._versions[name]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class SQLiteCacheBackend:
+    """
+    LRU cache with per-entry TTL in a local SQLite file, so every worker
+    process on the host shares entries and data versions
+    """
+
+    def __init__(self, path, max_entries=1024):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        with self._connection() as connection:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entry ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS ix_cache_entry_accessed ON cache_entry (accessed)")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS data_version ("
+                "name TEXT PRIMARY KEY, value INTEGER NOT NULL, modified REAL NOT NULL)"
+            )
+            connection.execute("CREATE TABLE IF NOT EXISTS cache_epoch (epoch TEXT NOT NULL)")
+            connection.execute(
+                "INSERT INTO cache_epoch (epoch) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM cache_epoch)",
+                (uuid.uuid4().hex,)
+            )
+            # Identifies this cache file, so validators issued against a
+            # deleted or recreated file never match
+            self.epoch = connection.execute("SELECT epoch FROM cache_epoch").fetchone()[0]
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.connection = connection
+        return connection
+
+    def get(self, key):
+        connection = self._connection()
+        row = connection.execute(
+            "SELECT value, expires FROM cache_entry WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires = row
+        now = time.time()
+        if expires < now:
+            connection.execute("DELETE FROM cache_entry WHERE key = ?", (key,))
+            return None
+        connection.execute("UPDATE cache_entry SET accessed = ? WHERE key = ?", (now, key))
+        return json.loads(value)
+
+    def set(self, key, value, ttl):
+        connection = self._connection()
+        now = time.time()
+        connection.execute(
+            "INSERT OR REPLACE INTO cache_entry (key, value, expires, accessed) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), now + ttl, now)
+        )
+        # Evict the least recently used entries beyond the size bound
+        connection.execute(
+            "DELETE FROM cache_entry WHERE key IN ("
+            "SELECT key FROM cache_entry ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+    def version(self, name):
+        row = self._connection().execute(
+            "SELECT value, modified FROM data_version WHERE name = ?", (name,)
+        ).fetchone()
+        return tuple(row) if row else (0, None)
+
+    def bump(self, name):
+        connection = self._connection()
+        # One transaction, so the version returned is the one this bump wrote
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "INSERT INTO data_version (name, value, modified) VALUES (?, 1, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + 1, modified = excluded.modified",
+                (name, time.time())
+            )
+            version = self.version(name)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return version
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache_entry")
+
+class ResponseCache:
+    """
+    Cache of JSON responses keyed on (user, endpoint, URL path arguments,
+    normalized query args).
+
+    Keys embed the user's data version and a global one, so bumping a
+    version after a write makes every older entry for that scope unreachable;
+    stale entries then age out through TTL and LRU eviction. The same
+    versions back the ETag and Last-Modified validators of conditional().
+    """
+
+    GLOBAL_SCOPE = 'global'
+
+    def __init__(self, backend, ttl=300, enabled=True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        # Callables notified with (user id, new user version) after invalidate_user
+        self.invalidation_listeners = []
+
+    def user_version(self, user_id):
+        """Return the version of a user's data, bumped by invalidate_user"""
+        return self.backend.version(f"gen:{user_id}")[0]
+
+    def data_version(self, user_id):
+        """
+        Return the data version visible to a user
+
+        Returns:
+            tuple: (user version, global version, last modified timestamp or None)
+        """
+        user_version, user_modified = self.backend.version(f"gen:{user_id}")
+        global_version, global_modified = self.backend.version(f"gen:{self.GLOBAL_SCOPE}")
+        modified = max(filter(None, (user_modified, global_modified)), default=None)
+        return user_version, global_version, modified
+
+    def _key(self, user_id, version, endpoint, args, view_args):
+        normalized = '&'.join(f"{name}={value}" for name, value in sorted(args.items(multi=True)))
+        path = '&'.join(f"{name}={value}" for name, value in sorted((view_args or {}).items()))
+        user_version, global_version, _ = version
+        return f"{user_id}:{user_version}:{global_version}:{endpoint}/{path}?{normalized}"
+
+    def entry_key(self, user_id, endpoint, args, view_args):
+        """Return the cache key of a response at the user's current data version"""
+        return self._key(user_id, self.data_version(user_id), endpoint, args, view_args)
+
+    def invalidate_user(self, user_id):
+        """Invalidate every cached response for one user"""
+        version, _ = self.backend.bump(f"gen:{user_id}")
+        for listener in self.invalidation_listeners:
+            listener(user_id, version)
+
+    def invalidate_all(self):
+        """Invalidate every cached response, e.g. after a shared category changes"""
+        self.backend.bump(f"gen:{self.GLOBAL_SCOPE}")
+
+    def validators(self, user_id, endpoint, args, view_args):
+        """
+        Return the validators of a GET response, derived from the data version
+
+        Returns:
+            tuple: (weak ETag value, Last-Modified datetime or None)
+        """
+        version = self.data_version(user_id)
+        key = self._key(user_id, version, endpoint, args, view_args)
+        etag = hashlib.sha1(f"{self.backend.epoch}:{key}".encode('utf-8')).hexdigest()
+        # Last-Modified has one second resolution, so it is only a safe
+        # validator once the second of the last write has passed
+        modified = version[2]
+        last_modified = None
+        if modified and int(modified) < int(time.time()):
+            last_modified = datetime.fromtimestamp(int(modified), timezone.utc)
+        return etag, last_modified
+
+    @staticmethod
+    def not_modified(etag, last_modified, if_none_match, if_modified_since):
+        """Return whether the request validators match, If-None-Match taking precedence"""
+        if if_none_match:
+            return if_none_match.contains_weak(etag)
+        return bool(last_modified and if_modified_since and if_modified_since >= last_modified)
+
+    def conditional(self, view):
+        """
+        Decorator adding ETag and Last-Modified validators to a GET view.
+
+        Validators are derived from the data version alone, so a matching
+        If-None-Match or If-Modified-Since is answered with 304 before the
+        view runs any query or serializes anything.
+        """
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user_id = current_user.id if current_user.is_authenticated else None
+            etag, last_modified = self.validators(user_id, request.endpoint, request.args, request.view_args)
+
+            if self.not_modified(etag, last_modified, request.if_none_match, request.if_modified_since):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+
+    def cached(self, view):
+        """Decorator caching a view's successful JSON responses per user"""
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if not self.enabled or not current_user.is_authenticated:
+                return view(*args, **kwargs)
+
+            key = self.entry_key(current_user.id, request.endpoint, request.args, request.view_args)
+            entry = self.backend.get(key)
+            if entry is not None:
+                return current_app.response_class(entry['body'], status=entry['status'], mimetype=entry['mimetype'])
+
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                self.backend.set(key, {
+                    'body': response.get_data(as_text=True),
+                    'status': response.status_code,
+                    'mimetype': response.mimetype
+                }, self.ttl)
+            return response
+        return wrapper
+
+def create_cache_backend(kind, path, max_entries):
+    """Build a 'sqlite' backend stored at path, or a per-process 'memory' one"""
+    if kind == 'sqlite':
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return SQLiteCacheBackend(path, max_entries)
+    return MemoryCacheBackend(max_entries)
+
+def create_response_cache(config):
+    """Build the response cache from the REPORT_CACHE_* settings"""
+    backend = create_cache_backend(
+        config['REPORT_CACHE_BACKEND'], config['REPORT_CACHE_PATH'], config['REPORT_CACHE_MAX_ENTRIES']
+    )
+    return ResponseCache(backend, ttl=config['REPORT_CACHE_TTL'], enabled=config['REPORT_CACHE_ENABLED'])
+
+report_cache = create_response_cache(app.config)
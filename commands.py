@@ -0,0 +1,80 @@
+import click
+from sqlalchemy import or_
+from app import app
+from models import User, Receipt, rebuild_daily_spend, check_daily_spend
+from migrations import run_migrations
+from expense_import import import_expenses, IMPORT_FORMATS
+from receipts import receipt_pipeline
+from assets import build_assets
+
+@app.cli.command('rebuild-rollup')
+def rebuild_rollup_command():
+    """Rebuild the daily spend rollup table from the expense table"""
+    buckets = rebuild_daily_spend()
+    click.echo(f"Rebuilt daily spend rollup: {buckets} buckets")
+
+@app.cli.command('check-rollup')
+def check_rollup_command():
+    """Compare the daily spend rollup table with the expense table"""
+    mismatches = check_daily_spend()
+    for bucket, expected, actual in mismatches:
+        click.echo(f"Mismatch for {bucket}: expected {expected}, found {actual}")
+    
+    if mismatches:
+        raise SystemExit(f"{len(mismatches)} rollup buckets out of date, run 'flask rebuild-rollup'")
+    click.echo("Daily spend rollup is consistent")
+
+@app.cli.command('import-expenses')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--user-id', type=int, required=True, help='User the expenses belong to')
+@click.option('--format', 'import_format', type=click.Choice(IMPORT_FORMATS), default=None,
+              help='Input format (defaults to the file extension)')
+@click.option('--chunk-size', type=int, default=None, help='Rows per multi-row INSERT')
+def import_expenses_command(path, user_id, import_format, chunk_size):
+    """Bulk import expenses from a CSV or NDJSON file"""
+    if not User.query.get(user_id):
+        raise SystemExit(f"User {user_id} not found")
+    if not import_format:
+        import_format = 'ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv'
+    
+    with open(path, 'rb') as stream:
+        result = import_expenses(stream, user_id, import_format, chunk_size=chunk_size)
+    
+    for error in result['errors']:
+        click.echo(f"Row {error['row']}: {error['error']}")
+    click.echo(f"Imported {result['imported']} expenses, {result['failed']} rows failed")
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations"""
+    applied = run_migrations()
+    if applied:
+        click.echo(f"Applied migrations: {', '.join(str(version) for version in applied)}")
+    else:
+        click.echo("Schema is up to date")
+
+@app.cli.command('process-receipts')
+@click.option('--retry-failed', is_flag=True, help='Also retry receipts that failed to store')
+@click.option('--legacy', is_flag=True, help='Also move receipts saved under flat uuid names into the content-addressed store')
+def process_receipts_command(retry_failed, legacy):
+    """Store receipts left pending, e.g. by a worker that exited mid-upload"""
+    statuses = ['pending', 'failed'] if retry_failed else ['pending']
+    criteria = Receipt.status.in_(statuses)
+    if legacy:
+        criteria = or_(criteria, ~Receipt.filename.contains('/'))
+    receipts = Receipt.query.filter(criteria).with_entities(
+        Receipt.id, Receipt.filename, Receipt.original_filename
+    ).all()
+    
+    results = {}
+    for receipt_id, filename, original_filename in receipts:
+        status = receipt_pipeline.process(receipt_id, filename, original_filename)
+        results[status] = results.get(status, 0) + 1
+    click.echo(f"Processed {len(receipts)} receipts: {results.get('ready', 0)} ready, {results.get('failed', 0)} failed")
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Bundle, minify and pre-compress the frontend assets"""
+    manifest = build_assets()
+    for name, entry in sorted(manifest.items()):
+        click.echo(f"{name} -> {entry['file']}")
@@ -0,0 +1,213 @@
+import time
+import threading
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool, StaticPool
+
+class MeteredPoolMixin:
+    """
+    Queue pool counting the checkouts that had to wait for a connection,
+    because no idle one was left and the overflow was used up, and the
+    checkouts that timed out waiting
+    """
+    metrics = None
+
+    def _do_get(self):
+        waits = -1 < self._max_overflow <= self._overflow and self._pool.empty()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            if self.metrics is not None:
+                self.metrics.record_timeout()
+            raise
+        finally:
+            if self.metrics is not None:
+                self.metrics.record_get(waits, time.perf_counter() - started, self.overflow())
+
+    def recreate(self):
+        # engine.dispose() replaces the pool; keep counting
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        return pool
+
+class MeteredQueuePool(MeteredPoolMixin, QueuePool):
+    pass
+
+class MeteredAsyncQueuePool(MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+# Engine profiles selected with DB_PROFILE. A profile without 'uri' uses the
+# MySQL settings from the environment; DATABASE_URL overrides any profile's.
+#
+# The MySQL profiles do not pre-ping: instead of a round trip on every
+# checkout, connections are recycled before the server's wait_timeout and a
+# connection found dead is invalidated together with every older one in the
+# pool, so only the request that hit it fails. Set DB_POOL_PRE_PING=1 where
+# connections are dropped unpredictably, e.g. behind a proxy or on failover.
+#
+# query_cache_size is SQLAlchemy's compiled statement cache per engine; the
+# expense filters and reports produce more distinct statements than the
+# default 500 holds.
+ENGINE_PROFILES = {
+    # gunicorn sync workers: one request at a time per process, plus the
+    # receipt pipeline threads
+    'mysql': {
+        'poolclass': MeteredQueuePool,
+        'pool_size': 3,
+        'max_overflow': 2,
+        'pool_timeout': 10,
+        'pool_recycle': 280,
+        'pool_pre_ping': False,
+        'query_cache_size': 1200,
+    },
+    # gthread workers or the ASGI entry point: many concurrent requests per process
+    'mysql-threaded': {
+        'poolclass': MeteredQueuePool,
+        'pool_size': 10,
+        'max_overflow': 20,
+        'pool_timeout': 30,
+        'pool_recycle': 280,
+        'pool_pre_ping': False,
+        'query_cache_size': 1200,
+    },
+    # Local development and benchmarks against a file in the instance folder
+    'sqlite': {
+        'uri': 'sqlite:///expensewise.sqlite',
+        'poolclass': MeteredQueuePool,
+        'pool_size': 5,
+        'max_overflow': 10,
+        'pool_timeout': 30,
+        'query_cache_size': 1200,
+        'connect_args': {'timeout': 30, 'check_same_thread': False},
+    },
+    # Tests: a private database per process, gone when it exits. Every
+    # thread shares the one connection holding it, and the shared cache lets
+    # the ASGI entry point's aiosqlite engine open the same database.
+    'memory': {
+        'uri': 'sqlite:///file:expensewise?mode=memory&cache=shared&uri=true',
+        'poolclass': StaticPool,
+        'query_cache_size': 1200,
+        'connect_args': {'check_same_thread': False},
+    },
+}
+
+# Environment variables overriding engine options of the selected profile
+ENGINE_OPTION_OVERRIDES = {
+    'DB_POOL_SIZE': ('pool_size', int),
+    'DB_MAX_OVERFLOW': ('max_overflow', int),
+    'DB_POOL_TIMEOUT': ('pool_timeout', float),
+    'DB_POOL_RECYCLE': ('pool_recycle', int),
+    'DB_POOL_PRE_PING': ('pool_pre_ping', lambda value: value == '1'),
+    'DB_QUERY_CACHE_SIZE': ('query_cache_size', int),
+}
+
+def engine_config(profile, default_uri, environ):
+    """
+    Resolve the database URI and engine options of a profile
+
+    Args:
+        profile: The ENGINE_PROFILES key
+        default_uri: The URI for profiles without their own
+        environ: The environment with DATABASE_URL and option overrides
+
+    Returns:
+        tuple: (SQLALCHEMY_DATABASE_URI, SQLALCHEMY_ENGINE_OPTIONS)
+    """
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown DB_PROFILE '{profile}', expected one of: {', '.join(ENGINE_PROFILES)}")
+    options = dict(ENGINE_PROFILES[profile])
+    profile_uri = options.pop('uri', None)
+    uri = environ.get('DATABASE_URL') or profile_uri or default_uri
+    for variable, (option, convert) in ENGINE_OPTION_OVERRIDES.items():
+        if environ.get(variable):
+            options[option] = convert(environ[variable])
+    return uri, options
+
+def async_engine_options(options):
+    """Return engine options for the async engine of the same profile"""
+    options = dict(options)
+    if options.get('poolclass') is MeteredQueuePool:
+        options['poolclass'] = MeteredAsyncQueuePool
+    return options
+
+class PoolMetrics:
+    """Connection pool counters of one engine, per process"""
+
+    COUNTERS = ('checkouts', 'checkins', 'connects', 'waits', 'timeouts', 'invalidations', 'soft_invalidations')
+
+    def __init__(self, name):
+        self.name = name
+        self.pool = None
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.COUNTERS, 0)
+        self._wait_seconds = 0.0
+        self._overflow_peak = 0
+
+    def attach(self, engine):
+        """Count the pool events of an engine"""
+        self.pool = engine.pool
+        if isinstance(engine.pool, MeteredPoolMixin):
+            engine.pool.metrics = self
+        for name, counter in (
+            ('checkout', 'checkouts'),
+            ('checkin', 'checkins'),
+            ('connect', 'connects'),
+            ('invalidate', 'invalidations'),
+            ('soft_invalidate', 'soft_invalidations'),
+        ):
+            event.listen(engine, name, lambda *args, counter=counter: self._count(counter))
+        # Track the current pool across dispose()
+        event.listen(engine, 'engine_disposed', lambda engine: setattr(self, 'pool', engine.pool))
+        return self
+
+    def _count(self, counter):
+        with self._lock:
+            self._counts[counter] += 1
+
+    def record_get(self, waited, seconds, overflow):
+        with self._lock:
+            if waited:
+                self._counts['waits'] += 1
+                self._wait_seconds += seconds
+            self._overflow_peak = max(self._overflow_peak, overflow)
+
+    def record_timeout(self):
+        self._count('timeouts')
+
+    def snapshot(self):
+        """
+        Return the counters and the current state of the pool
+
+        Returns:
+            dict: Counters since the process started, wait_seconds spent in
+            waits, overflow_peak, and the pool's size, checked_in,
+            checked_out and overflow gauges where the pool class has them
+        """
+        with self._lock:
+            data = dict(self._counts, wait_seconds=self._wait_seconds, overflow_peak=self._overflow_peak)
+        for gauge, method in (
+            ('size', 'size'),
+            ('checked_in', 'checkedin'),
+            ('checked_out', 'checkedout'),
+            ('overflow', 'overflow'),
+        ):
+            if hasattr(self.pool, method):
+                data[gauge] = max(getattr(self.pool, method)(), 0)
+        return data
+
+# Metrics of each instrumented engine by name
+pool_metrics = {}
+
+def instrument_engine(engine, name):
+    """
+    Start counting the pool events of an engine
+
+    Args:
+        engine: A sync Engine, or an AsyncEngine's sync_engine
+        name: The name to report the pool under
+
+    Returns:
+        PoolMetrics: The engine's metrics
+    """
+    pool_metrics[name] = PoolMetrics(name).attach(engine)
+    return pool_metrics[name]
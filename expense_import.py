@@ -0,0 +1,156 @@
+import csv
+import json
+from app import app, db
+from models import Expense, category_registry, refresh_daily_spend_range
+from utils import parse_expense_data
+from cache import report_cache
+
+IMPORT_FORMATS = ('csv', 'ndjson')
+
+# Cap on the per-row errors returned, the total is always reported
+MAX_REPORTED_ERRORS = 1000
+
+def iter_records(stream, import_format):
+    """
+    Yield (row number, record) pairs from a binary CSV or NDJSON stream,
+    reading it line by line. Records that cannot be decoded are yielded as
+    their error message instead of a dict.
+    """
+    # Physical line numbers that are not valid UTF-8; they are decoded with
+    # replacement characters and the rows holding them reported as errors
+    invalid_lines = set()
+
+    def decoded_lines():
+        for line_number, line in enumerate(stream, start=1):
+            try:
+                yield line.decode('utf-8-sig' if line_number == 1 else 'utf-8')
+            except UnicodeDecodeError:
+                invalid_lines.add(line_number)
+                yield line.decode('utf-8', 'replace')
+
+    if import_format == 'csv':
+        reader = csv.DictReader(decoded_lines())
+        if reader.fieldnames is None:
+            return
+        if invalid_lines:
+            yield 1, 'Invalid UTF-8 in the header'
+            return
+        # Row 1 is the header; a row may span several lines
+        previous_line = reader.line_num
+        for row_number, record in enumerate(reader, start=2):
+            if any(previous_line < line_number <= reader.line_num for line_number in invalid_lines):
+                yield row_number, 'Invalid UTF-8'
+            else:
+                yield row_number, record
+            previous_line = reader.line_num
+        return
+
+    for row_number, line in enumerate(decoded_lines(), start=1):
+        if row_number in invalid_lines:
+            yield row_number, 'Invalid UTF-8'
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield row_number, 'Invalid JSON'
+            continue
+        yield row_number, record if isinstance(record, dict) else 'Expected a JSON object'
+
+def validate_record(record):
+    """
+    Apply the create_expense parsing rules to one imported record. A
+    'category' name may be given instead of 'category_id'.
+
+    Returns:
+        dict: Column values for a new Expense, without user_id
+
+    Raises:
+        ValueError: If the record is invalid
+    """
+    # Empty CSV cells count as missing, so defaults and required checks apply
+    data = {key: value for key, value in record.items() if key and value not in ('', None)}
+
+    # JSON values arrive typed; int() and float() would accept true and 2.5
+    for field in ('amount', 'category_id'):
+        if isinstance(data.get(field), bool):
+            raise ValueError(f'Invalid {field}, expected a number')
+    if isinstance(data.get('category_id'), float) and not data['category_id'].is_integer():
+        raise ValueError('Invalid category_id, expected an integer')
+
+    if 'category_id' not in data and 'category' in data:
+        if not isinstance(data['category'], str):
+            raise ValueError('Invalid category, expected text')
+        category = category_registry.by_name(data['category'])
+        if not category:
+            raise ValueError(f"Unknown category: {data['category']}")
+        data['category_id'] = category.id
+
+    fields = parse_expense_data(data)
+    if not category_registry.get(fields['category_id']):
+        raise ValueError(f"Unknown category_id: {fields['category_id']}")
+    return fields
+
+def import_expenses(stream, user_id, import_format='csv', chunk_size=None):
+    """
+    Validate and insert expenses from a CSV or NDJSON stream in one pass.
+
+    Valid rows are inserted with one multi-row INSERT per chunk_size rows
+    (IMPORT_CHUNK_SIZE by default); invalid rows are skipped and reported.
+    The daily spend rollup for the imported date range is refreshed in the
+    same transaction.
+
+    Returns:
+        dict: Counts of imported and failed rows and the per-row errors
+    """
+    chunk_size = chunk_size or app.config['IMPORT_CHUNK_SIZE']
+    table = Expense.__table__
+
+    imported = failed = 0
+    errors = []
+    chunk = []
+    first_day = last_day = None
+
+    def flush_chunk():
+        # executemany, which both MySQL and SQLite batch into multi-row INSERTs
+        db.session.execute(table.insert(), chunk)
+        chunk.clear()
+
+    for row_number, record in iter_records(stream, import_format):
+        try:
+            if isinstance(record, str):
+                raise ValueError(record)
+            fields = validate_record(record)
+        except ValueError as e:
+            failed += 1
+            if len(errors) < MAX_REPORTED_ERRORS:
+                errors.append({'row': row_number, 'error': str(e)})
+            continue
+
+        fields['user_id'] = user_id
+        chunk.append(fields)
+        imported += 1
+
+        day = fields['date'].date()
+        first_day = day if first_day is None else min(first_day, day)
+        last_day = day if last_day is None else max(last_day, day)
+
+        if len(chunk) >= chunk_size:
+            flush_chunk()
+
+    if chunk:
+        flush_chunk()
+
+    if imported:
+        refresh_daily_spend_range(user_id, first_day, last_day)
+    db.session.commit()
+
+    if imported:
+        report_cache.invalidate_user(user_id)
+
+    return {
+        'imported': imported,
+        'failed': failed,
+        'errors': errors
+    }
@@ -0,0 +1,373 @@
+import os
+import re
+import sys
+import json
+import hmac
+import time
+import logging
+import tempfile
+import threading
+from collections import Counter
+from flask import request, g, has_request_context, request_started, request_finished
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app, db
+from database import pool_metrics
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+ROW_COUNT_BUCKETS = (0, 1, 10, 50, 100, 500, 1000, 5000, 10000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+WHITESPACE = re.compile(r'\s+')
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class Histogram:
+    """Cumulative histogram per combination of label values"""
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(labelvalues, list(counts), total, count) for labelvalues, (counts, total, count) in self._series.items()]
+        for labelvalues, counts, total, count in items:
+            labels = list(zip(self.labelnames, labelvalues))
+            for bound, bucket_count in zip(self.buckets, counts):
+                yield f"{self.name}_bucket", labels + [('le', repr(float(bound)))], bucket_count
+            yield f"{self.name}_bucket", labels + [('le', '+Inf')], count
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+class CounterMetric:
+    """Monotonic counter per combination of label values"""
+    type = 'counter'
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = Counter()
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] += amount
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for labelvalues, value in items:
+            yield self.name, list(zip(self.labelnames, labelvalues)), value
+
+class PoolMetric:
+    """One value of database.PoolMetrics.snapshot for each instrumented engine"""
+
+    def __init__(self, name, documentation, metric_type, key):
+        self.name = name
+        self.documentation = documentation
+        self.type = metric_type
+        self.key = key
+
+    def samples(self):
+        for pool, metrics in pool_metrics.items():
+            value = metrics.snapshot().get(self.key)
+            if value is not None:
+                yield self.name, [('pool', pool)], value
+
+class MetricsRegistry:
+    """
+    Metrics of every worker process on the host, in the Prometheus text
+    exposition format.
+
+    Each process keeps its own metrics and writes them to <pid>.json in the
+    metrics folder at most every flush_interval seconds; the exposition sums
+    the files of all processes, so any worker can answer a scrape. Counters
+    and histograms of exited workers are kept so totals never go backwards;
+    gauges only count live processes. Clear the folder when deploying.
+    """
+
+    def __init__(self, folder, flush_interval):
+        self.folder = folder
+        self.flush_interval = flush_interval
+        self.metrics = []
+        self._flushed = 0.0
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def flush(self):
+        """Write this process's samples to its file in the metrics folder"""
+        self._flushed = time.monotonic()
+        samples = [
+            [metric.name, name, labels, value]
+            for metric in self.metrics
+            for name, labels, value in metric.samples()
+        ]
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with tempfile.NamedTemporaryFile('w', dir=self.folder, suffix='.tmp', delete=False) as f:
+                json.dump(samples, f)
+            os.replace(f.name, os.path.join(self.folder, f"{os.getpid()}.json"))
+        except OSError as e:
+            logger.warning(f"Could not write metrics: {str(e)}")
+
+    def maybe_flush(self):
+        if time.monotonic() - self._flushed >= self.flush_interval:
+            self.flush()
+
+    def _load(self):
+        for entry in os.scandir(self.folder):
+            pid, extension = os.path.splitext(entry.name)
+            if extension != '.json' or not pid.isdigit():
+                continue
+            try:
+                with open(entry.path) as f:
+                    yield int(pid), json.load(f)
+            except (OSError, ValueError):
+                continue  # Replaced or removed while reading
+
+    @staticmethod
+    def _alive(pid):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def exposition(self):
+        """
+        Return the metrics of all processes
+
+        Returns:
+            str: The text exposition format, version 0.0.4
+        """
+        self.flush()
+        types = {metric.name: metric.type for metric in self.metrics}
+        totals = {metric.name: {} for metric in self.metrics}
+        for pid, samples in self._load():
+            alive = None
+            for family, name, labels, value in samples:
+                if family not in types:
+                    continue
+                if types[family] == 'gauge':
+                    if alive is None:
+                        alive = self._alive(pid)
+                    if not alive:
+                        continue
+                key = (name, tuple(tuple(label) for label in labels))
+                totals[family][key] = totals[family].get(key, 0) + value
+
+        lines = []
+        for metric in self.metrics:
+            if not totals[metric.name]:
+                continue
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for (name, labels), value in totals[metric.name].items():
+                label_text = ','.join(f'{label}="{_escape_label(label_value)}"' for label, label_value in labels)
+                lines.append(f"{name}{{{label_text}}} {_format_value(value)}" if labels else f"{name} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+metrics_registry = MetricsRegistry(app.config['METRICS_FOLDER'], app.config['METRICS_FLUSH_INTERVAL'])
+
+request_duration = metrics_registry.register(Histogram(
+    'http_request_duration_seconds', 'Time to produce the response, excluding streamed bodies',
+    ('endpoint', 'method', 'status'), LATENCY_BUCKETS
+))
+request_queries = metrics_registry.register(Histogram(
+    'http_request_queries', 'SQL statements executed per request', ('endpoint',), QUERY_COUNT_BUCKETS
+))
+request_query_duration = metrics_registry.register(Histogram(
+    'http_request_query_duration_seconds', 'Time spent executing SQL per request', ('endpoint',), LATENCY_BUCKETS
+))
+request_rows = metrics_registry.register(Histogram(
+    'http_request_rows_loaded', 'ORM instances loaded from rows per request', ('endpoint',), ROW_COUNT_BUCKETS
+))
+response_size = metrics_registry.register(Histogram(
+    'http_response_size_bytes', 'Response body size as sent, excluding streamed bodies', ('endpoint',), SIZE_BUCKETS
+))
+slow_requests = metrics_registry.register(CounterMetric(
+    'http_slow_requests_total', 'Requests slower than SLOW_REQUEST_SECONDS', ('endpoint',)
+))
+for name, key, metric_type, documentation in (
+    ('db_pool_checkouts_total', 'checkouts', 'counter', 'Connections checked out of the pool'),
+    ('db_pool_waits_total', 'waits', 'counter', 'Checkouts that waited for a connection to be returned'),
+    ('db_pool_wait_seconds_total', 'wait_seconds', 'counter', 'Time spent waiting for connections'),
+    ('db_pool_timeouts_total', 'timeouts', 'counter', 'Checkouts that timed out waiting'),
+    ('db_pool_connects_total', 'connects', 'counter', 'Database connections opened'),
+    ('db_pool_invalidations_total', 'invalidations', 'counter', 'Connections invalidated after errors'),
+    ('db_pool_checked_out', 'checked_out', 'gauge', 'Connections currently checked out'),
+    ('db_pool_overflow', 'overflow', 'gauge', 'Connections currently open beyond the pool size'),
+):
+    metrics_registry.register(PoolMetric(name, documentation, metric_type, key))
+
+def metrics_access_allowed():
+    """
+    Return whether the request may read metrics: it must come from the
+    loopback interface, or send METRICS_TOKEN as a bearer token if one is set
+    """
+    token = app.config['METRICS_TOKEN']
+    if token:
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+class SamplingProfiler:
+    """
+    Samples the call stack of one thread at a fixed interval from a
+    background thread, so the profiled request runs at nearly full speed.
+    The result is in the collapsed stack format read by flamegraph.pl and
+    speedscope.
+    """
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='profiler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def collapsed(self):
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'query_seconds', 'rows', 'statements', 'profiler')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.rows = 0
+        self.statements = []
+        self.profiler = None
+
+@request_started.connect_via(app)
+def start_request_stats(sender, **extra):
+    if not app.config['METRICS_ENABLED']:
+        return
+    stats = g.request_stats = RequestStats()
+    # Profile single requests sent with 'X-Profile: 1' by a metrics client
+    if (app.config['PROFILER_ENABLED'] and request.headers.get('X-Profile') == '1'
+            and metrics_access_allowed()):
+        stats.profiler = SamplingProfiler(threading.get_ident(), app.config['PROFILER_INTERVAL'])
+        stats.profiler.start()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_statement_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and has_request_context():
+        context._instrumentation_started = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def record_statement(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_instrumentation_started', None)
+    if started is None or not has_request_context():
+        return
+    stats = g.get('request_stats')
+    if stats is None:
+        return
+    elapsed = time.perf_counter() - started
+    stats.queries += 1
+    stats.query_seconds += elapsed
+    if len(stats.statements) < app.config['SLOW_REQUEST_MAX_STATEMENTS']:
+        stats.statements.append((statement, elapsed))
+
+@event.listens_for(db.Model, 'load', propagate=True)
+def count_loaded_row(target, context):
+    if has_request_context():
+        stats = g.get('request_stats')
+        if stats is not None:
+            stats.rows += 1
+
+def _save_profile(profiler, endpoint):
+    folder = app.config['PROFILER_FOLDER']
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{endpoint}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.folded")
+    with open(path, 'w') as f:
+        f.write(profiler.collapsed())
+    return path
+
+def _log_slow_request(stats, endpoint, duration):
+    lines = [
+        f"Slow request {request.method} {request.full_path.rstrip('?')} ({endpoint}): {duration:.3f}s, "
+        f"{stats.queries} queries in {stats.query_seconds:.3f}s, {stats.rows} rows loaded"
+    ]
+    for statement, elapsed in stats.statements:
+        statement = WHITESPACE.sub(' ', statement).strip()[:1000]
+        lines.append(f"  {elapsed * 1000:8.1f} ms  {statement}")
+    if stats.queries > len(stats.statements):
+        lines.append(f"  ... {stats.queries - len(stats.statements)} more statements")
+    logger.warning('\n'.join(lines))
+
+@request_finished.connect_via(app)
+def record_request(sender, response, **extra):
+    stats = g.pop('request_stats', None)
+    if stats is None:
+        return
+    duration = time.perf_counter() - stats.started
+    endpoint = request.endpoint or 'unmatched'
+
+    request_duration.observe(duration, endpoint, request.method, str(response.status_code))
+    request_queries.observe(stats.queries, endpoint)
+    request_query_duration.observe(stats.query_seconds, endpoint)
+    request_rows.observe(stats.rows, endpoint)
+    size = response.calculate_content_length()
+    if size is not None:
+        response_size.observe(size, endpoint)
+
+    if stats.profiler is not None:
+        stats.profiler.stop()
+        try:
+            response.headers['X-Profile'] = os.path.basename(_save_profile(stats.profiler, endpoint))
+        except OSError as e:
+            logger.warning(f"Could not save profile: {str(e)}")
+
+    if duration >= app.config['SLOW_REQUEST_SECONDS']:
+        slow_requests.inc(endpoint)
+        _log_slow_request(stats, endpoint, duration)
+
+    metrics_registry.maybe_flush()
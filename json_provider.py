@@ -0,0 +1,73 @@
+import logging
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # JSON_PROVIDER 'orjson' falls back to the default provider
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    JSON provider encoding with orjson, several times faster than the json
+    module on large expense lists.
+
+    Output matches the default provider's apart from formatting details:
+    keys are sorted, dates become HTTP dates through the same default hook,
+    and non-ASCII text is written as UTF-8 rather than \\u escapes. Values
+    orjson cannot encode, such as integers beyond 64 bits, fall back to the
+    default provider.
+    """
+
+    OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+    def _options(self, indent):
+        options = self.OPTIONS
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        if indent:
+            options |= orjson.OPT_INDENT_2
+        return options
+
+    def dumps(self, obj, **kwargs):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self._options(kwargs.get('indent'))).decode('utf-8')
+        except orjson.JSONEncodeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = self.compact is False or (self.compact is None and self._app.debug)
+        try:
+            data = orjson.dumps(obj, default=self.default, option=self._options(indent))
+        except orjson.JSONEncodeError:
+            return super().response(obj)
+        return self._app.response_class(data + b'\n', mimetype=self.mimetype)
+
+JSON_PROVIDERS = {
+    'default': DefaultJSONProvider,
+    'orjson': OrjsonProvider,
+}
+
+def json_provider_class(name):
+    """
+    Return the JSON provider class for a JSON_PROVIDER setting
+
+    Args:
+        name: A JSON_PROVIDERS key
+
+    Returns:
+        type: The provider class; the default one if orjson is not installed
+    """
+    if name not in JSON_PROVIDERS:
+        raise ValueError(f"Unknown JSON_PROVIDER '{name}', expected one of: {', '.join(JSON_PROVIDERS)}")
+    if name == 'orjson' and orjson is None:
+        logger.warning("orjson is not installed, using the default JSON provider")
+        return DefaultJSONProvider
+    return JSON_PROVIDERS[name]
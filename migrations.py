@@ -0,0 +1,140 @@
+import logging
+from contextlib import contextmanager
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from app import db
+from models import Expense, Budget, Receipt, DailySpend, SchemaVersion, rebuild_daily_spend
+
+logger = logging.getLogger(__name__)
+
+# Ordered list of (version, description, function). db.create_all() only
+# creates missing tables, so every change to an existing table goes here.
+MIGRATIONS = []
+
+def migration(version, description):
+    """Register a schema migration to run once, in version order"""
+    def decorator(func):
+        MIGRATIONS.append((version, description, func))
+        MIGRATIONS.sort(key=lambda item: item[0])
+        return func
+    return decorator
+
+# Advisory lock serializing migrations across workers that boot together
+MIGRATION_LOCK_NAME = 'expensewise_migrations'
+MIGRATION_LOCK_KEY = 0x4578704d6967  # pg_advisory_lock takes a bigint
+MIGRATION_LOCK_TIMEOUT = 300  # seconds
+
+@contextmanager
+def migration_lock():
+    """
+    Hold a database advisory lock on a dedicated connection, so only one
+    worker runs migrations at a time. SQLite has no advisory locks; there
+    every step is idempotent instead.
+    """
+    dialect = db.engine.dialect.name
+    if dialect not in ('mysql', 'postgresql'):
+        yield
+        return
+
+    with db.engine.connect() as connection:
+        if dialect == 'mysql':
+            acquired = connection.execute(
+                text("SELECT GET_LOCK(:name, :timeout)"),
+                {'name': MIGRATION_LOCK_NAME, 'timeout': MIGRATION_LOCK_TIMEOUT}
+            ).scalar()
+            if acquired != 1:
+                raise RuntimeError(f"Timed out waiting for the {MIGRATION_LOCK_NAME} lock")
+        else:
+            connection.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+        try:
+            yield
+        finally:
+            if dialect == 'mysql':
+                connection.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': MIGRATION_LOCK_NAME})
+            else:
+                connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
+
+def _index_names(table_name):
+    return {index['name'] for index in inspect(db.engine).get_indexes(table_name)}
+
+def _column_names(table_name):
+    return {column['name'] for column in inspect(db.engine).get_columns(table_name)}
+
+def _create_missing_indexes(*models):
+    for model in models:
+        table = model.__table__
+        existing = _index_names(table.name)
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            logger.info(f"Creating index {index.name} on {table.name}")
+            try:
+                index.create(db.engine)
+            except (OperationalError, ProgrammingError):
+                # Another worker created it first
+                if index.name not in _index_names(table.name):
+                    raise
+
+def _add_missing_columns(model, *names):
+    table = model.__table__
+    existing = _column_names(table.name)
+    for name in names:
+        if name in existing:
+            continue
+        logger.info(f"Adding column {name} to {table.name}")
+        ddl = CreateColumn(table.c[name]).compile(dialect=db.engine.dialect)
+        try:
+            db.session.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+        except (OperationalError, ProgrammingError):
+            # Another worker added it first
+            db.session.rollback()
+            if name not in _column_names(table.name):
+                raise
+
+@migration(1, 'Add composite indexes for the expense, budget and rollup filters')
+def add_hot_filter_indexes():
+    _create_missing_indexes(Expense, Budget, Receipt, DailySpend)
+
+@migration(2, 'Backfill the daily spend rollup from existing expenses')
+def backfill_daily_spend():
+    rebuild_daily_spend()
+
+@migration(3, 'Add receipt pipeline status, hash and size columns')
+def add_receipt_status():
+    _add_missing_columns(Receipt, 'status', 'sha256', 'size')
+
+@migration(4, 'Index receipt filenames for content-addressed reference counts')
+def add_receipt_filename_index():
+    _create_missing_indexes(Receipt)
+
+def pending_migrations():
+    """Return the registered migrations not yet recorded in schema_version"""
+    applied = {version for (version,) in db.session.query(SchemaVersion.version)}
+    return [item for item in MIGRATIONS if item[0] not in applied]
+
+def run_migrations():
+    """
+    Apply pending migrations in order and record each one, holding the
+    migration lock so workers booting together do not race.
+
+    Returns:
+        list: The versions applied by this call
+    """
+    with migration_lock():
+        return _apply_pending_migrations()
+
+def _apply_pending_migrations():
+    applied = []
+    for version, description, func in pending_migrations():
+        logger.info(f"Applying migration {version}: {description}")
+        func()
+        db.session.add(SchemaVersion(version=version, description=description))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker recorded this migration first
+            db.session.rollback()
+            continue
+        applied.append(version)
+    return applied
@@ -1,8 +1,15 @@
-from app import db
-from datetime import datetime
+from app import app, db
+from sqlalchemy import and_, or_, func, insert, select, event
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.dialects import mysql, sqlite, postgresql
+from datetime import datetime, date, time, timedelta
+from collections import namedtuple, OrderedDict
+from time import monotonic
 import json
+import threading
+from flask import g, has_request_context
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from auth import password_hasher
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -13,10 +20,15 @@ class User(UserMixin, db.Model):
     budgets = db.relationship('Budget', backref='user', lazy=True, cascade="all, delete-orphan")
     
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
         
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        """Check a password, upgrading the stored hash if the hash method changed since"""
+        if not password_hasher.verify(self.password_hash, password):
+            return False
+        if password_hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
     
     def __repr__(self):
         return f"<User {self.username}>"
@@ -48,6 +60,10 @@ class Category(db.Model):
         }
 
 class Budget(db.Model):
+    __table_args__ = (
+        db.Index('ix_budget_user_active', 'user_id', 'is_active'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     amount = db.Column(db.Float, nullable=False)
@@ -61,6 +77,7 @@ class Budget(db.Model):
         return f"<Budget {self.name} - MYR {self.amount}>"
     
     def to_dict(self):
+        category = category_registry.get(self.category_id)
         return {
             'id': self.id,
             'name': self.name,
@@ -70,12 +87,17 @@ class Budget(db.Model):
             'category_id': self.category_id,
             'user_id': self.user_id,
             'is_active': self.is_active,
-            'category_name': self.category.name if self.category else "All Categories",
-            'category_color': self.category.color if self.category else "#2e7d32",
-            'category_icon': self.category.icon if self.category else "money-bill"
+            'category_name': category.name if category else "All Categories",
+            'category_color': category.color if category else "#2e7d32",
+            'category_icon': category.icon if category else "money-bill"
         }
 
 class Expense(db.Model):
+    __table_args__ = (
+        db.Index('ix_expense_user_date', 'user_id', 'date'),
+        db.Index('ix_expense_user_category_date', 'user_id', 'category_id', 'date'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100), nullable=False)
     amount = db.Column(db.Float, nullable=False)
@@ -90,6 +112,10 @@ class Expense(db.Model):
         return f"<Expense {self.title} - {self.currency} {self.amount}>"
     
     def to_dict(self):
+        return self.to_dict_with(category_registry.get(self.category_id), self.receipts)
+    
+    def to_dict_with(self, category, receipts):
+        """Serialize using an already loaded category and receipt list"""
         return {
             'id': self.id,
             'title': self.title,
@@ -99,18 +125,23 @@ class Expense(db.Model):
             'description': self.description,
             'category_id': self.category_id,
             'user_id': self.user_id,
-            'category_name': self.category.name if self.category else None,
-            'category_color': self.category.color if self.category else None,
-            'category_icon': self.category.icon if self.category else None,
-            'receipts': [receipt.to_dict() for receipt in self.receipts]
+            'category_name': category.name if category else None,
+            'category_color': category.color if category else None,
+            'category_icon': category.icon if category else None,
+            'receipts': [receipt.to_dict() for receipt in receipts]
         }
 
 class Receipt(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    filename = db.Column(db.String(255), nullable=False)
+    # Path relative to UPLOAD_FOLDER; receipts with the same content share it
+    filename = db.Column(db.String(255), nullable=False, index=True)
     original_filename = db.Column(db.String(255), nullable=False)
     upload_date = db.Column(db.DateTime, default=datetime.utcnow)
-    expense_id = db.Column(db.Integer, db.ForeignKey('expense.id'), nullable=False)
+    expense_id = db.Column(db.Integer, db.ForeignKey('expense.id'), nullable=False, index=True)
+    # 'pending' until the receipt pipeline has stored the file, then 'ready' or 'failed'
+    status = db.Column(db.String(20), nullable=False, default='ready', server_default='ready')
+    sha256 = db.Column(db.String(64))
+    size = db.Column(db.Integer)
     
     def __repr__(self):
         return f"<Receipt {self.original_filename}>"
@@ -121,9 +152,537 @@ class Receipt(db.Model):
             'filename': self.filename,
             'original_filename': self.original_filename,
             'upload_date': self.upload_date.strftime('%Y-%m-%d'),
-            'expense_id': self.expense_id
+            'expense_id': self.expense_id,
+            'status': self.status
         }
 
+class DailySpend(db.Model):
+    """Per user, category and day rollup of expense amounts"""
+    __tablename__ = 'daily_spend'
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'category_id', 'day', name='uq_daily_spend_bucket'),
+        db.Index('ix_daily_spend_user_day', 'user_id', 'day'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)
+    category_id = db.Column(db.Integer, db.ForeignKey('category.id'), nullable=False)
+    day = db.Column(db.Date, nullable=False)
+    total = db.Column(db.Float, nullable=False, default=0)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    min_amount = db.Column(db.Float, nullable=True)
+    max_amount = db.Column(db.Float, nullable=True)
+    
+    def __repr__(self):
+        return f"<DailySpend {self.user_id}/{self.category_id} {self.day} - {self.total}>"
+
+class SchemaVersion(db.Model):
+    """Migrations applied by migrations.run_migrations"""
+    __tablename__ = 'schema_version'
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    description = db.Column(db.String(255), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f"<SchemaVersion {self.version}>"
+
+def expense_bucket(expense):
+    """Return the rollup bucket key (user_id, category_id, day) of an expense"""
+    return (expense.user_id, expense.category_id, expense.date.date())
+
+def refresh_daily_spend(*buckets):
+    """
+    Recompute rollup buckets from the raw expense table.
+    
+    Call this after adding, changing or removing expenses and before the
+    commit, passing the buckets of both the old and new state of each
+    changed expense, so the rollup is written in the same transaction.
+    Each bucket is recomputed inside an upsert and a conditional delete,
+    so concurrent writes to one bucket neither collide on its unique key
+    nor overwrite each other's totals with ones read earlier.
+    """
+    for user_id, category_id, day in set(buckets):
+        in_bucket = and_(
+            Expense.user_id == user_id,
+            Expense.category_id == category_id,
+            *_expense_days(day, day)
+        )
+        
+        upsert_daily_spend(_raw_daily_spend_query().where(in_bucket))
+        db.session.execute(DailySpend.__table__.delete().where(
+            DailySpend.user_id == user_id,
+            DailySpend.category_id == category_id,
+            DailySpend.day == day,
+            ~select(Expense.id).where(in_bucket).exists()
+        ))
+
+def _expense_days(start_day, end_day):
+    """Criteria selecting expenses dated from start_day through end_day"""
+    criteria = [Expense.date >= datetime.combine(start_day, time.min)]
+    # The day after date.max cannot be represented, and nothing is dated after it
+    if end_day < date.max:
+        criteria.append(Expense.date < datetime.combine(end_day + timedelta(days=1), time.min))
+    return criteria
+
+def _raw_daily_spend_query():
+    return select(
+        Expense.user_id,
+        Expense.category_id,
+        func.date(Expense.date).label('day'),
+        func.sum(Expense.amount),
+        func.count(Expense.id),
+        func.min(Expense.amount),
+        func.max(Expense.amount)
+    ).group_by(
+        Expense.user_id, Expense.category_id, func.date(Expense.date)
+    )
+
+# INSERT statement constructs with an upsert clause, by dialect name
+UPSERT_DIALECTS = {
+    'mysql': mysql.insert,
+    'sqlite': sqlite.insert,
+    'postgresql': postgresql.insert,
+}
+
+DAILY_SPEND_COLUMNS = ['user_id', 'category_id', 'day', 'total', 'count', 'min_amount', 'max_amount']
+DAILY_SPEND_KEY = ['user_id', 'category_id', 'day']
+
+def upsert_daily_spend(statement):
+    """
+    Insert the buckets selected by a _raw_daily_spend_query, replacing the
+    values of buckets that already exist, in one statement
+    """
+    dialect = db.session.get_bind().dialect.name
+    upsert = UPSERT_DIALECTS[dialect](DailySpend).from_select(DAILY_SPEND_COLUMNS, statement)
+    values = [name for name in DAILY_SPEND_COLUMNS if name not in DAILY_SPEND_KEY]
+    if dialect == 'mysql':
+        upsert = upsert.on_duplicate_key_update({name: upsert.inserted[name] for name in values})
+    else:
+        upsert = upsert.on_conflict_do_update(
+            index_elements=DAILY_SPEND_KEY,
+            set_={name: upsert.excluded[name] for name in values}
+        )
+    db.session.execute(upsert)
+
+def refresh_daily_spend_range(user_id, start_day, end_day):
+    """
+    Recompute every rollup bucket of a user between two days, inclusive,
+    with one delete and one INSERT ... SELECT upsert. Used after bulk writes, where
+    refreshing bucket by bucket would cost a round trip per bucket.
+    """
+    DailySpend.query.filter(
+        DailySpend.user_id == user_id,
+        DailySpend.day >= start_day,
+        DailySpend.day <= end_day
+    ).delete(synchronize_session=False)
+    upsert_daily_spend(_raw_daily_spend_query().where(
+        Expense.user_id == user_id,
+        *_expense_days(start_day, end_day)
+    ))
+
+def rebuild_daily_spend():
+    """Rebuild the whole rollup table from the raw expense table"""
+    DailySpend.query.delete()
+    db.session.execute(insert(DailySpend).from_select(
+        ['user_id', 'category_id', 'day', 'total', 'count', 'min_amount', 'max_amount'],
+        _raw_daily_spend_query()
+    ))
+    db.session.commit()
+    return DailySpend.query.count()
+
+def check_daily_spend(tolerance=0.005):
+    """
+    Compare the rollup table with the raw expense table.
+    
+    Returns:
+        list: One (bucket, expected, actual) tuple per mismatching bucket,
+        where expected and actual are (total, count, min, max) or None
+    """
+    expected = {}
+    for user_id, category_id, day, total, count, min_amount, max_amount in db.session.execute(_raw_daily_spend_query()):
+        if isinstance(day, str):
+            day = date.fromisoformat(day)
+        expected[(user_id, category_id, day)] = (float(total), count, float(min_amount), float(max_amount))
+    
+    actual = {
+        (row.user_id, row.category_id, row.day): (row.total, row.count, row.min_amount, row.max_amount)
+        for row in DailySpend.query
+    }
+    
+    mismatches = []
+    for bucket in sorted(set(expected) | set(actual), key=lambda key: (key[2], key[0] or 0, key[1])):
+        want, got = expected.get(bucket), actual.get(bucket)
+        if want is None or got is None:
+            if want != got:
+                mismatches.append((bucket, want, got))
+        elif want[1] != got[1] or any(abs(want[i] - got[i]) > tolerance for i in (0, 2, 3)):
+            mismatches.append((bucket, want, got))
+    return mismatches
+
+def budget_spend_query(*criteria):
+    """
+    Query budgets with their total spent in one round trip.
+    
+    Daily spend rollup rows are joined against each budget's date window,
+    matching the budget's category or any category when the budget has
+    none, and summed per budget. Yields (budget, total_spent) tuples.
+    """
+    return db.session.query(
+        Budget,
+        func.coalesce(func.sum(DailySpend.total), 0).label('total_spent')
+    ).outerjoin(
+        DailySpend, _budget_spend_match()
+    ).filter(
+        *criteria
+    ).group_by(
+        Budget.id
+    )
+
+def budget_spend_statement(*criteria):
+    """The select() of budget_spend_query, for sessions without Model.query"""
+    return select(
+        Budget,
+        func.coalesce(func.sum(DailySpend.total), 0).label('total_spent')
+    ).outerjoin(
+        DailySpend, _budget_spend_match()
+    ).where(
+        *criteria
+    ).group_by(
+        Budget.id
+    )
+
+def _budget_spend_match():
+    return and_(
+        DailySpend.user_id == Budget.user_id,
+        DailySpend.day >= func.date(Budget.start_date),
+        DailySpend.day <= func.date(Budget.end_date),
+        or_(Budget.category_id.is_(None), DailySpend.category_id == Budget.category_id)
+    )
+
+def budget_kpi(budget, total_spent, categories=None):
+    """
+    Build the KPI payload for a budget from its aggregated spend. Categories
+    come from the registry unless a mapping of id to category is given.
+    """
+    category = (categories if categories is not None else category_registry).get(budget.category_id)
+    total_spent = float(total_spent)
+    remaining = budget.amount - total_spent
+    percentage_used = (total_spent / budget.amount * 100) if budget.amount > 0 else 0
+    is_exceeded = total_spent > budget.amount
+    
+    return {
+        'budget_id': budget.id,
+        'budget_name': budget.name,
+        'budget_amount': budget.amount,
+        'total_spent': total_spent,
+        'remaining': remaining,
+        'percentage_used': percentage_used,
+        'is_exceeded': is_exceeded,
+        'status': 'Exceeded' if is_exceeded else 'On Track',
+        'category_name': category.name if category else "All Categories",
+        'category_color': category.color if category else "#2e7d32",
+        'start_date': budget.start_date.strftime('%Y-%m-%d'),
+        'end_date': budget.end_date.strftime('%Y-%m-%d')
+    }
+
+class RegistryVersion(db.Model):
+    """Version stamps of the process-local registries, shared by all workers"""
+    __tablename__ = 'registry_version'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f"<RegistryVersion {self.name} {self.version}>"
+
+class CachedCategory(namedtuple('CachedCategory', ['id', 'name', 'color', 'icon'])):
+    """Immutable snapshot of a Category row held by the category registry"""
+    
+    def to_dict(self):
+        return self._asdict()
+
+class CategoryRegistry:
+    """
+    Process-local, read-mostly copy of every category, indexed by id and name.
+    
+    Category writes call bump() in their transaction. Each request reads the
+    version stamp once, on first use, and reloads the registry when it moved,
+    so every worker sees a change by its next request.
+    """
+    NAME = 'categories'
+    
+    def __init__(self):
+        # (version, by id, by name), replaced as a whole on reload
+        self._snapshot = (None, {}, {})
+        self._lock = threading.Lock()
+    
+    def _current(self):
+        if has_request_context() and g.get('category_registry_checked'):
+            return self._snapshot
+        
+        # Read the stamp before the rows, so a snapshot is never newer than its label
+        version = db.session.query(RegistryVersion.version).filter_by(name=self.NAME).scalar()
+        if version != self._snapshot[0]:
+            with self._lock:
+                if version != self._snapshot[0]:
+                    categories = [
+                        CachedCategory(category.id, category.name, category.color, category.icon)
+                        for category in Category.query.order_by(Category.id)
+                    ]
+                    self._snapshot = (
+                        version,
+                        {category.id: category for category in categories},
+                        {category.name: category for category in categories}
+                    )
+        
+        if has_request_context():
+            g.category_registry_checked = True
+        return self._snapshot
+    
+    def get(self, category_id):
+        """Return the category with this id, or None"""
+        if category_id is None:
+            return None
+        return self._current()[1].get(category_id)
+    
+    def by_name(self, name):
+        """Return the category with this name, or None"""
+        return self._current()[2].get(name)
+    
+    def all(self):
+        """Return every category ordered by id"""
+        return list(self._current()[1].values())
+    
+    def bump(self):
+        """Bump the version stamp in the current transaction"""
+        updated = RegistryVersion.query.filter_by(name=self.NAME).update(
+            {RegistryVersion.version: RegistryVersion.version + 1}
+        )
+        if not updated:
+            db.session.add(RegistryVersion(name=self.NAME, version=1))
+        if has_request_context():
+            g.pop('category_registry_checked', None)
+
+category_registry = CategoryRegistry()
+
+class CachedUser(UserMixin):
+    """Identity fields of a User, standing in for current_user without a query"""
+    
+    def __init__(self, id, username, email):
+        self.id = id
+        self.username = username
+        self.email = email
+    
+    def __repr__(self):
+        return f"<CachedUser {self.username}>"
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'username': self.username,
+            'email': self.email
+        }
+
+class UserCache:
+    """
+    Process-local, bounded LRU of CachedUser snapshots for load_user.
+    
+    Entries expire after ttl seconds. A commit that updates or deletes a
+    User evicts it from this process at once; other workers see the change
+    when their entry expires.
+    """
+    # The User columns a CachedUser is built from, in constructor order
+    COLUMNS = (User.id, User.username, User.email)
+    
+    def __init__(self, ttl=60, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, user_id):
+        """Return the CachedUser with this id, or None if there is no such user"""
+        user = self.cached(user_id)
+        if user is not None:
+            return user
+        
+        row = db.session.query(*self.COLUMNS).filter_by(id=user_id).first()
+        if row is None:
+            self.invalidate(user_id)
+            return None
+        return self.store(row)
+    
+    def cached(self, user_id):
+        """Return the cached CachedUser with this id without querying, or None"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[1] > monotonic():
+                self._entries.move_to_end(user_id)
+                return entry[0]
+        return None
+    
+    def store(self, row):
+        """Cache a CachedUser built from a row of COLUMNS and return it"""
+        user = CachedUser(*row)
+        with self._lock:
+            self._entries[user.id] = (user, monotonic() + self.ttl)
+            self._entries.move_to_end(user.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return user
+    
+    def invalidate(self, *user_ids):
+        """Evict users from this process's cache"""
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+user_cache = UserCache(ttl=app.config['USER_CACHE_TTL'], max_entries=app.config['USER_CACHE_MAX_ENTRIES'])
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _record_user_change(mapper, connection, target):
+    object_session(target).info.setdefault('changed_user_ids', set()).add(target.id)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_changed_users(session):
+    user_ids = session.info.pop('changed_user_ids', None)
+    if user_ids:
+        user_cache.invalidate(*user_ids)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changed_users(session):
+    session.info.pop('changed_user_ids', None)
+
+# Maximum number of ids bound into a single IN clause
+SERIALIZE_BATCH_SIZE = 1000
+
+def serialize_expenses(expenses):
+    """
+    Serialize a list of expenses without lazy loading per row.
+    
+    Categories are resolved from the category registry and receipts are
+    loaded with one IN query per batch of SERIALIZE_BATCH_SIZE expenses, so
+    the number of round trips does not grow with each expense.
+    """
+    if not expenses:
+        return []
+    
+    receipts_by_expense = {}
+    expense_ids = [expense.id for expense in expenses]
+    for start in range(0, len(expense_ids), SERIALIZE_BATCH_SIZE):
+        batch = expense_ids[start:start + SERIALIZE_BATCH_SIZE]
+        receipts = Receipt.query.filter(Receipt.expense_id.in_(batch)).order_by(Receipt.id)
+        for receipt in receipts:
+            receipts_by_expense.setdefault(receipt.expense_id, []).append(receipt)
+    
+    return serialize_loaded_expenses(expenses, receipts_by_expense, category_registry)
+
+def serialize_loaded_expenses(expenses, receipts_by_expense, categories):
+    """
+    Serialize expenses from already loaded receipts, grouped by expense id,
+    and a lookup of categories by id (the registry or a dict)
+    """
+    return [
+        expense.to_dict_with(
+            categories.get(expense.category_id),
+            receipts_by_expense.get(expense.id, [])
+        )
+        for expense in expenses
+    ]
+
+# Columns of a serialized expense, read as plain rows by expense_rows
+EXPENSE_ROW_COLUMNS = (
+    Expense.id, Expense.title, Expense.amount, Expense.currency, Expense.date,
+    Expense.description, Expense.category_id, Expense.user_id,
+    Category.name.label('category_name'),
+    Category.color.label('category_color'),
+    Category.icon.label('category_icon'),
+)
+
+RECEIPT_ROW_COLUMNS = (
+    Receipt.id, Receipt.filename, Receipt.original_filename,
+    Receipt.upload_date, Receipt.expense_id, Receipt.status,
+)
+
+def expense_rows(query, limit=None):
+    """
+    Run an expense query for EXPENSE_ROW_COLUMNS joined with the category,
+    as tuples instead of ORM instances
+    
+    Args:
+        query: A filtered and sorted Expense query
+        limit: The maximum number of rows, if any
+    
+    Returns:
+        list: Rows with attribute access by column name
+    """
+    query = query.outerjoin(Category, Category.id == Expense.category_id).with_entities(*EXPENSE_ROW_COLUMNS)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def format_days(values):
+    """Format datetimes as YYYY-MM-DD, as strftime('%Y-%m-%d') would but faster"""
+    return [value.isoformat()[:10] for value in values]
+
+def serialize_expense_rows(rows):
+    """
+    Serialize rows from expense_rows into the same dicts as Expense.to_dict.
+    
+    Rows are transposed into columns so dates are formatted in one pass, and
+    receipts are read as tuples with one IN query per SERIALIZE_BATCH_SIZE
+    expenses.
+    """
+    if not rows:
+        return []
+    
+    ids, titles, amounts, currencies, dates, descriptions, category_ids, user_ids, \
+        category_names, category_colors, category_icons = zip(*rows)
+    
+    receipts_by_expense = {}
+    for start in range(0, len(ids), SERIALIZE_BATCH_SIZE):
+        receipts = db.session.execute(
+            select(*RECEIPT_ROW_COLUMNS)
+            .where(Receipt.expense_id.in_(ids[start:start + SERIALIZE_BATCH_SIZE]))
+            .order_by(Receipt.id)
+        ).all()
+        if not receipts:
+            continue
+        receipt_ids, filenames, original_filenames, upload_dates, expense_ids, statuses = zip(*receipts)
+        for receipt in zip(receipt_ids, filenames, original_filenames, format_days(upload_dates), expense_ids, statuses):
+            receipts_by_expense.setdefault(receipt[4], []).append({
+                'id': receipt[0],
+                'filename': receipt[1],
+                'original_filename': receipt[2],
+                'upload_date': receipt[3],
+                'expense_id': receipt[4],
+                'status': receipt[5]
+            })
+    
+    return [
+        {
+            'id': expense_id,
+            'title': title,
+            'amount': amount,
+            'currency': currency,
+            'date': day,
+            'description': description,
+            'category_id': category_id,
+            'user_id': user_id,
+            'category_name': category_name,
+            'category_color': category_color,
+            'category_icon': category_icon,
+            'receipts': receipts_by_expense.get(expense_id, [])
+        }
+        for expense_id, title, amount, currency, day, description, category_id, user_id,
+            category_name, category_color, category_icon in zip(
+                ids, titles, amounts, currencies, format_days(dates), descriptions, category_ids, user_ids,
+                category_names, category_colors, category_icons
+            )
+    ]
+
 def create_default_categories():
     """Create default categories if they don't exist"""
     default_categories = [
@@ -142,11 +701,14 @@ def create_default_categories():
         {"name": "Other", "color": "#808080", "icon": "ellipsis-h"}
     ]
     
-    for category_data in default_categories:
-        # Check if category exists
-        existing = Category.query.filter_by(name=category_data["name"]).first()
-        if not existing:
-            category = Category(**category_data)
-            db.session.add(category)
+    # Check which categories exist with a single query
+    names = [category_data["name"] for category_data in default_categories]
+    existing = {name for (name,) in db.session.query(Category.name).filter(Category.name.in_(names))}
+    
+    missing = [category_data for category_data in default_categories if category_data["name"] not in existing]
+    for category_data in missing:
+        db.session.add(Category(**category_data))
     
+    if missing or not db.session.get(RegistryVersion, CategoryRegistry.NAME):
+        category_registry.bump()
     db.session.commit()
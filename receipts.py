@@ -0,0 +1,270 @@
+import os
+import uuid
+import hashlib
+import logging
+import fcntl
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from flask import Request
+from werkzeug.utils import secure_filename
+from app import app, db
+from models import Receipt, Expense
+from cache import report_cache
+
+logger = logging.getLogger(__name__)
+
+class SpoolingRequest(Request):
+    """
+    Request that writes uploaded files straight into the receipt spool
+    folder, so a receipt can be handed to the pipeline with a hard link
+    instead of a second copy of up to MAX_CONTENT_LENGTH bytes
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return tempfile.NamedTemporaryFile('wb+', dir=app.config['RECEIPT_SPOOL_FOLDER'], prefix='upload-')
+
+app.request_class = SpoolingRequest
+
+def receipt_filename(original_filename):
+    """
+    Generate a unique stored filename keeping the upload's extension
+
+    Args:
+        original_filename: The secured name of the uploaded file
+
+    Returns:
+        str: A uuid based filename
+    """
+    extension = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
+    return f"{uuid.uuid4()}.{extension}" if extension else f"{uuid.uuid4()}"
+
+def spool_path(filename):
+    return os.path.join(app.config['RECEIPT_SPOOL_FOLDER'], filename)
+
+def spool_receipt(file, expense_id):
+    """
+    Spool an uploaded receipt and add a pending Receipt to the session.
+
+    The caller commits, then passes the receipts to receipt_pipeline.submit
+    so hashing and final placement happen off the request thread.
+
+    Args:
+        file: The uploaded file object
+        expense_id: The ID of the expense to associate with this receipt
+
+    Returns:
+        Receipt: The pending Receipt, or None if no file was uploaded
+    """
+    if not file or not file.filename:
+        return None
+
+    original_filename = secure_filename(file.filename)
+    filename = receipt_filename(original_filename)
+    path = spool_path(filename)
+
+    # Uploads parsed by SpoolingRequest already live in the spool folder
+    stream_name = getattr(file.stream, 'name', None)
+    if isinstance(stream_name, str) and os.path.dirname(os.path.abspath(stream_name)) == os.path.abspath(app.config['RECEIPT_SPOOL_FOLDER']):
+        file.stream.flush()
+        os.link(stream_name, path)
+    else:
+        file.save(path)
+
+    receipt = Receipt(
+        filename=filename,
+        original_filename=original_filename,
+        expense_id=expense_id,
+        status='pending'
+    )
+    db.session.add(receipt)
+    return receipt
+
+class ContentAddressedStore:
+    """
+    Receipt files stored once per distinct content, under
+    <root>/<aa>/<bb>/<sha256>.<extension> where aa and bb are the first two
+    byte pairs of the hash.
+
+    A stored file is referenced by every Receipt whose filename is its
+    relative path, so the reference count is the number of such rows and
+    cannot drift from the data. Placing and releasing files hold an
+    exclusive lock shared by every process on the host, so a release never
+    deletes a file that a concurrent upload has just started to reference.
+    """
+
+    def __init__(self, root, lock_path):
+        self.root = root
+        self.lock_path = lock_path
+
+    def name_for(self, sha256, original_filename):
+        """Return the relative path of the file with this hash"""
+        extension = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
+        name = f"{sha256}.{extension}" if extension else sha256
+        return '/'.join((sha256[:2], sha256[2:4], name))
+
+    def path(self, name):
+        return os.path.join(self.root, *name.split('/'))
+
+    @contextmanager
+    def lock(self):
+        with open(self.lock_path, 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def place(self, source, name):
+        """
+        Move source into the store under name, or drop it if that content
+        is already stored. Call with the lock held.
+        """
+        path = self.path(name)
+        if os.path.exists(path):
+            os.remove(source)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(source, path)
+
+    def references(self, name):
+        return Receipt.query.filter_by(filename=name).count()
+
+    def release(self, name):
+        """
+        Delete a stored file once no Receipt references it. Call after the
+        transaction removing the reference has been committed.
+
+        Returns:
+            bool: True if the file was deleted
+        """
+        with self.lock():
+            if self.references(name):
+                return False
+            path = self.path(name)
+            if not os.path.exists(path):
+                return False
+            os.remove(path)
+            # Prune emptied shard directories, never the root itself
+            directory = os.path.dirname(path)
+            while directory != self.root and not os.listdir(directory):
+                os.rmdir(directory)
+                directory = os.path.dirname(directory)
+            return True
+
+receipt_store = ContentAddressedStore(
+    app.config['UPLOAD_FOLDER'],
+    os.path.join(app.config['RECEIPT_SPOOL_FOLDER'], '.store.lock')
+)
+
+class ReceiptPipeline:
+    """
+    Bounded worker pool that hashes spooled receipts, moves them into the
+    content-addressed store, runs the post-processors and records the
+    outcome on the Receipt row.
+
+    At most max_workers + max_pending jobs are queued; beyond that a job
+    runs on the submitting thread, so a burst of uploads slows down the
+    uploader instead of growing the queue without limit.
+    """
+
+    def __init__(self, store, max_workers=2, max_pending=32):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='receipt')
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        # Callables of (path, receipt_id) run after a receipt is placed
+        self.post_processors = []
+
+    def submit(self, *receipts):
+        """Queue committed pending receipts for processing"""
+        for receipt in receipts:
+            if receipt is None:
+                continue
+            if self._slots.acquire(blocking=False):
+                self._executor.submit(self._run, receipt.id, receipt.filename, receipt.original_filename)
+            else:
+                self.process(receipt.id, receipt.filename, receipt.original_filename)
+
+    def _run(self, receipt_id, filename, original_filename):
+        try:
+            self.process(receipt_id, filename, original_filename)
+        finally:
+            self._slots.release()
+
+    def _record(self, receipt_id, values):
+        """
+        Update and commit a receipt, then drop its owner's cached reports,
+        which embed receipt statuses.
+
+        Returns:
+            int: The number of receipts updated, 0 if it was deleted
+        """
+        owner_id = db.session.query(Expense.user_id).join(
+            Receipt, Receipt.expense_id == Expense.id
+        ).filter(Receipt.id == receipt_id).scalar()
+        updated = Receipt.query.filter_by(id=receipt_id).update(values)
+        db.session.commit()
+        if owner_id is not None:
+            report_cache.invalidate_user(owner_id)
+        return updated
+
+    def process(self, receipt_id, filename, original_filename):
+        """
+        Hash one spooled receipt, place it in the store and record its
+        status. A receipt stored under a flat legacy name in UPLOAD_FOLDER
+        is moved into the store the same way.
+
+        Returns:
+            str: The status recorded, 'ready' or 'failed'
+        """
+        # A fresh app context gives this job its own session
+        with app.app_context():
+            source = spool_path(filename)
+            if not os.path.exists(source):
+                source = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+
+            try:
+                digest = hashlib.sha256()
+                size = 0
+                with open(source, 'rb') as f:
+                    for block in iter(lambda: f.read(1024 * 1024), b''):
+                        digest.update(block)
+                        size += len(block)
+            except OSError as e:
+                logger.error(f"Error storing receipt {filename}: {str(e)}")
+                self._record(receipt_id, {'status': 'failed'})
+                return 'failed'
+
+            name = self.store.name_for(digest.hexdigest(), original_filename)
+            with self.store.lock():
+                try:
+                    self.store.place(source, name)
+                except OSError as e:
+                    # e.g. the spooled file was deleted with its receipt
+                    logger.error(f"Error storing receipt {filename}: {str(e)}")
+                    self._record(receipt_id, {'status': 'failed'})
+                    return 'failed'
+                updated = self._record(receipt_id, {
+                    'filename': name,
+                    'status': 'ready',
+                    'sha256': digest.hexdigest(),
+                    'size': size
+                })
+            if not updated:
+                # The receipt was deleted while this job ran
+                self.store.release(name)
+                return 'ready'
+
+            for post_processor in self.post_processors:
+                try:
+                    post_processor(self.store.path(name), receipt_id)
+                except Exception:
+                    logger.exception(f"Post-processing failed for receipt {name}")
+            return 'ready'
+
+receipt_pipeline = ReceiptPipeline(
+    receipt_store,
+    max_workers=app.config['RECEIPT_WORKERS'],
+    max_pending=app.config['RECEIPT_MAX_PENDING']
+)
@@ -1,15 +1,31 @@
-import os
-import uuid
-from datetime import datetime
-from flask import request, jsonify, send_from_directory, render_template, redirect, url_for, flash
-from werkzeug.utils import secure_filename
-from sqlalchemy import extract, func
+import io
+import csv
+import json
+from bisect import bisect_right
+from datetime import date, datetime, timedelta
+from flask import request, jsonify, send_file, render_template, redirect, url_for, flash, abort, Response, stream_with_context
+from sqlalchemy import extract, func, and_, or_
 from flask_login import login_user, logout_user, login_required, current_user
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, BooleanField, SubmitField, EmailField
 from wtforms.validators import DataRequired, Email, EqualTo, Length, ValidationError
 from app import app, db
-from models import User, Expense, Category, Receipt, Budget
+from models import (
+    User, Expense, Category, Receipt, Budget, DailySpend,
+    serialize_expenses, budget_spend_query, budget_kpi, expense_bucket, refresh_daily_spend,
+    category_registry, expense_rows, serialize_expense_rows
+)
+from utils import encode_cursor, decode_cursor, parse_expense_data, delete_receipt_file
+from receipts import spool_receipt, receipt_pipeline
+from thumbnails import thumbnail_cache
+from serving import send_static, send_upload
+from expense_import import import_expenses, IMPORT_FORMATS
+from cache import report_cache
+from analytics import analytics_cache
+from timeseries import INTERVALS, bucket_boundaries, bucket_count, build_series, fits_date_range
+from auth import password_hasher, auth_throttle, AuthBusyError
+from database import pool_metrics
+from instrumentation import metrics_registry, metrics_access_allowed
 
 # Forms for authentication
 class LoginForm(FlaskForm):
@@ -43,11 +59,32 @@ def login():
     
     form = LoginForm()
     if form.validate_on_submit():
+        ip_key = f"ip:{request.remote_addr}"
+        account_key = f"account:{form.email.data.lower()}"
+        if auth_throttle.blocked(ip_key, account_key):
+            flash('Too many login attempts, please try again later', 'danger')
+            return render_template('login.html', form=form), 429
+        auth_throttle.hit(ip_key)
+        
         user = User.query.filter_by(email=form.email.data).first()
-        if user is None or not user.check_password(form.password.data):
+        try:
+            if user is None:
+                valid = password_hasher.verify_missing(form.password.data)
+            else:
+                valid = user.check_password(form.password.data)
+        except AuthBusyError:
+            flash('The server is busy, please try again in a moment', 'warning')
+            return render_template('login.html', form=form), 503
+        
+        if not valid:
+            auth_throttle.hit(account_key)
             flash('Invalid email or password', 'danger')
             return render_template('login.html', form=form)
         
+        auth_throttle.clear(account_key)
+        if user in db.session.dirty:
+            # check_password upgraded the hash
+            db.session.commit()
         login_user(user, remember=form.remember_me.data)
         flash('Login successful!', 'success')
         return redirect(url_for('index'))
@@ -61,8 +98,18 @@ def register():
     
     form = RegistrationForm()
     if form.validate_on_submit():
+        ip_key = f"ip:{request.remote_addr}"
+        if auth_throttle.blocked(ip_key):
+            flash('Too many attempts, please try again later', 'danger')
+            return render_template('register.html', form=form), 429
+        auth_throttle.hit(ip_key)
+        
         user = User(username=form.username.data, email=form.email.data)
-        user.set_password(form.password.data)
+        try:
+            user.set_password(form.password.data)
+        except AuthBusyError:
+            flash('The server is busy, please try again in a moment', 'warning')
+            return render_template('register.html', form=form), 503
         db.session.add(user)
         db.session.commit()
         flash('Registration successful! You can now log in.', 'success')
@@ -85,50 +132,306 @@ def index():
 # Serve static files
 @app.route('/static/<path:path>')
 def serve_static(path):
-    return send_from_directory('static', path)
+    return send_static(path)
 
 # Serve uploaded files
 @app.route('/uploads/<path:filename>')
 def serve_upload(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    return send_upload(filename)
+
+# Operational metrics, for the loopback interface or holders of METRICS_TOKEN
+@app.route('/metrics/pool', methods=['GET'])
+def get_pool_metrics():
+    if not metrics_access_allowed():
+        abort(404)
+    response = jsonify({name: metrics.snapshot() for name, metrics in pool_metrics.items()})
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    if not metrics_access_allowed():
+        abort(404)
+    response = Response(metrics_registry.exposition(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
 
 # API Endpoints for Expenses
-@app.route('/api/expenses', methods=['GET'])
-@login_required
-def get_expenses():
-    """Get all expenses with optional filtering"""
+EXPENSE_SORT_COLUMNS = {
+    'date': Expense.date,
+    'amount': Expense.amount,
+    'title': Expense.title
+}
+
+def expense_filter_criteria(args, user_id):
+    """
+    Build the filters and ordering of a user's expense listing from the
+    get_expenses arguments, as plain expressions usable by a sync Query or
+    an async select()
+    
+    Returns:
+        tuple: The filter criteria, the ORDER BY columns, the sort column and
+        whether the sort is descending
+    
+    Raises:
+        ValueError: If a date argument is invalid
+    """
     # Get query parameters
-    category_id = request.args.get('category_id', type=int)
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    sort_by = request.args.get('sort_by', 'date')
-    sort_order = request.args.get('sort_order', 'desc')
+    category_id = args.get('category_id', type=int)
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    sort_by = args.get('sort_by', 'date')
+    sort_order = args.get('sort_order', 'desc')
     
-    # Build query - only show expenses for the current user
-    query = Expense.query.filter(Expense.user_id == current_user.id)
+    # Only show expenses for the given user
+    criteria = [Expense.user_id == user_id]
     
     # Apply filters
     if category_id:
-        query = query.filter(Expense.category_id == category_id)
+        criteria.append(Expense.category_id == category_id)
     
     if start_date:
-        start_date = datetime.strptime(start_date, '%Y-%m-%d')
-        query = query.filter(Expense.date >= start_date)
+        criteria.append(Expense.date >= datetime.strptime(start_date, '%Y-%m-%d'))
     
     if end_date:
-        end_date = datetime.strptime(end_date, '%Y-%m-%d')
-        query = query.filter(Expense.date <= end_date)
+        criteria.append(Expense.date <= datetime.strptime(end_date, '%Y-%m-%d'))
     
-    # Apply sorting
-    if sort_by == 'amount':
-        query = query.order_by(Expense.amount.desc() if sort_order == 'desc' else Expense.amount)
-    elif sort_by == 'title':
-        query = query.order_by(Expense.title.desc() if sort_order == 'desc' else Expense.title)
-    else:  # Default to date
-        query = query.order_by(Expense.date.desc() if sort_order == 'desc' else Expense.date)
+    # Apply sorting, with id as a tie-breaker so keyset cursors are stable
+    sort_column = EXPENSE_SORT_COLUMNS.get(sort_by, Expense.date)
+    descending = sort_order == 'desc'
+    if descending:
+        order_by = [sort_column.desc(), Expense.id.desc()]
+    else:
+        order_by = [sort_column, Expense.id]
+    
+    return criteria, order_by, sort_column, descending
+
+def build_expense_query(args):
+    """
+    Build the current user's expense query from the get_expenses arguments
+    
+    Returns:
+        tuple: The filtered and sorted query, the sort column and whether
+        the sort is descending
+    """
+    criteria, order_by, sort_column, descending = expense_filter_criteria(args, current_user.id)
+    query = Expense.query.filter(*criteria).order_by(*order_by)
+    return query, sort_column, descending
+
+def columnar_serialization():
+    """Return whether the current endpoint serializes expenses from plain rows"""
+    return request.endpoint in app.config['COLUMNAR_SERIALIZATION']
+
+def load_expense_list(query, limit=None):
+    """
+    Run an expense query for serialize_expense_list, as plain rows on
+    endpoints listed in COLUMNAR_SERIALIZATION and as ORM objects elsewhere
+    """
+    if columnar_serialization():
+        return expense_rows(query, limit)
+    if limit is not None:
+        query = query.limit(limit)
+    return query.all()
+
+def serialize_expense_list(expenses):
+    """Serialize expenses loaded by load_expense_list"""
+    if columnar_serialization():
+        return serialize_expense_rows(expenses)
+    return serialize_expenses(expenses)
+
+def expense_page_limit(limit):
+    """Clamp a requested page size to EXPENSES_PAGE_MAX_LIMIT"""
+    max_limit = app.config['EXPENSES_PAGE_MAX_LIMIT']
+    return max(1, min(limit or max_limit, max_limit))
+
+def expense_keyset_criterion(cursor, sort_column, descending):
+    """
+    Build the filter selecting the rows after a keyset cursor
+    
+    Raises:
+        ValueError: If the cursor is invalid
+    """
+    try:
+        last_value, last_id = decode_cursor(cursor)
+        if sort_column is Expense.date:
+            last_value = datetime.fromisoformat(last_value)
+    except TypeError:
+        raise ValueError('Invalid cursor')
+    
+    # The value must have the sort column's type to be bound as a parameter
+    if sort_column is Expense.amount:
+        valid = isinstance(last_value, (int, float)) and not isinstance(last_value, bool)
+    else:
+        valid = isinstance(last_value, (str, datetime))
+    if not valid:
+        raise ValueError('Invalid cursor')
+    
+    if descending:
+        return or_(
+            sort_column < last_value,
+            and_(sort_column == last_value, Expense.id < last_id)
+        )
+    return or_(
+        sort_column > last_value,
+        and_(sort_column == last_value, Expense.id > last_id)
+    )
+
+def expense_page(expenses, limit, sort_column):
+    """
+    Split the limit + 1 rows fetched for a page into the page and the cursor
+    of the next one
+    
+    Returns:
+        tuple: The page of expenses and the next cursor, or None on the last page
+    """
+    if len(expenses) <= limit:
+        return expenses, None
+    expenses = expenses[:limit]
+    last = expenses[-1]
+    last_value = getattr(last, sort_column.key)
+    if isinstance(last_value, datetime):
+        last_value = last_value.isoformat()
+    return expenses, encode_cursor(last_value, last.id)
+
+@app.route('/api/expenses', methods=['GET'])
+@login_required
+@report_cache.conditional
+def get_expenses():
+    """Get expenses with optional filtering, keyset pagination or NDJSON streaming"""
+    try:
+        query, sort_column, descending = build_expense_query(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format, use YYYY-MM-DD'}), 400
+    
+    # Stream every matching row as NDJSON. Ids come from a server-side cursor
+    # on a dedicated connection so the session stays free to load each chunk.
+    if request.args.get('format') == 'ndjson':
+        chunk_size = app.config['EXPENSES_STREAM_CHUNK_SIZE']
+        id_statement = query.with_entities(Expense.id).statement
+        
+        def generate():
+            with db.engine.connect() as connection:
+                result = connection.execution_options(
+                    stream_results=True, yield_per=chunk_size
+                ).execute(id_statement)
+                for partition in result.partitions():
+                    ids = [row[0] for row in partition]
+                    by_id = {
+                        expense.id: expense
+                        for expense in Expense.query.filter(Expense.id.in_(ids))
+                    }
+                    rows = serialize_expenses([by_id[expense_id] for expense_id in ids])
+                    yield ''.join(json.dumps(row) + '\n' for row in rows)
+                    db.session.expunge_all()
+        
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    
+    # Without pagination parameters keep returning the full list
+    if limit is None and cursor is None:
+        expenses = load_expense_list(query)
+        return jsonify(serialize_expense_list(expenses))
+    
+    limit = expense_page_limit(limit)
+    
+    if cursor:
+        try:
+            query = query.filter(expense_keyset_criterion(cursor, sort_column, descending))
+        except ValueError:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    
+    # Fetch one extra row to know whether another page exists
+    expenses, next_cursor = expense_page(load_expense_list(query, limit + 1), limit, sort_column)
+    
+    return jsonify({
+        'expenses': serialize_expense_list(expenses),
+        'next_cursor': next_cursor
+    })
+
+# Columns written by the bulk export, in order
+EXPORT_COLUMNS = ['id', 'date', 'title', 'amount', 'currency', 'category_id', 'category_name', 'description']
+
+@app.route('/api/expenses/export', methods=['GET'])
+@login_required
+def export_expenses():
+    """
+    Stream the current user's expenses as CSV or as columnar batches.
+    
+    Accepts the same filters and sort as get_expenses. Rows are read as plain
+    tuples from a server-side cursor on a dedicated connection, without ORM
+    hydration, and written out EXPORT_CHUNK_SIZE rows at a time, so memory
+    use does not depend on how many rows are exported.
+    
+    format=columnar writes one JSON header line holding the column names and
+    the category dictionary, then one JSON line per batch mapping each column
+    to an array of values. Category names are dictionary-encoded through
+    category_id instead of being repeated per row.
+    """
+    export_format = request.args.get('format', 'csv')
+    if export_format not in ('csv', 'columnar'):
+        return jsonify({'error': 'Invalid format, use csv or columnar'}), 400
+    
+    try:
+        query, _, _ = build_expense_query(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format, use YYYY-MM-DD'}), 400
     
-    expenses = query.all()
-    return jsonify([expense.to_dict() for expense in expenses])
+    statement = query.with_entities(
+        Expense.id, Expense.date, Expense.title, Expense.amount,
+        Expense.currency, Expense.category_id, Expense.description
+    ).statement
+    chunk_size = app.config['EXPORT_CHUNK_SIZE']
+    categories = {category.id: category.name for category in category_registry.all()}
+    
+    def stream_partitions():
+        with db.engine.connect() as connection:
+            result = connection.execution_options(
+                stream_results=True, yield_per=chunk_size
+            ).execute(statement)
+            yield from result.partitions()
+    
+    def generate_csv():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        for partition in stream_partitions():
+            writer.writerows(
+                (expense_id, expense_date.strftime('%Y-%m-%d'), title, amount, currency,
+                 category_id, categories.get(category_id), description)
+                for expense_id, expense_date, title, amount, currency, category_id, description in partition
+            )
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+    
+    def generate_columnar():
+        yield json.dumps({
+            'columns': [column for column in EXPORT_COLUMNS if column != 'category_name'],
+            'categories': categories
+        }) + '\n'
+        for partition in stream_partitions():
+            ids, dates, titles, amounts, currencies, category_ids, descriptions = zip(*partition)
+            yield json.dumps({
+                'id': ids,
+                'date': [expense_date.strftime('%Y-%m-%d') for expense_date in dates],
+                'title': titles,
+                'amount': amounts,
+                'currency': currencies,
+                'category_id': category_ids,
+                'description': descriptions
+            }) + '\n'
+    
+    if export_format == 'csv':
+        response = Response(stream_with_context(generate_csv()), mimetype='text/csv')
+        response.headers['Content-Disposition'] = 'attachment; filename=expenses.csv'
+    else:
+        response = Response(stream_with_context(generate_columnar()), mimetype='application/x-ndjson')
+        response.headers['Content-Disposition'] = 'attachment; filename=expenses.columnar.ndjson'
+    return response
 
 @app.route('/api/expenses/<int:expense_id>', methods=['GET'])
 def get_expense(expense_id):
@@ -142,67 +445,57 @@ def create_expense():
     """Create a new expense"""
     data = request.form.to_dict()
     
-    # Validate required fields
-    required_fields = ['title', 'amount', 'category_id']
-    for field in required_fields:
-        if field not in data:
-            return jsonify({'error': f'Missing required field: {field}'}), 400
-    
-    # Convert types
+    # Validate and convert the submitted fields
     try:
-        amount = float(data['amount'])
-        category_id = int(data['category_id'])
-    except ValueError:
-        return jsonify({'error': 'Invalid amount or category_id format'}), 400
-    
-    # Parse date if provided, otherwise use current date
-    date = datetime.utcnow()
-    if 'date' in data and data['date']:
-        try:
-            date = datetime.strptime(data['date'], '%Y-%m-%d')
-        except ValueError:
-            return jsonify({'error': 'Invalid date format, use YYYY-MM-DD'}), 400
+        fields = parse_expense_data(data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     # Create expense with the current user id
-    expense = Expense(
-        title=data['title'],
-        amount=amount,
-        currency=data.get('currency', 'MYR'),
-        date=date,
-        description=data.get('description', ''),
-        category_id=category_id,
-        user_id=current_user.id
-    )
+    expense = Expense(user_id=current_user.id, **fields)
     
     db.session.add(expense)
-    db.session.commit()
+    db.session.flush()
+    refresh_daily_spend(expense_bucket(expense))
     
-    # Handle receipt uploads if any
-    files = request.files.getlist('receipts')
-    for file in files:
-        if file and file.filename:
-            original_filename = secure_filename(file.filename)
-            extension = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
-            filename = f"{uuid.uuid4()}.{extension}" if extension else f"{uuid.uuid4()}"
-            
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            
-            receipt = Receipt(
-                filename=filename,
-                original_filename=original_filename,
-                expense_id=expense.id
-            )
-            db.session.add(receipt)
+    # Spool receipt uploads; they are stored by the pipeline after commit
+    receipts = [spool_receipt(file, expense.id) for file in request.files.getlist('receipts')]
     
     db.session.commit()
+    receipt_pipeline.submit(*receipts)
+    report_cache.invalidate_user(current_user.id)
     
     return jsonify(expense.to_dict()), 201
 
+@app.route('/api/expenses/import', methods=['POST'])
+@login_required
+def import_expenses_endpoint():
+    """
+    Bulk import expenses from CSV or NDJSON.
+    
+    The data is either the raw request body or an uploaded 'file'. The format
+    comes from the 'format' argument, defaulting to the content type. Valid
+    rows are inserted and invalid ones are reported by row number.
+    """
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+    content_type = (upload.mimetype if upload else request.mimetype) or ''
+    
+    import_format = request.args.get('format')
+    if not import_format:
+        import_format = 'ndjson' if 'ndjson' in content_type or 'json' in content_type else 'csv'
+    if import_format not in IMPORT_FORMATS:
+        return jsonify({'error': 'Invalid format, use csv or ndjson'}), 400
+    
+    chunk_size = request.args.get('chunk_size', type=int)
+    result = import_expenses(stream, current_user.id, import_format, chunk_size=chunk_size)
+    return jsonify(result), 201 if result['imported'] else 200
+
 @app.route('/api/expenses/<int:expense_id>', methods=['PUT'])
 def update_expense(expense_id):
     """Update an existing expense"""
     expense = Expense.query.get_or_404(expense_id)
+    old_bucket = expense_bucket(expense)
     data = request.form.to_dict()
     
     # Update fields if provided
@@ -231,32 +524,21 @@ def update_expense(expense_id):
         try:
             category_id = int(data['category_id'])
             # Verify category exists
-            category = Category.query.get(category_id)
+            category = category_registry.get(category_id)
             if not category:
                 return jsonify({'error': 'Category not found'}), 404
             expense.category_id = category_id
         except ValueError:
             return jsonify({'error': 'Invalid category_id format'}), 400
     
-    # Handle receipt uploads if any
-    files = request.files.getlist('receipts')
-    for file in files:
-        if file and file.filename:
-            original_filename = secure_filename(file.filename)
-            extension = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
-            filename = f"{uuid.uuid4()}.{extension}" if extension else f"{uuid.uuid4()}"
-            
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(file_path)
-            
-            receipt = Receipt(
-                filename=filename,
-                original_filename=original_filename,
-                expense_id=expense.id
-            )
-            db.session.add(receipt)
+    # Spool receipt uploads; they are stored by the pipeline after commit
+    receipts = [spool_receipt(file, expense.id) for file in request.files.getlist('receipts')]
     
+    # Keep the rollup in step when amount, date or category changed
+    refresh_daily_spend(old_bucket, expense_bucket(expense))
     db.session.commit()
+    receipt_pipeline.submit(*receipts)
+    report_cache.invalidate_user(expense.user_id)
     
     return jsonify(expense.to_dict())
 
@@ -265,23 +547,27 @@ def delete_expense(expense_id):
     """Delete an expense"""
     expense = Expense.query.get_or_404(expense_id)
     
-    # Delete associated receipt files
-    for receipt in expense.receipts:
-        try:
-            os.remove(os.path.join(app.config['UPLOAD_FOLDER'], receipt.filename))
-        except Exception as e:
-            app.logger.error(f"Error deleting file {receipt.filename}: {str(e)}")
-    
+    filenames = [receipt.filename for receipt in expense.receipts]
+    bucket = expense_bucket(expense)
+    user_id = expense.user_id
     db.session.delete(expense)
+    db.session.flush()
+    refresh_daily_spend(bucket)
     db.session.commit()
+    report_cache.invalidate_user(user_id)
+    
+    # Release receipt files once the rows referencing them are gone
+    for filename in filenames:
+        delete_receipt_file(filename)
     
     return jsonify({'message': 'Expense deleted successfully'})
 
 # API Endpoints for Categories
 @app.route('/api/categories', methods=['GET'])
+@report_cache.conditional
 def get_categories():
     """Get all categories"""
-    categories = Category.query.all()
+    categories = category_registry.all()
     return jsonify([category.to_dict() for category in categories])
 
 @app.route('/api/categories', methods=['POST'])
@@ -306,7 +592,9 @@ def create_category():
     )
     
     db.session.add(category)
+    category_registry.bump()
     db.session.commit()
+    report_cache.invalidate_all()
     
     return jsonify(category.to_dict()), 201
 
@@ -329,7 +617,9 @@ def update_category(category_id):
     if 'icon' in data:
         category.icon = data['icon']
     
+    category_registry.bump()
     db.session.commit()
+    report_cache.invalidate_all()
     
     return jsonify(category.to_dict())
 
@@ -339,34 +629,64 @@ def delete_category(category_id):
     category = Category.query.get_or_404(category_id)
     
     # Check if category has expenses
-    if category.expenses:
+    if Expense.query.filter_by(category_id=category_id).first():
         return jsonify({'error': 'Cannot delete category with associated expenses'}), 400
     
     db.session.delete(category)
+    category_registry.bump()
     db.session.commit()
+    report_cache.invalidate_all()
     
     return jsonify({'message': 'Category deleted successfully'})
 
 # API Endpoints for Receipts
+@app.route('/api/receipts/<int:receipt_id>/thumbnail', methods=['GET'])
+@login_required
+def get_receipt_thumbnail(receipt_id):
+    """
+    Serve a downscaled JPEG preview of an image receipt.
+    
+    The 'size' argument picks one of RECEIPT_THUMBNAIL_SIZES (the smallest
+    by default). Previews are generated on first request and cached on disk;
+    a stored receipt never changes, so responses are cacheable forever.
+    """
+    receipt = Receipt.query.get_or_404(receipt_id)
+    if receipt.expense.user_id != current_user.id or receipt.status != 'ready':
+        abort(404)
+    
+    sizes = app.config['RECEIPT_THUMBNAIL_SIZES']
+    size = request.args.get('size', sizes[0], type=int)
+    if size not in sizes:
+        return jsonify({'error': f"Invalid size, use one of {', '.join(str(size) for size in sizes)}"}), 400
+    
+    path = thumbnail_cache.get(receipt.filename, size)
+    if path is None:
+        abort(404)
+    
+    response = send_file(path, mimetype='image/jpeg', etag=thumbnail_cache.key(receipt.filename, size))
+    response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
+
 @app.route('/api/receipts/<int:receipt_id>', methods=['DELETE'])
 def delete_receipt(receipt_id):
     """Delete a receipt"""
     receipt = Receipt.query.get_or_404(receipt_id)
     
-    # Delete the file
-    try:
-        os.remove(os.path.join(app.config['UPLOAD_FOLDER'], receipt.filename))
-    except Exception as e:
-        app.logger.error(f"Error deleting file {receipt.filename}: {str(e)}")
-    
+    filename = receipt.filename
+    user_id = receipt.expense.user_id
     db.session.delete(receipt)
     db.session.commit()
+    report_cache.invalidate_user(user_id)
+    
+    # Release the file once no receipt references it
+    delete_receipt_file(filename)
     
     return jsonify({'message': 'Receipt deleted successfully'})
 
 # API Endpoints for Budgets
 @app.route('/api/budgets', methods=['GET'])
 @login_required
+@report_cache.conditional
 def get_budgets():
     """Get all budgets for the current user"""
     budgets = Budget.query.filter_by(user_id=current_user.id).all()
@@ -374,6 +694,7 @@ def get_budgets():
 
 @app.route('/api/budgets/<int:budget_id>', methods=['GET'])
 @login_required
+@report_cache.conditional
 def get_budget(budget_id):
     """Get a specific budget by ID"""
     budget = Budget.query.get_or_404(budget_id)
@@ -384,94 +705,38 @@ def get_budget(budget_id):
 
 @app.route('/api/budgets/<int:budget_id>/kpi', methods=['GET'])
 @login_required
+@report_cache.conditional
+@report_cache.cached
 def get_budget_kpi(budget_id):
     """Get KPI data for a specific budget"""
-    budget = Budget.query.get_or_404(budget_id)
+    row = budget_spend_query(Budget.id == budget_id).first()
+    if row is None:
+        abort(404)
+    
+    budget, total_spent = row
     
     # Check if budget belongs to current user
     if budget.user_id != current_user.id:
         return jsonify({'error': 'Not authorized'}), 403
     
-    # Calculate total expenses for this budget's timeframe
-    query = Expense.query.filter(
-        Expense.user_id == current_user.id,
-        Expense.date >= budget.start_date,
-        Expense.date <= budget.end_date
-    )
-    
-    # If budget is for a specific category, filter by that category
-    if budget.category_id:
-        query = query.filter(Expense.category_id == budget.category_id)
-    
-    # Sum expenses
-    total_spent = sum(expense.amount for expense in query.all())
-    
-    # Calculate metrics
-    remaining = budget.amount - total_spent
-    percentage_used = (total_spent / budget.amount * 100) if budget.amount > 0 else 0
-    is_exceeded = total_spent > budget.amount
-    
-    return jsonify({
-        'budget_id': budget.id,
-        'budget_name': budget.name,
-        'budget_amount': budget.amount,
-        'total_spent': total_spent,
-        'remaining': remaining, 
-        'percentage_used': percentage_used,
-        'is_exceeded': is_exceeded,
-        'status': 'Exceeded' if is_exceeded else 'On Track',
-        'category_name': budget.category.name if budget.category else "All Categories",
-        'category_color': budget.category.color if budget.category else "#2e7d32",
-        'start_date': budget.start_date.strftime('%Y-%m-%d'),
-        'end_date': budget.end_date.strftime('%Y-%m-%d')
-    })
+    return jsonify(budget_kpi(budget, total_spent))
+
+def build_budget_kpis():
+    """KPI data for all active budgets of the current user"""
+    rows = budget_spend_query(
+        Budget.user_id == current_user.id,
+        Budget.is_active == True
+    ).order_by(Budget.id).all()
+    
+    return [budget_kpi(budget, total_spent) for budget, total_spent in rows]
 
 @app.route('/api/budgets/kpi', methods=['GET'])
 @login_required
+@report_cache.conditional
+@report_cache.cached
 def get_all_budgets_kpi():
     """Get KPI data for all active budgets"""
-    budgets = Budget.query.filter_by(user_id=current_user.id, is_active=True).all()
-    
-    if not budgets:
-        return jsonify([])
-    
-    result = []
-    for budget in budgets:
-        # Calculate total expenses for this budget's timeframe
-        query = Expense.query.filter(
-            Expense.user_id == current_user.id,
-            Expense.date >= budget.start_date,
-            Expense.date <= budget.end_date
-        )
-        
-        # If budget is for a specific category, filter by that category
-        if budget.category_id:
-            query = query.filter(Expense.category_id == budget.category_id)
-        
-        # Sum expenses
-        total_spent = sum(expense.amount for expense in query.all())
-        
-        # Calculate metrics
-        remaining = budget.amount - total_spent
-        percentage_used = (total_spent / budget.amount * 100) if budget.amount > 0 else 0
-        is_exceeded = total_spent > budget.amount
-        
-        result.append({
-            'budget_id': budget.id,
-            'budget_name': budget.name,
-            'budget_amount': budget.amount,
-            'total_spent': total_spent,
-            'remaining': remaining,
-            'percentage_used': percentage_used,
-            'is_exceeded': is_exceeded,
-            'status': 'Exceeded' if is_exceeded else 'On Track',
-            'category_name': budget.category.name if budget.category else "All Categories",
-            'category_color': budget.category.color if budget.category else "#2e7d32",
-            'start_date': budget.start_date.strftime('%Y-%m-%d'),
-            'end_date': budget.end_date.strftime('%Y-%m-%d')
-        })
-    
-    return jsonify(result)
+    return jsonify(build_budget_kpis())
 
 @app.route('/api/budgets', methods=['POST'])
 @login_required
@@ -505,6 +770,7 @@ def create_budget():
     
     db.session.add(budget)
     db.session.commit()
+    report_cache.invalidate_user(current_user.id)
     
     return jsonify(budget.to_dict()), 201
 
@@ -549,6 +815,7 @@ def update_budget(budget_id):
         budget.is_active = data['is_active']
     
     db.session.commit()
+    report_cache.invalidate_user(current_user.id)
     
     return jsonify(budget.to_dict())
 
@@ -564,125 +831,366 @@ def delete_budget(budget_id):
     
     db.session.delete(budget)
     db.session.commit()
+    report_cache.invalidate_user(current_user.id)
     
     return jsonify({'message': 'Budget deleted successfully'})
 
 # Reports and Analytics
-@app.route('/api/reports/monthly', methods=['GET'])
-def monthly_report():
-    """Get monthly expense totals"""
-    year = request.args.get('year', datetime.now().year, type=int)
-    
-    monthly_totals = db.session.query(
-        extract('month', Expense.date).label('month'),
-        func.sum(Expense.amount).label('total')
-    ).filter(
-        extract('year', Expense.date) == year
-    ).group_by(
-        extract('month', Expense.date)
-    ).all()
+MONTH_NAMES = [
+    'January', 'February', 'March', 'April', 'May', 'June', 
+    'July', 'August', 'September', 'October', 'November', 'December'
+]
+
+def parse_report_dates(args):
+    """Parse the optional start_date/end_date report filters"""
+    start_date = args.get('start_date')
+    end_date = args.get('end_date')
+    if start_date:
+        start_date = datetime.strptime(start_date, '%Y-%m-%d')
+    if end_date:
+        end_date = datetime.strptime(end_date, '%Y-%m-%d')
+    return start_date, end_date
+
+def parse_report_year(args):
+    """
+    Parse the optional year filter, the current year by default
+    
+    Raises:
+        ValueError: If the year is outside 1-9998, whose monthly ranges
+        end within the dates the database and datetime can hold
+    """
+    year = args.get('year', datetime.now().year, type=int)
+    if not 1 <= year <= 9998:
+        raise ValueError('Invalid year, use 1 to 9998')
+    return year
+
+def build_monthly_report(year):
+    """Monthly expense totals of the current user for one year"""
+    columns = analytics_cache.columns(current_user.id)
+    if columns is not None:
+        monthly_totals = columns.monthly_totals(year)
+    else:
+        monthly_totals = db.session.query(
+            extract('month', DailySpend.day).label('month'),
+            func.sum(DailySpend.total).label('total')
+        ).filter(
+            DailySpend.user_id == current_user.id,
+            DailySpend.day >= date(year, 1, 1),
+            DailySpend.day < date(year + 1, 1, 1)
+        ).group_by(
+            extract('month', DailySpend.day)
+        ).all()
     
     # Format the result
     result = []
-    month_names = [
-        'January', 'February', 'March', 'April', 'May', 'June', 
-        'July', 'August', 'September', 'October', 'November', 'December'
-    ]
-    
     for month_num, total in monthly_totals:
         result.append({
             'month': month_num,
-            'month_name': month_names[int(month_num) - 1],
+            'month_name': MONTH_NAMES[int(month_num) - 1],
             'total': float(total)
         })
     
-    return jsonify(result)
+    return result
 
-@app.route('/api/reports/category', methods=['GET'])
-def category_report():
-    """Get expense totals by category"""
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    
-    query = db.session.query(
-        Category.id,
-        Category.name,
-        Category.color,
-        Category.icon,
-        func.sum(Expense.amount).label('total')
-    ).join(
-        Expense, Category.id == Expense.category_id
-    )
-    
-    # Apply date filters if provided
-    if start_date:
-        start_date = datetime.strptime(start_date, '%Y-%m-%d')
-        query = query.filter(Expense.date >= start_date)
-    
-    if end_date:
-        end_date = datetime.strptime(end_date, '%Y-%m-%d')
-        query = query.filter(Expense.date <= end_date)
-    
-    category_totals = query.group_by(
-        Category.id, Category.name, Category.color, Category.icon
-    ).all()
+def build_category_report(start_date=None, end_date=None):
+    """Expense totals of the current user by category"""
+    columns = analytics_cache.columns(current_user.id)
+    if columns is not None:
+        category_totals = columns.category_totals(start_date, end_date)
+    else:
+        query = db.session.query(
+            DailySpend.category_id,
+            func.sum(DailySpend.total).label('total')
+        ).filter(
+            DailySpend.user_id == current_user.id
+        )
+        
+        # Apply date filters if provided
+        if start_date:
+            query = query.filter(DailySpend.day >= start_date.date())
+        
+        if end_date:
+            query = query.filter(DailySpend.day <= end_date.date())
+        
+        category_totals = query.group_by(DailySpend.category_id).all()
     
-    # Format the result
+    # Format the result, resolving categories from the registry
     result = []
-    for cat_id, name, color, icon, total in category_totals:
+    for cat_id, total in category_totals:
+        category = category_registry.get(cat_id)
+        if not category:
+            continue
         result.append({
             'id': cat_id,
-            'name': name,
-            'color': color,
-            'icon': icon,
+            'name': category.name,
+            'color': category.color,
+            'icon': category.icon,
             'total': float(total)
         })
     
-    return jsonify(result)
+    return result
 
-@app.route('/api/reports/summary', methods=['GET'])
-def expense_summary():
-    """Get expense summary (total, avg, etc.)"""
-    start_date = request.args.get('start_date')
-    end_date = request.args.get('end_date')
-    
-    # Build query for expense statistics
-    query = db.session.query(
-        func.sum(Expense.amount).label('total'),
-        func.avg(Expense.amount).label('average'),
-        func.count(Expense.id).label('count'),
-        func.max(Expense.amount).label('max'),
-        func.min(Expense.amount).label('min')
-    )
-    
-    # Apply date filters if provided
-    if start_date:
-        start_date = datetime.strptime(start_date, '%Y-%m-%d')
-        query = query.filter(Expense.date >= start_date)
-    
-    if end_date:
-        end_date = datetime.strptime(end_date, '%Y-%m-%d')
-        query = query.filter(Expense.date <= end_date)
-    
-    stats = query.first()
+def build_expense_summary(start_date=None, end_date=None):
+    """Expense summary (total, avg, etc.) of the current user"""
+    columns = analytics_cache.columns(current_user.id)
+    if columns is not None:
+        stats = columns.summary(start_date, end_date)
+    else:
+        # Build query for expense statistics from the daily rollup
+        query = db.session.query(
+            func.sum(DailySpend.total).label('total'),
+            func.sum(DailySpend.count).label('count'),
+            func.max(DailySpend.max_amount).label('max'),
+            func.min(DailySpend.min_amount).label('min')
+        ).filter(
+            DailySpend.user_id == current_user.id
+        )
+        
+        # Apply date filters if provided
+        if start_date:
+            query = query.filter(DailySpend.day >= start_date.date())
+        
+        if end_date:
+            query = query.filter(DailySpend.day <= end_date.date())
+        
+        stats = query.first()
+    count = int(stats.count) if stats.count else 0
     
     # Get recent expenses
-    recent_query = Expense.query.order_by(Expense.date.desc()).limit(5)
+    recent_query = Expense.query.filter(Expense.user_id == current_user.id).order_by(Expense.date.desc())
     if start_date:
         recent_query = recent_query.filter(Expense.date >= start_date)
     if end_date:
-        recent_query = recent_query.filter(Expense.date <= end_date)
+        recent_query = recent_query.filter(Expense.date < end_date + timedelta(days=1))
     
-    recent_expenses = recent_query.all()
+    recent_expenses = load_expense_list(recent_query, 5)
     
     # Format the result
-    result = {
+    return {
         'total': float(stats.total) if stats.total else 0,
-        'average': float(stats.average) if stats.average else 0,
-        'count': stats.count,
+        'average': float(stats.total) / count if count else 0,
+        'count': count,
         'max': float(stats.max) if stats.max else 0,
         'min': float(stats.min) if stats.min else 0,
-        'recent_expenses': [expense.to_dict() for expense in recent_expenses]
+        'recent_expenses': serialize_expense_list(recent_expenses)
+    }
+
+def build_timeseries_report(start_date, end_date, interval, window, category_id=None, by_category=False, fill=False):
+    """
+    Expense totals of the current user over time, in buckets of an interval.
+    
+    Every series is computed in one pass over the daily rollup rows of the
+    range, or from the analytics cache. Rolling averages and deltas treat
+    empty buckets as 0; with fill, empty buckets are also returned.
+    
+    Args:
+        start_date: The first day
+        end_date: The last day
+        interval: A timeseries.INTERVALS value
+        window: The number of buckets in each rolling average
+        category_id: Only report this category's expenses
+        by_category: Add a series per category, unless category_id is given
+        fill: Include buckets without expenses
+    
+    Returns:
+        dict: The interval, range and window, the overall 'series' and,
+        with by_category, the 'categories' with their own series
+    """
+    boundaries = bucket_boundaries(start_date, end_date, interval)
+    by_category = by_category and category_id is None
+    
+    columns = analytics_cache.columns(current_user.id)
+    if columns is not None:
+        totals = columns.bucket_totals(boundaries, category_id)
+        category_totals = {}
+        if by_category:
+            for cat_id, _ in columns.category_totals(start_date, end_date):
+                category_totals[cat_id] = columns.bucket_totals(boundaries, cat_id)
+    else:
+        query = db.session.query(
+            DailySpend.day,
+            DailySpend.category_id,
+            DailySpend.total,
+            DailySpend.count
+        ).filter(
+            DailySpend.user_id == current_user.id,
+            DailySpend.day >= start_date,
+            DailySpend.day <= end_date
+        )
+        if category_id is not None:
+            query = query.filter(DailySpend.category_id == category_id)
+        
+        # Add each day's rollup rows to their bucket
+        totals = [[0.0, 0] for _ in boundaries[1:]]
+        category_totals = {}
+        for day, cat_id, total, count in query:
+            index = bisect_right(boundaries, day) - 1
+            totals[index][0] += total
+            totals[index][1] += count
+            if by_category:
+                if cat_id not in category_totals:
+                    category_totals[cat_id] = [[0.0, 0] for _ in boundaries[1:]]
+                category_totals[cat_id][index][0] += total
+                category_totals[cat_id][index][1] += count
+    
+    def series(bucket_totals):
+        points = build_series(bucket_totals, boundaries, interval, window)
+        return points if fill else [point for point in points if point['count']]
+    
+    result = {
+        'interval': interval,
+        'start_date': start_date.isoformat(),
+        'end_date': end_date.isoformat(),
+        'window': window,
+        'series': series(totals)
+    }
+    
+    # Resolve categories from the registry, skipping unknown ones
+    if by_category:
+        result['categories'] = []
+        for cat_id in sorted(category_totals):
+            category = category_registry.get(cat_id)
+            if not category:
+                continue
+            result['categories'].append({
+                'id': cat_id,
+                'name': category.name,
+                'color': category.color,
+                'icon': category.icon,
+                'series': series(category_totals[cat_id])
+            })
+    
+    return result
+
+@app.route('/api/reports/monthly', methods=['GET'])
+@login_required
+@report_cache.conditional
+@report_cache.cached
+def monthly_report():
+    """Get monthly expense totals"""
+    try:
+        year = parse_report_year(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify(build_monthly_report(year))
+
+@app.route('/api/reports/category', methods=['GET'])
+@login_required
+@report_cache.conditional
+@report_cache.cached
+def category_report():
+    """Get expense totals by category"""
+    try:
+        start_date, end_date = parse_report_dates(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format, use YYYY-MM-DD'}), 400
+    return jsonify(build_category_report(start_date, end_date))
+
+@app.route('/api/reports/summary', methods=['GET'])
+@login_required
+@report_cache.conditional
+@report_cache.cached
+def expense_summary():
+    """Get expense summary (total, avg, etc.)"""
+    try:
+        start_date, end_date = parse_report_dates(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format, use YYYY-MM-DD'}), 400
+    return jsonify(build_expense_summary(start_date, end_date))
+
+@app.route('/api/reports/timeseries', methods=['GET'])
+@login_required
+@report_cache.conditional
+@report_cache.cached
+def timeseries_report():
+    """
+    Get expense totals over time, with rolling averages and deltas.
+    
+    Takes start_date/end_date (the current year by default), interval ('day',
+    'week', 'month' or 'quarter', month by default), window (buckets per
+    rolling average, 3 by default), category_id to report one category,
+    by_category=1 to add a series per category and fill=1 to include buckets
+    without expenses.
+    """
+    interval = request.args.get('interval', 'month')
+    if interval not in INTERVALS:
+        return jsonify({'error': f"Invalid interval, use one of {', '.join(INTERVALS)}"}), 400
+    
+    try:
+        start_date, end_date = parse_report_dates(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format, use YYYY-MM-DD'}), 400
+    today = date.today()
+    start_date = start_date.date() if start_date else date(today.year, 1, 1)
+    end_date = end_date.date() if end_date else date(today.year, 12, 31)
+    if start_date > end_date:
+        return jsonify({'error': 'start_date must not be after end_date'}), 400
+    if not fits_date_range(end_date, interval):
+        return jsonify({'error': f"Invalid end_date, its {interval} must end before {date.max.isoformat()}"}), 400
+    
+    max_buckets = app.config['TIMESERIES_MAX_BUCKETS']
+    if bucket_count(start_date, end_date, interval) > max_buckets:
+        return jsonify({'error': f"More than {max_buckets} buckets, use a shorter range or a longer interval"}), 400
+    
+    try:
+        window = int(request.args.get('window', 3))
+    except ValueError:
+        window = None
+    if window is None or not 1 <= window <= app.config['TIMESERIES_MAX_WINDOW']:
+        return jsonify({'error': f"Invalid window, use 1 to {app.config['TIMESERIES_MAX_WINDOW']} buckets"}), 400
+    
+    return jsonify(build_timeseries_report(
+        start_date,
+        end_date,
+        interval,
+        window,
+        category_id=request.args.get('category_id', type=int),
+        by_category=request.args.get('by_category') == '1',
+        fill=request.args.get('fill') == '1'
+    ))
+
+@app.route('/api/dashboard', methods=['GET'])
+@login_required
+@report_cache.conditional
+@report_cache.cached
+def dashboard():
+    """
+    Get everything the SPA needs to render its first view in one request.
+    
+    All sections are computed on the request's single DB session. The report
+    sections take the same start_date/end_date/year arguments as their own
+    endpoints; pass expenses_limit to also include the first page of expenses.
+    """
+    try:
+        year = parse_report_year(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        start_date, end_date = parse_report_dates(request.args)
+    except ValueError:
+        return jsonify({'error': 'Invalid date format, use YYYY-MM-DD'}), 400
+    expenses_limit = request.args.get('expenses_limit', 0, type=int)
+    
+    result = {
+        'categories': [category.to_dict() for category in category_registry.all()],
+        'budgets': [budget.to_dict() for budget in Budget.query.filter_by(user_id=current_user.id).all()],
+        'summary': build_expense_summary(start_date, end_date),
+        'category_report': build_category_report(start_date, end_date),
+        'monthly_report': build_monthly_report(year)
     }
     
+    # Optionally include the first page of expenses in the default sort order
+    if expenses_limit > 0:
+        limit = expense_page_limit(expenses_limit)
+        expenses = load_expense_list(Expense.query.filter(
+            Expense.user_id == current_user.id
+        ).order_by(
+            Expense.date.desc(), Expense.id.desc()
+        ), limit + 1)
+        expenses, next_cursor = expense_page(expenses, limit, Expense.date)
+        result['expenses'] = {
+            'expenses': serialize_expense_list(expenses),
+            'next_cursor': next_cursor
+        }
+    
     return jsonify(result)
@@ -0,0 +1,185 @@
+import os
+import re
+import gzip
+import hashlib
+import mimetypes
+from functools import lru_cache
+from flask import request, send_file, abort
+from werkzeug.security import safe_join
+from app import app
+
+try:
+    import brotli
+except ImportError:  # Without brotli, only gzip is negotiated
+    brotli = None
+
+STATIC_FOLDER = os.path.join(app.root_path, 'static')
+
+# Responses for versioned URLs are cached for a year and never revalidated
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Pre-compressed static variants are stored next to the file with these suffixes
+COMPRESSED_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# Stored receipt names are <sha256>.<extension>, see receipts.ContentAddressedStore
+CONTENT_ADDRESSED_NAME = re.compile(r'^([0-9a-f]{64})(\.[^/]*)?$')
+
+@lru_cache(maxsize=4096)
+def _digest(path, mtime_ns, size):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def file_digest(path):
+    """
+    Return the SHA-256 of a file, hashing it again only after it changed
+
+    Args:
+        path: The path of the file
+
+    Returns:
+        str: The hex digest
+    """
+    stat = os.stat(path)
+    return _digest(path, stat.st_mtime_ns, stat.st_size)
+
+def static_url(filename):
+    """
+    Return the URL of a static file versioned with its content hash, so it
+    can be cached as immutable and still change on the next deploy
+
+    Args:
+        filename: The path relative to the static folder
+
+    Returns:
+        str: The versioned URL
+    """
+    path = safe_join(STATIC_FOLDER, filename)
+    try:
+        return f"/static/{filename}?v={file_digest(path)[:12]}"
+    except (TypeError, OSError):
+        return f"/static/{filename}"
+
+app.jinja_env.globals['static_url'] = static_url
+
+def serve_file(directory, filename, location, etag=None, immutable=False, private=False, mimetype=None):
+    """
+    Serve a file with a strong content ETag, conditional and Range request
+    handling, and optionally hand the transfer to a front proxy.
+
+    FILE_ACCEL selects the transfer: None streams the file from Python,
+    'x-sendfile' sets X-Sendfile with the file's path (Apache, lighttpd),
+    and 'x-accel-redirect' redirects nginx to the internal location
+    FILE_ACCEL_LOCATIONS[location]. With nginx, the proxy answers
+    conditional and Range requests itself.
+
+    Args:
+        directory: The folder to serve from
+        filename: The requested path relative to directory
+        location: The FILE_ACCEL_LOCATIONS key for directory
+        etag: The content hash, if already known
+        immutable: Whether the response may be cached without revalidation
+        private: Whether shared caches must not store the response
+        mimetype: The content type, if not guessed from filename
+
+    Returns:
+        Response: The file response
+    """
+    # Dot files and folders, such as the receipt spool, are never served
+    if any(part.startswith('.') for part in filename.split('/')):
+        abort(404)
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    if app.config['FILE_ACCEL'] == 'x-accel-redirect':
+        response = app.response_class(mimetype=mimetype or mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = app.config['FILE_ACCEL_LOCATIONS'][location] + filename
+    else:
+        # Honours USE_X_SENDFILE, set when FILE_ACCEL is 'x-sendfile'
+        response = send_file(path, mimetype=mimetype, conditional=True, etag=etag or file_digest(path))
+
+    scope = 'private' if private else 'public'
+    if immutable:
+        response.headers['Cache-Control'] = f"{scope}, max-age={IMMUTABLE_MAX_AGE}, immutable"
+    else:
+        response.headers['Cache-Control'] = f"{scope}, no-cache"
+    return response
+
+def send_static(filename):
+    """
+    Serve a static file, immutable when requested through static_url. A
+    pre-compressed variant is served when one exists and Accept-Encoding
+    allows it; behind nginx, gzip_static and brotli_static do this instead.
+    """
+    path = safe_join(STATIC_FOLDER, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    etag = file_digest(path)
+    immutable = request.args.get('v') == etag[:12]
+
+    variants = []
+    if app.config['FILE_ACCEL'] != 'x-accel-redirect':
+        variants = [encoding for encoding, suffix in COMPRESSED_SUFFIXES.items() if os.path.isfile(path + suffix)]
+    encoding = request.accept_encodings.best_match(variants) if variants else None
+
+    if encoding:
+        # Each representation needs its own strong ETag
+        response = serve_file(
+            STATIC_FOLDER, filename + COMPRESSED_SUFFIXES[encoding], 'static',
+            etag=f"{etag}-{encoding}", immutable=immutable,
+            mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        )
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = serve_file(STATIC_FOLDER, filename, 'static', etag=etag, immutable=immutable)
+    if variants:
+        response.vary.add('Accept-Encoding')
+    return response
+
+def send_upload(filename):
+    """Serve a stored receipt; stored files never change, so always immutable"""
+    match = CONTENT_ADDRESSED_NAME.match(filename.rsplit('/', 1)[-1])
+    etag = match.group(1) if match else None
+    return serve_file(app.config['UPLOAD_FOLDER'], filename, 'uploads', etag=etag, immutable=True, private=True)
+
+@app.after_request
+def compress_json(response):
+    """
+    Compress JSON responses of at least JSON_COMPRESSION_MIN_SIZE bytes
+    with brotli or gzip, whichever the client prefers
+    """
+    if (response.mimetype != 'application/json' or response.status_code != 200
+            or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    data, encoding = compress_json_body(response.get_data(), request.accept_encodings)
+    if encoding:
+        response.set_data(data)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
+def compress_json_body(data, accept_encodings):
+    """
+    Compress a JSON body of at least JSON_COMPRESSION_MIN_SIZE bytes with
+    the encoding the client prefers
+
+    Args:
+        data: The response body
+        accept_encodings: The parsed Accept-Encoding header
+
+    Returns:
+        tuple: The body and its encoding, or None if left uncompressed
+    """
+    if len(data) < app.config['JSON_COMPRESSION_MIN_SIZE']:
+        return data, None
+    encoding = accept_encodings.best_match(['br', 'gzip'] if brotli is not None else ['gzip'])
+    if encoding == 'br':
+        return brotli.compress(data, quality=app.config['JSON_COMPRESSION_LEVEL']), encoding
+    if encoding == 'gzip':
+        return gzip.compress(data, compresslevel=app.config['JSON_COMPRESSION_LEVEL']), encoding
+    return data, None
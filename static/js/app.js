@@ -80,10 +80,8 @@ class ExpenseTrackerApp {
       onCancel: () => this.navigateTo('budgetList')
     });
 
-    // Load initial data
-    await this.loadCategories();
-    
-    // Navigate to the dashboard view by default
+    // Navigate to the dashboard view by default, which loads the initial
+    // data (categories, budgets and reports) in one request
     await this.navigateTo('dashboard');
   }
 
@@ -137,7 +135,7 @@ class ExpenseTrackerApp {
   
   async loadBudgets() {
     try {
-      const response = await fetch('/api/budgets');
+      const response = await ApiService.conditionalFetch('/api/budgets');
       if (!response.ok) {
         throw new Error('Failed to load budgets');
       }
@@ -237,7 +235,7 @@ class ExpenseTrackerApp {
 
   async loadCategories() {
     try {
-      const response = await fetch('/api/categories');
+      const response = await ApiService.conditionalFetch('/api/categories');
       if (!response.ok) {
         throw new Error('Failed to load categories');
       }
@@ -262,7 +260,7 @@ class ExpenseTrackerApp {
       if (sortOrder) queryParams.append('sort_order', sortOrder);
       
       const url = `/api/expenses?${queryParams.toString()}`;
-      const response = await fetch(url);
+      const response = await ApiService.conditionalFetch(url);
       
       if (!response.ok) {
         throw new Error('Failed to load expenses');
@@ -282,30 +280,14 @@ class ExpenseTrackerApp {
 
   async loadDashboardData() {
     try {
-      // Load summary report
-      const summaryResponse = await fetch('/api/reports/summary');
-      if (!summaryResponse.ok) {
-        throw new Error('Failed to load summary data');
-      }
-      
-      this.state.reports.summary = await summaryResponse.json();
-      
-      // Load category report
-      const categoryResponse = await fetch('/api/reports/category');
-      if (!categoryResponse.ok) {
-        throw new Error('Failed to load category data');
-      }
-      
-      this.state.reports.category = await categoryResponse.json();
-      
-      // Load monthly report
+      // Load categories, budgets and every dashboard report in one request
       const currentYear = new Date().getFullYear();
-      const monthlyResponse = await fetch(`/api/reports/monthly?year=${currentYear}`);
-      if (!monthlyResponse.ok) {
-        throw new Error('Failed to load monthly data');
-      }
-      
-      this.state.reports.monthly = await monthlyResponse.json();
+      const data = await ApiService.getDashboard({ year: currentYear });
+      this.state.categories = data.categories;
+      this.state.budgets = data.budgets;
+      this.state.reports.summary = data.summary;
+      this.state.reports.category = data.category_report;
+      this.state.reports.monthly = data.monthly_report;
       
       // Update the dashboard component if currently viewing
       if (this.currentView === 'dashboard') {
@@ -328,7 +310,7 @@ class ExpenseTrackerApp {
       
       // Load monthly report
       const monthlyUrl = `/api/reports/monthly?${queryParams.toString()}`;
-      const monthlyResponse = await fetch(monthlyUrl);
+      const monthlyResponse = await ApiService.conditionalFetch(monthlyUrl);
       if (!monthlyResponse.ok) {
         throw new Error('Failed to load monthly report data');
       }
@@ -337,7 +319,7 @@ class ExpenseTrackerApp {
       
       // Load category report
       const categoryUrl = `/api/reports/category?${queryParams.toString()}`;
-      const categoryResponse = await fetch(categoryUrl);
+      const categoryResponse = await ApiService.conditionalFetch(categoryUrl);
       if (!categoryResponse.ok) {
         throw new Error('Failed to load category report data');
       }
@@ -346,7 +328,7 @@ class ExpenseTrackerApp {
       
       // Load summary data
       const summaryUrl = `/api/reports/summary?${queryParams.toString()}`;
-      const summaryResponse = await fetch(summaryUrl);
+      const summaryResponse = await ApiService.conditionalFetch(summaryUrl);
       if (!summaryResponse.ok) {
         throw new Error('Failed to load summary report data');
       }
@@ -473,7 +455,7 @@ class ExpenseTrackerApp {
 
   async editExpense(expenseId) {
     try {
-      const response = await fetch(`/api/expenses/${expenseId}`);
+      const response = await ApiService.conditionalFetch(`/api/expenses/${expenseId}`);
       
       if (!response.ok) {
         throw new Error('Failed to load expense details');
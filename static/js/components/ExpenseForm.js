@@ -133,6 +133,11 @@ class ExpenseForm {
         this.receiptFiles = Array.from(e.target.files);
       });
       
+      // Drop previews the server cannot render
+      container.querySelectorAll('.receipt-preview img').forEach(image => {
+        image.addEventListener('error', () => image.parentElement.remove());
+      });
+      
       // Set up delete receipt buttons
       const deleteButtons = container.querySelectorAll('.delete-receipt');
       deleteButtons.forEach(button => {
@@ -171,6 +176,11 @@ class ExpenseForm {
             <div class="col-6 col-md-4 col-lg-3">
               <div class="card bg-secondary">
                 <div class="card-body p-2">
+                  ${ApiService.receiptThumbnailUrl(receipt) ? `
+                    <div class="receipt-preview mb-1">
+                      <img src="${ApiService.receiptThumbnailUrl(receipt)}" alt="${receipt.original_filename}" loading="lazy" width="160" height="160">
+                    </div>
+                  ` : ''}
                   <div class="d-flex justify-content-between align-items-center mb-1">
                     <small class="text-truncate">${receipt.original_filename}</small>
                     <button class="btn btn-sm btn-danger delete-receipt" data-receipt-id="${receipt.id}">
@@ -2,6 +2,18 @@
  * API Service for handling all API requests
  */
 class ApiService {
+  /**
+   * Fetch a GET endpoint through the browser's HTTP cache, revalidating the
+   * stored response first. API responses carry 'Cache-Control: private,
+   * no-cache' and an ETag, so the browser sends If-None-Match and serves its
+   * stored body on a 304, across page reloads as well.
+   * @param {string} url - The URL to fetch
+   * @returns {Promise<Response>} The fetch response
+   */
+  static async conditionalFetch(url) {
+    return fetch(url, { cache: 'no-cache' });
+  }
+
   /**
    * Get all expenses with optional filtering
    * @param {Object} filters - Optional filters
@@ -20,7 +32,7 @@ class ApiService {
     const url = `/api/expenses?${queryParams.toString()}`;
     
     try {
-      const response = await fetch(url);
+      const response = await ApiService.conditionalFetch(url);
       
       if (!response.ok) {
         throw new Error('Failed to fetch expenses');
@@ -33,6 +45,35 @@ class ApiService {
     }
   }
 
+  /**
+   * Get categories, budgets and the dashboard reports in one request
+   * @param {Object} filters - Optional report filters
+   * @returns {Promise<Object>} The dashboard data
+   */
+  static async getDashboard(filters = {}) {
+    const { startDate, endDate, year } = filters;
+    let queryParams = new URLSearchParams();
+    
+    if (startDate) queryParams.append('start_date', startDate);
+    if (endDate) queryParams.append('end_date', endDate);
+    if (year) queryParams.append('year', year);
+    
+    const url = `/api/dashboard?${queryParams.toString()}`;
+    
+    try {
+      const response = await ApiService.conditionalFetch(url);
+      
+      if (!response.ok) {
+        throw new Error('Failed to fetch dashboard data');
+      }
+      
+      return await response.json();
+    } catch (error) {
+      console.error('API Error:', error);
+      throw error;
+    }
+  }
+
   /**
    * Get a specific expense by ID
    * @param {number} expenseId - The expense ID
@@ -40,7 +81,7 @@ class ApiService {
    */
   static async getExpense(expenseId) {
     try {
-      const response = await fetch(`/api/expenses/${expenseId}`);
+      const response = await ApiService.conditionalFetch(`/api/expenses/${expenseId}`);
       
       if (!response.ok) {
         throw new Error('Failed to fetch expense details');
@@ -162,7 +203,7 @@ class ApiService {
    */
   static async getCategories() {
     try {
-      const response = await fetch('/api/categories');
+      const response = await ApiService.conditionalFetch('/api/categories');
       
       if (!response.ok) {
         throw new Error('Failed to fetch categories');
@@ -202,6 +243,19 @@ class ApiService {
     }
   }
 
+  /**
+   * Get the preview URL of an image receipt. Previews are cached by the
+   * browser for good, so lists never download the full-size original.
+   * @param {Object} receipt - The receipt
+   * @param {number} size - The preview size in pixels (160 or 640)
+   * @returns {string|null} The preview URL, or null if there is none
+   */
+  static receiptThumbnailUrl(receipt, size = 160) {
+    const previewable = /\.(jpe?g|png|gif|webp|bmp)$/i.test(receipt.filename);
+    if (receipt.status !== 'ready' || !previewable) return null;
+    return `/api/receipts/${receipt.id}/thumbnail?size=${size}`;
+  }
+
   /**
    * Delete a receipt
    * @param {number} receiptId - The receipt ID
@@ -231,7 +285,7 @@ class ApiService {
    */
   static async getBudgets() {
     try {
-      const response = await fetch('/api/budgets');
+      const response = await ApiService.conditionalFetch('/api/budgets');
       
       if (!response.ok) {
         throw new Error('Failed to fetch budgets');
@@ -251,7 +305,7 @@ class ApiService {
    */
   static async getBudget(budgetId) {
     try {
-      const response = await fetch(`/api/budgets/${budgetId}`);
+      const response = await ApiService.conditionalFetch(`/api/budgets/${budgetId}`);
       
       if (!response.ok) {
         throw new Error('Failed to fetch budget details');
@@ -357,7 +411,7 @@ class ApiService {
     const url = `/api/reports/monthly?${queryParams.toString()}`;
     
     try {
-      const response = await fetch(url);
+      const response = await ApiService.conditionalFetch(url);
       
       if (!response.ok) {
         throw new Error('Failed to fetch monthly report');
@@ -385,7 +439,7 @@ class ApiService {
     const url = `/api/reports/category?${queryParams.toString()}`;
     
     try {
-      const response = await fetch(url);
+      const response = await ApiService.conditionalFetch(url);
       
       if (!response.ok) {
         throw new Error('Failed to fetch category report');
@@ -413,12 +467,46 @@ class ApiService {
     const url = `/api/reports/summary?${queryParams.toString()}`;
     
     try {
-      const response = await fetch(url);
+      const response = await ApiService.conditionalFetch(url);
       
       if (!response.ok) {
         throw new Error('Failed to fetch summary report');
       }
-      
+
+      return await response.json();
+    } catch (error) {
+      console.error('API Error:', error);
+      throw error;
+    }
+  }
+
+  /**
+   * Get expense totals over time with rolling averages and deltas
+   * @param {Object} filters - Optional filters: startDate, endDate, interval
+   *   ('day', 'week', 'month' or 'quarter'), window, categoryId, byCategory, fill
+   * @returns {Promise<Object>} Time-series report data
+   */
+  static async getTimeSeriesReport(filters = {}) {
+    const { startDate, endDate, interval, window, categoryId, byCategory, fill } = filters;
+    let queryParams = new URLSearchParams();
+
+    if (startDate) queryParams.append('start_date', startDate);
+    if (endDate) queryParams.append('end_date', endDate);
+    if (interval) queryParams.append('interval', interval);
+    if (window) queryParams.append('window', window);
+    if (categoryId) queryParams.append('category_id', categoryId);
+    if (byCategory) queryParams.append('by_category', '1');
+    if (fill) queryParams.append('fill', '1');
+
+    const url = `/api/reports/timeseries?${queryParams.toString()}`;
+
+    try {
+      const response = await ApiService.conditionalFetch(url);
+
+      if (!response.ok) {
+        throw new Error('Failed to fetch time-series report');
+      }
+
       return await response.json();
     } catch (error) {
       console.error('API Error:', error);
@@ -432,7 +520,7 @@ class ApiService {
    */
   static async getBudgetsKPI() {
     try {
-      const response = await fetch('/api/budgets/kpi');
+      const response = await ApiService.conditionalFetch('/api/budgets/kpi');
       
       if (!response.ok) {
         throw new Error('Failed to fetch budget KPI data');
@@ -452,7 +540,7 @@ class ApiService {
    */
   static async getBudgetKPI(budgetId) {
     try {
-      const response = await fetch(`/api/budgets/${budgetId}/kpi`);
+      const response = await ApiService.conditionalFetch(`/api/budgets/${budgetId}/kpi`);
       
       if (!response.ok) {
         throw new Error('Failed to fetch budget KPI data');
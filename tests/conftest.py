@@ -0,0 +1,80 @@
+import os
+import sys
+import uuid
+import shutil
+import tempfile
+import pytest
+
+# Every test process gets a private in-memory database and process-local
+# caches, and keeps the folders the app creates at import out of the tree
+os.environ['DB_PROFILE'] = 'memory'
+os.environ.pop('DATABASE_URL', None)
+os.environ.setdefault('REPORT_CACHE_BACKEND', 'memory')
+os.environ.setdefault('METRICS_ENABLED', '0')
+IMPORT_FOLDER = tempfile.mkdtemp(prefix='expensewise-tests-')
+os.environ['UPLOAD_FOLDER'] = os.path.join(IMPORT_FOLDER, 'uploads')
+os.environ['RECEIPT_THUMBNAIL_FOLDER'] = os.path.join(IMPORT_FOLDER, 'thumbnails')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from app import db
+from models import User, Category, category_registry
+from receipts import receipt_store
+from thumbnails import thumbnail_cache
+
+app.config['WTF_CSRF_ENABLED'] = False
+
+@pytest.fixture(scope='session', autouse=True)
+def import_folder():
+    yield IMPORT_FOLDER
+    shutil.rmtree(IMPORT_FOLDER, ignore_errors=True)
+
+@pytest.fixture(autouse=True)
+def file_folders(tmp_path, monkeypatch):
+    """Keep each test's uploads, spooled receipts and previews under tmp_path"""
+    uploads = tmp_path / 'uploads'
+    spool = uploads / '.spool'
+    thumbnails = tmp_path / 'thumbnails'
+    spool.mkdir(parents=True)
+    thumbnails.mkdir()
+    monkeypatch.setitem(app.config, 'UPLOAD_FOLDER', str(uploads))
+    monkeypatch.setitem(app.config, 'RECEIPT_SPOOL_FOLDER', str(spool))
+    monkeypatch.setitem(app.config, 'RECEIPT_THUMBNAIL_FOLDER', str(thumbnails))
+    monkeypatch.setattr(receipt_store, 'root', str(uploads))
+    monkeypatch.setattr(receipt_store, 'lock_path', str(spool / '.store.lock'))
+    monkeypatch.setattr(thumbnail_cache, 'folder', str(thumbnails))
+    monkeypatch.setattr(thumbnail_cache, '_total', None)
+    return tmp_path
+
+@pytest.fixture
+def app_context():
+    with app.app_context():
+        yield
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+@pytest.fixture
+def user_id(app_context):
+    """A new user without a password"""
+    name = f"test-{uuid.uuid4().hex[:12]}"
+    user = User(username=name, email=f"{name}@example.com")
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+@pytest.fixture
+def category_id(app_context):
+    """A new category, visible through the category registry"""
+    category = Category(name=f"Test {uuid.uuid4().hex[:12]}", color='#123456', icon='tag')
+    db.session.add(category)
+    category_registry.bump()
+    db.session.commit()
+    return category.id
+
+def login(client, user_id):
+    """Log a test client in as a user without going through the login form"""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
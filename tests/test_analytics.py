@@ -0,0 +1,82 @@
+import pytest
+from analytics import analytics_cache
+from cache import report_cache
+from conftest import login
+
+REPORTS = [
+    '/api/reports/summary',
+    '/api/reports/summary?start_date=2024-02-01&end_date=2024-03-31',
+    '/api/reports/monthly?year=2024',
+    '/api/reports/category?start_date=2024-01-01&end_date=2024-12-31',
+    '/api/reports/timeseries?start_date=2024-01-01&end_date=2024-12-31&interval=month&fill=1&by_category=1',
+    '/api/dashboard?year=2024',
+]
+
+@pytest.fixture(autouse=True)
+def uncached_responses(monkeypatch):
+    # Compare freshly computed reports, not entries of the response cache
+    monkeypatch.setattr(report_cache, 'enabled', False)
+
+def reports(client, monkeypatch, analytics):
+    monkeypatch.setattr(analytics_cache, 'enabled', analytics)
+    responses = {path: client.get(path) for path in REPORTS}
+    assert {path: response.status_code for path, response in responses.items()} == dict.fromkeys(REPORTS, 200)
+    return {path: response.get_json() for path, response in responses.items()}
+
+def assert_parity(client, monkeypatch):
+    """Assert the columnar and SQL paths agree, returning the reports"""
+    columnar = reports(client, monkeypatch, True)
+    assert columnar == reports(client, monkeypatch, False)
+    return columnar
+
+def add_expense(client, category_id, amount, day):
+    response = client.post('/api/expenses', data={
+        'title': 'Parity', 'amount': amount, 'date': day, 'category_id': category_id
+    })
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+def test_columnar_reports_match_sql_through_writes(client, user_id, category_id, monkeypatch):
+    login(client, user_id)
+    ids = [
+        add_expense(client, category_id, amount, day)
+        for amount, day in [('12.50', '2024-01-15'), ('7.25', '2024-02-03'), ('100', '2024-03-31'), ('0.75', '2024-03-01')]
+    ]
+    # Warm the columns, then change them through the after_commit path
+    assert assert_parity(client, monkeypatch)['/api/reports/summary']['count'] == 4
+
+    add_expense(client, category_id, '40', '2024-02-10')
+    client.put(f"/api/expenses/{ids[0]}", data={'amount': '20', 'date': '2024-03-02'})
+    client.delete(f"/api/expenses/{ids[1]}")
+    monkeypatch.setattr(analytics_cache, 'enabled', True)
+    summary = client.get('/api/reports/summary').get_json()
+    assert (summary['count'], summary['total'], summary['max'], summary['min']) == (4, 160.75, 100, 0.75)
+    assert assert_parity(client, monkeypatch)['/api/reports/summary'] == summary
+
+@pytest.mark.parametrize('warm', [False, True])
+def test_amounts_beyond_int64_cents_fall_back_to_sql(client, user_id, category_id, monkeypatch, warm):
+    login(client, user_id)
+    add_expense(client, category_id, '10', '2024-01-15')
+    if warm:
+        reports(client, monkeypatch, True)
+        assert analytics_cache.columns(user_id) is not None
+
+    monkeypatch.setattr(analytics_cache, 'enabled', True)
+    add_expense(client, category_id, '1e17', '2024-01-16')
+    assert analytics_cache.columns(user_id) is None
+    summary = assert_parity(client, monkeypatch)['/api/reports/summary']
+    assert (summary['count'], summary['max']) == (2, 1e17)
+
+def test_failed_cache_update_does_not_fail_the_write(client, user_id, category_id, monkeypatch):
+    login(client, user_id)
+    add_expense(client, category_id, '10', '2024-01-15')
+    reports(client, monkeypatch, True)
+
+    def broken(changes):
+        raise RuntimeError('broken')
+    monkeypatch.setattr(analytics_cache, 'apply', broken)
+    add_expense(client, category_id, '5', '2024-01-16')
+    monkeypatch.undo()
+    monkeypatch.setattr(report_cache, 'enabled', False)
+
+    assert assert_parity(client, monkeypatch)['/api/reports/summary']['count'] == 2
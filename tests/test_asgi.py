@@ -0,0 +1,63 @@
+import json
+import asyncio
+from datetime import datetime
+import pytest
+from app import app, db
+from cache import report_cache
+from models import Budget
+from conftest import login
+
+pytest.importorskip('aiosqlite')
+pytest.importorskip('a2wsgi')
+pytest.importorskip('greenlet')
+import asgi
+
+PATHS = ['/api/expenses', '/api/expenses?limit=2', '/api/budgets/kpi']
+
+async def native_get(path, cookie):
+    """Send one GET through the ASGI application, returning (status, headers, body)"""
+    path, _, query = path.partition('?')
+    scope = {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': query.encode('latin-1'),
+        'headers': [(b'cookie', f"{app.config['SESSION_COOKIE_NAME']}={cookie}".encode('latin-1'))],
+    }
+    messages = []
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+    async def send(message):
+        messages.append(message)
+    await asgi.application(scope, receive, send)
+    start, body = messages[0], b''.join(message.get('body', b'') for message in messages[1:])
+    return start['status'], {name.decode(): value.decode() for name, value in start['headers']}, body
+
+def test_native_routes_match_flask(client, user_id, category_id, monkeypatch):
+    login(client, user_id)
+    for day in range(1, 6):
+        client.post('/api/expenses', data={
+            'title': f"Groceries {day}", 'amount': 10.0 * day, 'date': f"2024-04-0{day}", 'category_id': category_id
+        })
+    db.session.add(Budget(
+        name='Food', amount=100.0, start_date=datetime(2024, 4, 1), end_date=datetime(2024, 4, 30),
+        category_id=category_id, user_id=user_id
+    ))
+    db.session.commit()
+    cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME']).value
+    # Compare freshly computed responses, not one cached by the other side
+    monkeypatch.setattr(report_cache, 'enabled', False)
+
+    async def fallback(scope, receive, send):
+        raise AssertionError(f"{scope['path']} fell through to Flask")
+    monkeypatch.setattr(asgi, 'flask_application', fallback)
+
+    async def fetch_all():
+        try:
+            return [await native_get(path, cookie) for path in PATHS]
+        finally:
+            await asgi.engine.dispose()
+
+    for path, (status, headers, body) in zip(PATHS, asyncio.run(fetch_all())):
+        expected = client.get(path)
+        assert status == expected.status_code == 200, path
+        assert json.loads(body) == expected.get_json(), path
+        assert headers['etag'] == expected.headers['ETag'], path
+    assert json.loads(body)[0]['total_spent'] == 150.0
@@ -0,0 +1,43 @@
+import uuid
+import threading
+import pytest
+from app import app
+from auth import PasswordHasher, AuthBusyError, auth_throttle
+from cache import report_cache
+
+def test_report_traffic_does_not_evict_throttle_counters():
+    key = f"account:{uuid.uuid4().hex}@example.com"
+    for _ in range(app.config['AUTH_THROTTLE_MAX_PER_ACCOUNT']):
+        auth_throttle.hit(key)
+    assert auth_throttle.blocked(key)
+
+    for number in range(app.config['REPORT_CACHE_MAX_ENTRIES'] + 1):
+        report_cache.backend.set(f"flood:{number}", {'body': ''}, 60)
+
+    assert auth_throttle.blocked(key)
+    auth_throttle.clear(key)
+    assert not auth_throttle.blocked(key)
+
+def test_hasher_runs_inline_without_workers():
+    hasher = PasswordHasher('pbkdf2:sha256:1000', max_workers=0)
+    assert hasher._run(threading.current_thread) is threading.current_thread()
+    password_hash = hasher.hash('secret')
+    assert hasher.verify(password_hash, 'secret')
+    assert not hasher.needs_rehash(password_hash)
+
+def test_hasher_pool_sheds_load_beyond_its_slots():
+    hasher = PasswordHasher('pbkdf2:sha256:1000', max_workers=1, max_pending=0)
+    assert hasher._run(threading.current_thread).name.startswith('auth')
+    started, release = threading.Event(), threading.Event()
+    def hold():
+        started.set()
+        release.wait()
+    busy = threading.Thread(target=hasher._run, args=(hold,))
+    busy.start()
+    try:
+        started.wait()
+        with pytest.raises(AuthBusyError):
+            hasher.hash('secret')
+    finally:
+        release.set()
+        busy.join()
@@ -0,0 +1,71 @@
+import uuid
+from datetime import datetime
+from werkzeug.datastructures import MultiDict
+from app import db
+from cache import report_cache
+from models import Budget, User
+from conftest import login
+
+def add_budget(user_id, name):
+    budget = Budget(name=name, amount=100.0, start_date=datetime(2024, 1, 1), end_date=datetime(2024, 12, 31), user_id=user_id)
+    db.session.add(budget)
+    db.session.commit()
+    return budget.id
+
+def test_cached_responses_are_keyed_on_url_path_arguments(client, user_id):
+    login(client, user_id)
+    first, second = add_budget(user_id, 'b1'), add_budget(user_id, 'b2')
+
+    for _ in range(2):
+        responses = [client.get(f"/api/budgets/{budget_id}/kpi") for budget_id in (first, second)]
+        assert [response.get_json()['budget_id'] for response in responses] == [first, second]
+        assert [response.get_json()['budget_name'] for response in responses] == ['b1', 'b2']
+    assert responses[0].headers['ETag'] != responses[1].headers['ETag']
+
+def test_unchanged_reports_revalidate_with_304(client, user_id, category_id):
+    login(client, user_id)
+    first = client.get('/api/reports/summary')
+    etag = first.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    revalidated = client.get('/api/reports/summary', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.headers['ETag'] == etag
+
+    client.post('/api/expenses', data={'title': 'Fuel', 'amount': '30', 'date': '2024-05-01', 'category_id': category_id})
+    changed = client.get('/api/reports/summary', headers={'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+    assert changed.get_json()['count'] == 1
+
+def get_as(owner_client, path, **kwargs):
+    # Requests otherwise share the test's app context, and with it the user
+    # Flask-Login keeps in g
+    with owner_client.application.app_context():
+        return owner_client.get(path, **kwargs)
+
+def summary_entry(owner):
+    return report_cache.backend.get(report_cache.entry_key(owner, 'expense_summary', MultiDict(), {}))
+
+def test_writes_invalidate_only_the_writers_reports(client, user_id, category_id):
+    name = f"other-{uuid.uuid4().hex[:12]}"
+    other = User(username=name, email=f"{name}@example.com")
+    db.session.add(other)
+    db.session.commit()
+    other_client = client.application.test_client()
+    login(client, user_id)
+    login(other_client, other.id)
+
+    etags = {}
+    for owner, owner_client in ((user_id, client), (other.id, other_client)):
+        etags[owner] = get_as(owner_client, '/api/reports/summary').headers['ETag']
+        assert summary_entry(owner) is not None
+
+    with client.application.app_context():
+        client.post('/api/expenses', data={'title': 'Fuel', 'amount': '30', 'date': '2024-05-01', 'category_id': category_id})
+
+    assert summary_entry(user_id) is None
+    assert get_as(client, '/api/reports/summary').get_json()['count'] == 1
+    assert summary_entry(other.id) is not None
+    assert get_as(other_client, '/api/reports/summary', headers={'If-None-Match': etags[other.id]}).status_code == 304
@@ -0,0 +1,56 @@
+from datetime import date, datetime
+from app import db
+from models import DailySpend, Expense, check_daily_spend, refresh_daily_spend, refresh_daily_spend_range
+from conftest import login
+
+def user_mismatches(user_id):
+    return [mismatch for mismatch in check_daily_spend() if mismatch[0][0] == user_id]
+
+def bucket(user_id, category_id, day):
+    return DailySpend.query.filter_by(user_id=user_id, category_id=category_id, day=day).one_or_none()
+
+def test_expense_writes_keep_rollup_in_step(client, user_id, category_id):
+    login(client, user_id)
+    ids = [
+        client.post('/api/expenses', data={
+            'title': 'Lunch', 'amount': amount, 'date': '2024-05-01', 'category_id': category_id
+        }).get_json()['id']
+        for amount in ('10.50', '4.25')
+    ]
+    row = bucket(user_id, category_id, date(2024, 5, 1))
+    assert (row.total, row.count, row.min_amount, row.max_amount) == (14.75, 2, 4.25, 10.5)
+
+    client.put(f"/api/expenses/{ids[0]}", data={'date': '2024-05-02'})
+    client.delete(f"/api/expenses/{ids[1]}")
+    db.session.expire_all()
+    assert bucket(user_id, category_id, date(2024, 5, 1)) is None
+    assert bucket(user_id, category_id, date(2024, 5, 2)).total == 10.5
+    assert user_mismatches(user_id) == []
+
+def test_refresh_replaces_bucket_written_concurrently(user_id, category_id):
+    day = date(2024, 6, 1)
+    db.session.add(Expense(title='Fuel', amount=30.0, date=datetime(2024, 6, 1, 9), category_id=category_id, user_id=user_id))
+    db.session.flush()
+    # Another transaction inserted the bucket after this one last read it
+    db.session.execute(DailySpend.__table__.insert().values(
+        user_id=user_id, category_id=category_id, day=day, total=1.0, count=1, min_amount=1.0, max_amount=1.0
+    ))
+    refresh_daily_spend((user_id, category_id, day))
+    db.session.commit()
+
+    row = bucket(user_id, category_id, day)
+    assert (row.total, row.count) == (30.0, 1)
+    assert user_mismatches(user_id) == []
+
+def test_expenses_on_the_last_representable_day(client, user_id, category_id):
+    login(client, user_id)
+    response = client.post('/api/expenses', data={
+        'title': 'Far future', 'amount': '5', 'date': '9999-12-31', 'category_id': category_id
+    })
+    assert response.status_code == 201
+    expense_id = response.get_json()['id']
+    assert client.put(f"/api/expenses/{expense_id}", data={'amount': '7'}).status_code == 200
+    assert bucket(user_id, category_id, date(9999, 12, 31)).total == 7.0
+
+    refresh_daily_spend_range(user_id, date(9999, 12, 1), date(9999, 12, 31))
+    assert user_mismatches(user_id) == []
@@ -0,0 +1,85 @@
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event
+from app import db
+from models import Expense, Receipt
+from utils import encode_cursor
+from conftest import login
+
+@contextmanager
+def count_queries():
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    event.listen(db.engine, 'after_cursor_execute', record)
+    try:
+        yield statements
+    finally:
+        event.remove(db.engine, 'after_cursor_execute', record)
+
+def add_expenses(user_id, category_id, count):
+    start = datetime(2024, 1, 1)
+    expenses = [
+        Expense(title=f"Expense {n}", amount=n + 0.5, date=start + timedelta(hours=n),
+                category_id=category_id, user_id=user_id)
+        for n in range(count)
+    ]
+    db.session.add_all(expenses)
+    db.session.flush()
+    # Every tenth expense has a receipt, so receipts are loaded too
+    db.session.add_all([
+        Receipt(filename=f"r{expense.id}.jpg", original_filename='r.jpg', expense_id=expense.id)
+        for expense in expenses[::10]
+    ])
+    db.session.commit()
+
+def test_listing_expenses_costs_constant_queries(client, user_id, category_id):
+    login(client, user_id)
+    add_expenses(user_id, category_id, 10)
+    client.get('/api/expenses')
+
+    with count_queries() as small:
+        response = client.get('/api/expenses')
+    assert response.status_code == 200
+    assert len(response.get_json()) == 10
+
+    add_expenses(user_id, category_id, 990)
+    with count_queries() as large:
+        response = client.get('/api/expenses')
+    body = response.get_json()
+    assert response.status_code == 200
+    assert len(body) == 1000
+    assert sum(len(expense['receipts']) for expense in body) == 100
+    # The user, the expenses and one IN query for their receipts
+    assert len(large) == len(small) <= 3
+
+def test_expense_page_costs_constant_queries(client, user_id, category_id):
+    login(client, user_id)
+    add_expenses(user_id, category_id, 1000)
+    client.get('/api/expenses?limit=10')
+
+    with count_queries() as small:
+        assert client.get('/api/expenses?limit=10').status_code == 200
+    with count_queries() as large:
+        response = client.get('/api/expenses?limit=500')
+    assert len(response.get_json()['expenses']) == 500
+    assert len(large) == len(small) <= 3
+
+@pytest.mark.parametrize('query', ['start_date=bad', 'end_date=2024-02-30', 'start_date=01/01/2024&format=ndjson'])
+def test_list_rejects_invalid_dates(client, user_id, query):
+    login(client, user_id)
+    response = client.get(f"/api/expenses?{query}")
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid date format, use YYYY-MM-DD'
+
+@pytest.mark.parametrize('sort_by,value', [
+    ('amount', {'a': 1}), ('amount', [1]), ('amount', '12'), ('amount', True),
+    ('title', {'a': 1}), ('title', 3), ('date', [2024]), ('date', 'yesterday'),
+])
+def test_list_rejects_cursors_of_the_wrong_type(client, user_id, sort_by, value):
+    login(client, user_id)
+    cursor = encode_cursor(value, 1)
+    response = client.get(f"/api/expenses?sort_by={sort_by}&limit=5&cursor={cursor}")
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Invalid cursor'
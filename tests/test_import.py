@@ -0,0 +1,94 @@
+import json
+from models import Expense
+from conftest import login
+
+def import_body(client, body, import_format):
+    response = client.post(f"/api/expenses/import?format={import_format}", data=body.encode('utf-8'),
+                           content_type='text/csv' if import_format == 'csv' else 'application/x-ndjson')
+    return response.status_code, response.get_json()
+
+def test_csv_import_reports_invalid_amounts_and_lengths_per_row(client, user_id, category_id):
+    login(client, user_id)
+    rows = [
+        'title,amount,date,category_id,currency',
+        f"Lunch,12.50,2024-01-05,{category_id},UGX",
+        f"Not a number,nan,2024-01-05,{category_id},UGX",
+        f"Infinite,inf,2024-01-05,{category_id},UGX",
+        f"Negative infinite,-inf,2024-01-05,{category_id},UGX",
+        f"{'x' * 101},3,2024-01-05,{category_id},UGX",
+        f"Currency,3,2024-01-05,{category_id},UGXX",
+    ]
+    status, body = import_body(client, '\n'.join(rows) + '\n', 'csv')
+
+    assert status == 201
+    assert body['imported'] == 1
+    assert body['failed'] == 5
+    assert [error['row'] for error in body['errors']] == [3, 4, 5, 6, 7]
+    assert 'finite' in body['errors'][0]['error']
+    assert 'title' in body['errors'][3]['error']
+    assert 'currency' in body['errors'][4]['error']
+    assert Expense.query.filter_by(user_id=user_id).count() == 1
+
+def test_ndjson_import_reports_non_text_fields_per_row(client, user_id, category_id):
+    login(client, user_id)
+    records = [
+        {'title': 'Fuel', 'amount': 40, 'date': '2024-02-01', 'category_id': category_id},
+        {'title': {'nested': 'object'}, 'amount': 5, 'category_id': category_id},
+        {'title': 'List description', 'amount': 5, 'category_id': category_id, 'description': ['a']},
+        {'title': 'Numeric currency', 'amount': 5, 'category_id': category_id, 'currency': 840},
+        {'title': 'Object category', 'amount': 5, 'category': {'name': 'x'}},
+        {'title': 'Huge', 'amount': 1e400, 'category_id': category_id},
+        {'title': 'Long description', 'amount': 5, 'category_id': category_id, 'description': 'é' * 40000},
+    ]
+    status, body = import_body(client, ''.join(json.dumps(record) + '\n' for record in records), 'ndjson')
+
+    assert status == 201
+    assert body['imported'] == 1
+    assert body['failed'] == 6
+    assert [error['row'] for error in body['errors']] == [2, 3, 4, 5, 6, 7]
+    assert Expense.query.filter_by(user_id=user_id).count() == 1
+
+def test_create_expense_rejects_non_finite_amount(client, user_id, category_id):
+    login(client, user_id)
+    response = client.post('/api/expenses', data={'title': 'Bad', 'amount': 'nan', 'category_id': category_id})
+    assert response.status_code == 400
+
+def test_import_reports_invalid_utf8_per_row(client, user_id, category_id):
+    login(client, user_id)
+    csv_body = (
+        f"\ufefftitle,amount,date,category_id\nLunch,12.50,2024-01-05,{category_id}\n".encode('utf-8')
+        + f"Caf\xe9,3,2024-01-05,{category_id}\n".encode('latin-1')
+        + f"\"Two\nlines\",4,2024-01-06,{category_id}\n".encode('utf-8')
+    )
+    response = client.post('/api/expenses/import?format=csv', data=csv_body, content_type='text/csv')
+    assert response.status_code == 201
+    body = response.get_json()
+    assert (body['imported'], body['errors']) == (2, [{'row': 3, 'error': 'Invalid UTF-8'}])
+
+    ndjson_body = (
+        json.dumps({'title': 'Tea', 'amount': 2, 'category_id': category_id}).encode('utf-8') + b'\n'
+        + b'{"title": "\xff", "amount": 2}\n'
+    )
+    response = client.post('/api/expenses/import?format=ndjson', data=ndjson_body, content_type='application/x-ndjson')
+    body = response.get_json()
+    assert (body['imported'], body['errors']) == (1, [{'row': 2, 'error': 'Invalid UTF-8'}])
+
+def test_import_rejects_invalid_utf8_header(client, user_id):
+    login(client, user_id)
+    response = client.post('/api/expenses/import?format=csv', data=b't\xefitle,amount\nA,1\n', content_type='text/csv')
+    assert response.status_code == 200
+    assert response.get_json()['errors'] == [{'row': 1, 'error': 'Invalid UTF-8 in the header'}]
+
+def test_ndjson_import_rejects_booleans_and_fractional_ids(client, user_id, category_id):
+    login(client, user_id)
+    records = [
+        {'title': 'Valid', 'amount': 3, 'date': '9999-12-31', 'category_id': float(category_id)},
+        {'title': 'Bool amount', 'amount': True, 'category_id': category_id},
+        {'title': 'Bool category', 'amount': 1, 'category_id': True},
+        {'title': 'Fractional category', 'amount': 1, 'category_id': category_id + 0.5},
+    ]
+    status, body = import_body(client, ''.join(json.dumps(record) + '\n' for record in records), 'ndjson')
+
+    assert status == 201
+    assert body['imported'] == 1
+    assert [error['row'] for error in body['errors']] == [2, 3, 4]
@@ -0,0 +1,26 @@
+import migrations
+from models import Receipt
+
+def stale_once(monkeypatch, name):
+    """Make the first schema lookup miss objects, as when another worker creates them meanwhile"""
+    lookup = getattr(migrations, name)
+    calls = []
+    def stale(table_name):
+        calls.append(table_name)
+        return set() if len(calls) == 1 else lookup(table_name)
+    monkeypatch.setattr(migrations, name, stale)
+    return calls
+
+def test_index_created_by_another_worker_is_tolerated(app_context, monkeypatch):
+    calls = stale_once(monkeypatch, '_index_names')
+    migrations._create_missing_indexes(Receipt)
+    assert len(calls) > 1
+
+def test_column_added_by_another_worker_is_tolerated(app_context, monkeypatch):
+    calls = stale_once(monkeypatch, '_column_names')
+    migrations._add_missing_columns(Receipt, 'status')
+    assert len(calls) == 2
+
+def test_run_migrations_is_idempotent(app_context):
+    assert migrations.run_migrations() == []
+    assert migrations.pending_migrations() == []
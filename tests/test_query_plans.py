@@ -0,0 +1,64 @@
+from datetime import datetime
+import pytest
+from sqlalchemy import event
+from app import db
+from models import Budget, Expense
+from cache import report_cache
+from analytics import analytics_cache
+from conftest import login
+
+# Tables that must never be read with a full scan by the report endpoints
+HOT_TABLES = ('expense', 'daily_spend')
+
+def full_scans(connection, statement, parameters):
+    """Return the hot tables a statement reads with a full table scan"""
+    plan = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    return [
+        table for row in plan for table in HOT_TABLES
+        if row[-1].startswith(f"SCAN {table}") and not row[-1].startswith(f"SCAN {table}_")
+    ]
+
+@pytest.mark.parametrize('analytics', [True, False], ids=['analytics-cache', 'sql'])
+def test_report_queries_use_an_index(client, user_id, category_id, monkeypatch, analytics):
+    monkeypatch.setattr(report_cache, 'enabled', False)
+    monkeypatch.setattr(analytics_cache, 'enabled', analytics)
+    login(client, user_id)
+    year = 2024
+    db.session.add_all([
+        Expense(title='Rent', amount=500.0, date=datetime(year, 3, 1), category_id=category_id, user_id=user_id),
+        Budget(name='Monthly', amount=1000.0, start_date=datetime(year, 3, 1), end_date=datetime(year, 3, 31),
+               category_id=category_id, user_id=user_id),
+    ])
+    db.session.commit()
+
+    dates = f"start_date={year}-01-01&end_date={year}-12-31"
+    urls = [
+        f"/api/expenses?{dates}",
+        f"/api/expenses?category_id={category_id}&{dates}",
+        f"/api/reports/monthly?year={year}",
+        f"/api/reports/category?{dates}",
+        f"/api/reports/summary?{dates}",
+        f"/api/reports/timeseries?interval=week&by_category=1&{dates}",
+        '/api/budgets/kpi',
+    ]
+
+    statements = []
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    failures = []
+    for url in urls:
+        statements.clear()
+        event.listen(db.engine, 'before_cursor_execute', capture)
+        try:
+            response = client.get(url)
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', capture)
+        assert response.status_code == 200, url
+
+        with db.engine.connect() as connection:
+            for statement, parameters in statements:
+                for table in full_scans(connection, statement, parameters):
+                    failures.append(f"{url}: full scan of {table} in {' '.join(statement.split())}")
+    assert failures == []
@@ -0,0 +1,41 @@
+import uuid
+from datetime import datetime
+from app import db
+from cache import report_cache
+from models import Expense, Receipt
+from receipts import receipt_pipeline, receipt_store, spool_path
+
+def pending_receipt(user_id, category_id):
+    expense = Expense(title='Taxi', amount=12.0, date=datetime(2024, 3, 1), category_id=category_id, user_id=user_id)
+    db.session.add(expense)
+    db.session.flush()
+    filename = f"{uuid.uuid4().hex}.txt"
+    receipt = Receipt(filename=filename, original_filename='taxi.txt', expense_id=expense.id, status='pending')
+    db.session.add(receipt)
+    db.session.commit()
+    return receipt.id, filename
+
+def test_processing_invalidates_owner_reports_when_ready(user_id, category_id):
+    receipt_id, filename = pending_receipt(user_id, category_id)
+    with open(spool_path(filename), 'wb') as f:
+        f.write(uuid.uuid4().bytes)
+    version = report_cache.user_version(user_id)
+
+    assert receipt_pipeline.process(receipt_id, filename, 'taxi.txt') == 'ready'
+    assert report_cache.user_version(user_id) != version
+
+    receipt = db.session.get(Receipt, receipt_id)
+    name = receipt.filename
+    db.session.delete(receipt)
+    db.session.commit()
+    assert receipt_store.release(name)
+
+def test_processing_invalidates_owner_reports_when_failed(user_id, category_id):
+    receipt_id, filename = pending_receipt(user_id, category_id)
+    version = report_cache.user_version(user_id)
+
+    # Nothing was spooled under this name
+    assert receipt_pipeline.process(receipt_id, filename, 'taxi.txt') == 'failed'
+    assert report_cache.user_version(user_id) != version
+    db.session.expire_all()
+    assert db.session.get(Receipt, receipt_id).status == 'failed'
@@ -0,0 +1,120 @@
+import pytest
+from analytics import analytics_cache
+from conftest import login
+
+@pytest.mark.parametrize('year', ['0', '9999', '10000', '-5'])
+def test_monthly_report_rejects_years_out_of_range(client, user_id, year):
+    login(client, user_id)
+    response = client.get(f"/api/reports/monthly?year={year}")
+    assert response.status_code == 400
+    assert 'year' in response.get_json()['error']
+
+@pytest.mark.parametrize('year', ['1', '9998'])
+def test_monthly_report_accepts_years_at_the_limits(client, user_id, year):
+    login(client, user_id)
+    assert client.get(f"/api/reports/monthly?year={year}").status_code == 200
+
+@pytest.mark.parametrize('path,query', [
+    (path, query)
+    for path in ('/api/dashboard', '/api/reports/category', '/api/reports/summary')
+    for query in ('start_date=bad', 'end_date=2024-02-30')
+] + [('/api/dashboard', 'year=10000')])
+def test_reports_reject_invalid_filters(client, user_id, path, query):
+    login(client, user_id)
+    response = client.get(f"{path}?{query}")
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+
+def test_dashboard_accepts_valid_filters(client, user_id):
+    login(client, user_id)
+    response = client.get('/api/dashboard?start_date=2024-01-01&end_date=2024-12-31&year=2024')
+    assert response.status_code == 200
+
+@pytest.mark.parametrize('query', [
+    'start_date=9999-01-01&end_date=9999-12-31&interval=month',
+    'start_date=9999-10-01&end_date=9999-12-31&interval=quarter',
+    'start_date=9999-12-20&end_date=9999-12-31&interval=week',
+    'start_date=9999-12-01&end_date=9999-12-31&interval=day',
+])
+def test_timeseries_rejects_ranges_ending_in_the_last_bucket(client, user_id, query):
+    login(client, user_id)
+    response = client.get(f"/api/reports/timeseries?{query}")
+    assert response.status_code == 400
+    assert 'end_date' in response.get_json()['error']
+
+def test_timeseries_accepts_ranges_just_before_the_last_bucket(client, user_id):
+    login(client, user_id)
+    response = client.get('/api/reports/timeseries?start_date=9999-12-01&end_date=9999-12-30&interval=day&fill=1')
+    assert response.status_code == 200
+    assert response.get_json()['series'][-1]['end'] == '9999-12-30'
+
+@pytest.mark.parametrize('window', ['abc', '2.5', '', '0', '91'])
+def test_timeseries_rejects_invalid_windows(client, user_id, window):
+    login(client, user_id)
+    response = client.get(f"/api/reports/timeseries?window={window}")
+    assert response.status_code == 400
+    assert 'window' in response.get_json()['error']
+
+TIMESERIES_EXPENSES = [('2024-01-30', '10'), ('2024-02-01', '20'), ('2024-02-01', '5'), ('2024-02-05', '40')]
+
+def post_expenses(client, category_id, expenses):
+    for day, amount in expenses:
+        response = client.post('/api/expenses', data={
+            'title': 'Series', 'amount': amount, 'date': day, 'category_id': category_id
+        })
+        assert response.status_code == 201
+
+def series_values(response):
+    assert response.status_code == 200
+    return [
+        (point['period'], point['start'], point['end'], point['total'], point['count'],
+         point['rolling_average'], point['delta'], point['delta_percent'])
+        for point in response.get_json()['series']
+    ]
+
+@pytest.mark.parametrize('analytics', [True, False])
+@pytest.mark.parametrize('interval,expected', [
+    ('day', [
+        ('2024-01-30', '2024-01-30', '2024-01-30', 10.0, 1, None, None, None),
+        ('2024-01-31', '2024-01-31', '2024-01-31', 0.0, 0, 5.0, -10.0, -100.0),
+        ('2024-02-01', '2024-02-01', '2024-02-01', 25.0, 2, 12.5, 25.0, None),
+        ('2024-02-02', '2024-02-02', '2024-02-02', 0.0, 0, 12.5, -25.0, -100.0),
+        ('2024-02-03', '2024-02-03', '2024-02-03', 0.0, 0, 0.0, 0.0, None),
+        ('2024-02-04', '2024-02-04', '2024-02-04', 0.0, 0, 0.0, 0.0, None),
+        ('2024-02-05', '2024-02-05', '2024-02-05', 40.0, 1, 20.0, 40.0, None),
+    ]),
+    # 2024-01-29 and 2024-02-05 are Mondays; the first bucket is cut to the range
+    ('week', [
+        ('2024-W05', '2024-01-30', '2024-02-04', 35.0, 3, None, None, None),
+        ('2024-W06', '2024-02-05', '2024-02-05', 40.0, 1, 37.5, 5.0, 5 / 35 * 100),
+    ]),
+    ('month', [
+        ('2024-01', '2024-01-30', '2024-01-31', 10.0, 1, None, None, None),
+        ('2024-02', '2024-02-01', '2024-02-05', 65.0, 3, 37.5, 55.0, 550.0),
+    ]),
+    ('quarter', [
+        ('2024-Q1', '2024-01-30', '2024-02-05', 75.0, 4, None, None, None),
+    ]),
+])
+def test_timeseries_values(client, user_id, category_id, monkeypatch, interval, expected, analytics):
+    monkeypatch.setattr(analytics_cache, 'enabled', analytics)
+    login(client, user_id)
+    post_expenses(client, category_id, TIMESERIES_EXPENSES)
+    response = client.get(
+        f"/api/reports/timeseries?start_date=2024-01-30&end_date=2024-02-05&interval={interval}&window=2&fill=1"
+    )
+    assert series_values(response) == expected
+
+def test_timeseries_skips_empty_buckets_and_splits_categories(client, user_id, category_id):
+    login(client, user_id)
+    post_expenses(client, category_id, TIMESERIES_EXPENSES)
+    body = client.get(
+        '/api/reports/timeseries?start_date=2024-01-30&end_date=2024-02-05&interval=day&window=2&by_category=1'
+    ).get_json()
+
+    assert [point['period'] for point in body['series']] == ['2024-01-30', '2024-02-01', '2024-02-05']
+    # Rolling averages still count the empty days between them
+    assert [point['rolling_average'] for point in body['series']] == [None, 12.5, 20.0]
+    assert [(category['id'], [point['total'] for point in category['series']]) for category in body['categories']] == [
+        (category_id, [10.0, 25.0, 40.0])
+    ]
@@ -0,0 +1,23 @@
+import os
+from thumbnails import ThumbnailCache
+
+def write(path, size, mtime):
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    os.utime(path, (mtime, mtime))
+
+def test_eviction_skips_previews_being_written(tmp_path):
+    folder = tmp_path / 'previews'
+    folder.mkdir()
+    cache = ThumbnailCache(str(folder), max_bytes=1000)
+    for number in range(4):
+        write(cache.path(f"key{number}"), 300, 1000 + number)
+    # An older temporary file another request is still writing
+    temp = folder / 'tmpabc123.tmp'
+    write(temp, 500, 1)
+
+    cache._added(0)
+
+    assert temp.exists()
+    assert sorted(os.listdir(folder)) == ['key1.jpg', 'key2.jpg', 'key3.jpg', 'tmpabc123.tmp']
+    assert cache._total == 900
@@ -0,0 +1,142 @@
+import os
+import hashlib
+import logging
+import tempfile
+import threading
+from app import app
+from receipts import receipt_store, receipt_pipeline
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it receipts have no previews
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Extensions the generator can preview
+THUMBNAIL_EXTENSIONS = ('jpg', 'jpeg', 'png', 'gif', 'webp', 'bmp')
+
+def can_preview(filename):
+    return Image is not None and filename.rsplit('.', 1)[-1].lower() in THUMBNAIL_EXTENSIONS
+
+class ThumbnailCache:
+    """
+    Bounded on-disk cache of downscaled JPEG previews of stored receipts.
+
+    Entries are keyed on the receipt's stored filename and the preview
+    size. Stored files never change under a name, so an entry never goes
+    stale and can be served with immutable cache headers. Hits refresh the
+    entry's mtime. When the total size passes max_bytes, the least recently
+    used entries are evicted down to 90% of the budget.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        # Scanned lazily; other processes' writes are reconciled on eviction
+        self._total = None
+
+    def key(self, filename, size):
+        return hashlib.sha1(f"{filename}:{size}".encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.folder, f"{key}.jpg")
+
+    def get(self, filename, size):
+        """
+        Return the path of the preview of a stored receipt, generating it on
+        first use
+
+        Returns:
+            str: The preview path, or None if the file cannot be previewed
+        """
+        path = self.path(self.key(filename, size))
+        try:
+            os.utime(path)
+            return path
+        except FileNotFoundError:
+            pass
+        return self.generate(filename, size)
+
+    def generate(self, filename, size):
+        if not can_preview(filename):
+            return None
+
+        path = self.path(self.key(filename, size))
+        # Write then rename, so a concurrent reader never sees a partial file
+        temp = tempfile.NamedTemporaryFile(dir=self.folder, suffix='.tmp', delete=False)
+        try:
+            with temp, Image.open(receipt_store.path(filename)) as image:
+                # Let the JPEG decoder downscale while decoding
+                image.draft('RGB', (size, size))
+                image = ImageOps.exif_transpose(image)
+                image.thumbnail((size, size))
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+                image.save(temp, 'JPEG', quality=80, optimize=True)
+            os.replace(temp.name, path)
+        except (OSError, Image.DecompressionBombError) as e:
+            logger.error(f"Error generating preview of {filename}: {str(e)}")
+            try:
+                os.remove(temp.name)
+            except FileNotFoundError:
+                pass
+            return None
+
+        self._added(os.path.getsize(path))
+        return path
+
+    def _entries(self):
+        """Yield the finished previews, skipping files still being written"""
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith('.jpg'):
+                yield entry
+
+    def _added(self, size):
+        with self._lock:
+            if self._total is None:
+                self._total = 0
+                for entry in self._entries():
+                    try:
+                        self._total += entry.stat().st_size
+                    except FileNotFoundError:
+                        continue
+            else:
+                self._total += size
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = []
+        for entry in self._entries():
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+
+        self._total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if self._total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._total -= size
+
+def create_thumbnail_cache(config):
+    os.makedirs(config['RECEIPT_THUMBNAIL_FOLDER'], exist_ok=True)
+    return ThumbnailCache(config['RECEIPT_THUMBNAIL_FOLDER'], config['RECEIPT_THUMBNAIL_MAX_BYTES'])
+
+thumbnail_cache = create_thumbnail_cache(app.config)
+
+def generate_default_thumbnail(path, receipt_id):
+    """Receipt pipeline post-processor rendering the list preview eagerly"""
+    filename = os.path.relpath(path, receipt_store.root).replace(os.sep, '/')
+    thumbnail_cache.get(filename, app.config['RECEIPT_THUMBNAIL_SIZES'][0])
+
+receipt_pipeline.post_processors.append(generate_default_thumbnail)
@@ -0,0 +1,116 @@
+from math import fsum
+from datetime import date, timedelta
+
+# Bucket intervals of the time-series report; weeks start on Monday
+INTERVALS = ('day', 'week', 'month', 'quarter')
+
+def _add_months(day, months):
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+def bucket_start(day, interval):
+    """Return the first day of the bucket of an interval containing a day"""
+    if interval == 'day':
+        return day
+    if interval == 'week':
+        return day - timedelta(days=day.weekday())
+    if interval == 'month':
+        return day.replace(day=1)
+    return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+
+def next_bucket(start, interval):
+    """Return the first day of the bucket following the one starting on a day"""
+    if interval == 'day':
+        return start + timedelta(days=1)
+    if interval == 'week':
+        return start + timedelta(days=7)
+    return _add_months(start, 1 if interval == 'month' else 3)
+
+def fits_date_range(end, interval):
+    """Return whether the bucket after the one containing end starts by date.max"""
+    try:
+        next_bucket(bucket_start(end, interval), interval)
+    except (ValueError, OverflowError):
+        return False
+    return True
+
+def bucket_boundaries(start, end, interval):
+    """
+    Split the days from start through end into the buckets of an interval
+
+    The first and last buckets are cut to the range, so totals over them
+    only count days inside it.
+
+    Args:
+        start: The first day
+        end: The last day
+        interval: An INTERVALS value
+
+    Returns:
+        list: The first day of each bucket, followed by the day after end
+    """
+    boundaries = [start]
+    boundary = next_bucket(bucket_start(start, interval), interval)
+    while boundary <= end:
+        boundaries.append(boundary)
+        boundary = next_bucket(boundary, interval)
+    boundaries.append(end + timedelta(days=1))
+    return boundaries
+
+def bucket_count(start, end, interval):
+    """Return the number of buckets bucket_boundaries would produce, without building them"""
+    if interval == 'day':
+        return (end - start).days + 1
+    if interval == 'week':
+        return (bucket_start(end, 'week') - bucket_start(start, 'week')).days // 7 + 1
+    months = (end.year - start.year) * 12 + end.month - start.month
+    if interval == 'month':
+        return months + 1
+    return (end.year - start.year) * 4 + (end.month - 1) // 3 - (start.month - 1) // 3 + 1
+
+def bucket_label(day, interval):
+    """Return the label of the bucket containing a day, e.g. '2024-W07' or '2024-Q1'"""
+    if interval == 'day':
+        return day.isoformat()
+    if interval == 'week':
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if interval == 'month':
+        return day.strftime('%Y-%m')
+    return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+
+def build_series(totals, boundaries, interval, window):
+    """
+    Format bucket totals as series points with rolling averages and deltas
+
+    Args:
+        totals: (total, count) per bucket, empty buckets included
+        boundaries: The bucket_boundaries the totals were computed over
+        interval: An INTERVALS value
+        window: The number of buckets in each rolling average
+
+    Returns:
+        list: One dict per bucket with its period label, start and end day,
+        total, count, the average total over the bucket and the window - 1
+        before it (None until that many buckets precede it), and the
+        change from the previous bucket's total, absolute and in percent
+        (None for the first bucket, and in percent when that total is 0)
+    """
+    points = []
+    previous = None
+    for index, (total, count) in enumerate(totals):
+        rolling_average = None
+        if index + 1 >= window:
+            rolling_average = fsum(bucket[0] for bucket in totals[index + 1 - window:index + 1]) / window
+        points.append({
+            'period': bucket_label(boundaries[index], interval),
+            'start': boundaries[index].isoformat(),
+            'end': (boundaries[index + 1] - timedelta(days=1)).isoformat(),
+            'total': total,
+            'count': count,
+            'rolling_average': rolling_average,
+            'delta': total - previous if previous is not None else None,
+            'delta_percent': (total - previous) / previous * 100 if previous else None
+        })
+        previous = total
+    return points
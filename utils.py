@@ -1,12 +1,16 @@
 import os
-import uuid
-from werkzeug.utils import secure_filename
+import json
+import math
+import base64
+from datetime import datetime
 from app import app, db
-from models import Receipt
+from models import Expense
+from receipts import spool_receipt, spool_path, receipt_store, receipt_pipeline
 
 def save_receipt(file, expense_id):
     """
-    Save an uploaded receipt file and create a database record
+    Spool an uploaded receipt file, create a pending database record and
+    queue it for storage by the receipt pipeline
     
     Args:
         file: The uploaded file object
@@ -15,46 +19,134 @@ def save_receipt(file, expense_id):
     Returns:
         Receipt: The created Receipt object
     """
-    if not file or not file.filename:
+    receipt = spool_receipt(file, expense_id)
+    if receipt is None:
         return None
-        
-    # Secure the filename and generate a unique name
-    original_filename = secure_filename(file.filename)
-    extension = original_filename.rsplit('.', 1)[1].lower() if '.' in original_filename else ''
-    filename = f"{uuid.uuid4()}.{extension}" if extension else f"{uuid.uuid4()}"
-    
-    # Save the file
-    file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-    file.save(file_path)
-    
-    # Create receipt record
-    receipt = Receipt(
-        filename=filename,
-        original_filename=original_filename,
-        expense_id=expense_id
-    )
-    db.session.add(receipt)
+    
     db.session.commit()
+    receipt_pipeline.submit(receipt)
     
     return receipt
 
 def delete_receipt_file(filename):
     """
-    Delete a receipt file from the file system
+    Release a receipt file after its Receipt has been deleted and committed.
+    Stored files shared with other receipts are kept until the last one goes.
     
     Args:
         filename: The filename to delete
         
     Returns:
-        bool: True if successful, False otherwise
+        bool: True if a file was deleted, False otherwise
     """
     try:
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            return True
+        deleted = False
+        # A receipt still pending in the pipeline only exists in the spool
+        if os.path.exists(spool_path(filename)):
+            os.remove(spool_path(filename))
+            deleted = True
+        return receipt_store.release(filename) or deleted
     except Exception as e:
         app.logger.error(f"Error deleting file {filename}: {str(e)}")
         return False
+
+def encode_cursor(value, expense_id):
+    """
+    Encode the sort value and id of the last row of a page as an opaque cursor
+    
+    Args:
+        value: The value of the sort column for the last row
+        expense_id: The ID of the last row
+        
+    Returns:
+        str: A URL-safe cursor string
+    """
+    payload = json.dumps([value, expense_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor
+    
+    Args:
+        cursor: The cursor string from the request
+        
+    Returns:
+        tuple: The sort value and the expense ID
+        
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        value, expense_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError(f"Malformed cursor: {cursor}")
+    return value, int(expense_id)
+
+# Bytes a TEXT column holds on MySQL
+TEXT_MAX_BYTES = 65535
+
+def parse_text_field(data, field, default=None):
+    """
+    Return a text field of submitted expense data, checked against the
+    length of its Expense column
+    
+    Raises:
+        ValueError: If the value is not a string or does not fit the column
+    """
+    value = data.get(field, default)
+    if not isinstance(value, str):
+        raise ValueError(f'Invalid {field}, expected text')
+    
+    max_length = Expense.__table__.c[field].type.length
+    if max_length is None:
+        if len(value.encode('utf-8')) > TEXT_MAX_BYTES:
+            raise ValueError(f'Invalid {field}, use at most {TEXT_MAX_BYTES} bytes')
+    elif len(value) > max_length:
+        raise ValueError(f'Invalid {field}, use at most {max_length} characters')
+    return value
+
+def parse_expense_data(data):
+    """
+    Validate and convert submitted expense fields
+    
+    Args:
+        data: Mapping of field names to submitted values
+        
+    Returns:
+        dict: Column values for a new Expense, without user_id
+        
+    Raises:
+        ValueError: With a message suitable for the API error response
+    """
+    # Validate required fields
+    required_fields = ['title', 'amount', 'category_id']
+    for field in required_fields:
+        if field not in data:
+            raise ValueError(f'Missing required field: {field}')
+    
+    # Convert types
+    try:
+        amount = float(data['amount'])
+        category_id = int(data['category_id'])
+    except (TypeError, ValueError):
+        raise ValueError('Invalid amount or category_id format')
+    if not math.isfinite(amount):
+        raise ValueError('Invalid amount, use a finite number')
+    
+    # Parse date if provided, otherwise use current date
+    date = datetime.utcnow()
+    if 'date' in data and data['date']:
+        try:
+            date = datetime.strptime(data['date'], '%Y-%m-%d')
+        except (TypeError, ValueError):
+            raise ValueError('Invalid date format, use YYYY-MM-DD')
     
-    return False
+    return {
+        'title': parse_text_field(data, 'title'),
+        'amount': amount,
+        'currency': parse_text_field(data, 'currency', 'MYR'),
+        'date': date,
+        'description': parse_text_field(data, 'description', ''),
+        'category_id': category_id
+    }